@@ -0,0 +1,64 @@
+"""
+Cost of capturing `/chat` traffic (`chatbot/capture.py`), and a replay of the capture.
+
+Posts the service names to `/chat` (Flask test client, response cache on) with the
+capture off and on, in alternating rounds, and reports us/request. The writer thread
+runs as in production (it appends to a temporary file), and every request must be in
+the file afterwards. Then replays the capture in-process (`benchmarks/replay.py`),
+back to back with 1 and 4 clients, and at a fixed rate.
+
+    python -m benchmarks.bench_capture
+"""
+import tempfile
+import time
+from pathlib import Path
+
+from config import DEPLOYMENT_SERVICES_FILE
+from scraping.records import read_records
+
+
+def post_all(client, messages):
+    start = time.perf_counter()
+    for message in messages:
+        client.post("/chat", json={"message": message}, headers={"Accept-Encoding": "gzip"})
+    return time.perf_counter() - start
+
+
+def main(rounds=7):
+    from chatbot import app as app_module
+    from chatbot.capture import CaptureWriter
+    from benchmarks.replay import replay
+
+    messages = [service["service_name"] for service in read_records(DEPLOYMENT_SERVICES_FILE)]
+    messages += ["السلام عليكم", "شكرا", "كلام لا معنى له"]
+    client = app_module.app.test_client()
+    post_all(client, messages)  # load the model and fill the response cache
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        capture = Path(directory) / "capture.jsonl"
+        writer = CaptureWriter(capture)
+        best = {"off": float("inf"), "on": float("inf")}
+        # Alternate the variants so they see the same machine noise
+        for _ in range(rounds):
+            for name, capture_writer in (("off", None), ("on", writer)):
+                app_module.chat_capture = capture_writer
+                best[name] = min(best[name], post_all(client, messages))
+        app_module.chat_capture = None
+        writer.flush()
+        n_captured = len(read_records(capture))
+        assert n_captured == rounds * len(messages) and writer.dropped == 0, "requests missing from the capture"
+        results["us_per_request"] = {name: seconds / len(messages) * 1e6 for name, seconds in best.items()}
+        results["capture_bytes_per_request"] = capture.stat().st_size / n_captured
+        print("/chat us/request (test client): " + ", ".join(f"capture {name} {us:.0f}" for name, us in results["us_per_request"].items()))
+        print(f"{n_captured:,} requests captured, {results['capture_bytes_per_request']:.0f} bytes each\n")
+
+        for label, options in (("1 client", {"concurrency": 1}), ("4 clients", {"concurrency": 4}),
+                               ("200 requests/s", {"concurrency": 4, "rate": 200})):
+            results[label] = replay(capture, limit=len(messages) * 3, **options)
+            print()
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Category URL discovery against a local fixture copy of the portal's category listing
+(see `save_category_fixtures` in `scraping/fixture_server.py`), where a click shows
+the category's links after a simulated 300 ms.
+
+- serial: the previous loop, one page clicking every category and sleeping 1 s after each click.
+- parallel: `discover_categories`, tabs of one browser context working through the
+  categories together and waiting only until the new links show up.
+- http: `discover_categories_http`, the browserless path over the plain HTML listing.
+
+All must return exactly `services_by_category.json`. The browser variants are
+skipped when Chromium is not installed (`playwright install chromium`).
+
+    python -m benchmarks.bench_categories
+"""
+import asyncio
+import json
+import tempfile
+import time
+from urllib.parse import urljoin
+
+from config import SCRAPED_URLS_FILE
+from scraping.fixture_server import FixtureServer, save_category_fixtures
+from scraping.get_services_urls import discover_categories, discover_categories_http
+
+
+def serial_discover(base_url):
+    from playwright.sync_api import sync_playwright
+
+    grouped_data = {}
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.goto(base_url)
+        page.wait_for_selector('button[id^="mainCategoryBtn-"]')
+        for btn in page.query_selector_all('button[id^="mainCategoryBtn-"]'):
+            category_name = btn.inner_text()
+            btn.click()
+            page.wait_for_timeout(1000)
+            for link in page.query_selector_all('a[id^="categoryLink-"]'):
+                h2 = link.query_selector("h2")
+                grouped_data.setdefault(category_name, []).append({
+                    "title": h2.inner_text() if h2 else "",
+                    "url": urljoin(base_url, link.get_attribute("href")),
+                })
+        browser.close()
+    return grouped_data
+
+
+def main(latency: float = 0.05, pages: int = 4):
+    with open(SCRAPED_URLS_FILE, "r", encoding="utf-8") as f:
+        expected = json.load(f)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as fixtures_dir:
+        save_category_fixtures(expected, fixtures_dir)
+        with FixtureServer(fixtures_dir, latency=latency) as server:
+            for name, discover in (
+                ("serial", lambda: serial_discover(server.url("categories/"))),
+                ("parallel", lambda: asyncio.run(discover_categories(server.url("categories/"), pages=pages))),
+                ("http", lambda: discover_categories_http(server.url("categories/static/"), "{id}.html")),
+            ):
+                start = time.perf_counter()
+                try:
+                    discovered = discover()
+                except Exception as e:
+                    if "Executable doesn't exist" not in str(e):
+                        raise
+                    print(f"{name:<9} skipped (Chromium is not installed)")
+                    continue
+                elapsed = time.perf_counter() - start
+                assert discovered == expected, f"{name} discovery does not match {SCRAPED_URLS_FILE.name}"
+                results[name] = elapsed
+
+    n_links = sum(len(services) for services in expected.values())
+    for name, seconds in results.items():
+        print(f"{name:<9} {seconds:>7.2f} s  {len(expected)} categories, {n_links} links")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Checks that `QueryEncoder` is bit-identical to the fitted `TfidfVectorizer.transform`
+on every text field of every service in enriched_services_data.jsonl, then compares
+their per-query encoding time.
+
+    python -m benchmarks.bench_encoder
+"""
+import pickle
+import time
+
+import numpy as np
+
+from config import VECTORIZER_FILE, ENRICHED_SERVICES_FILE, MODEL_DIR
+from scraping.records import read_records
+
+
+def service_texts(services_data):
+    texts = []
+    for service in services_data:
+        texts.extend([
+            service.get("service_name", ""),
+            service.get("description", ""),
+            service.get("full_text", ""),
+            service.get("short_text", ""),
+            " ".join(service.get("keywords", [])),
+        ])
+        texts.extend(service.get("terms", []))
+        texts.extend(service.get("Documents", []))
+    return texts
+
+
+def check_equivalence(encoder, vectorizer, texts):
+    """
+    Raises AssertionError on the first text whose encoding differs in any bit.
+    """
+    expected = vectorizer.transform(texts)
+    expected.sort_indices()
+    for i, text in enumerate(texts):
+        indices, weights = encoder.encode(text)
+        start, end = expected.indptr[i], expected.indptr[i + 1]
+        assert np.array_equal(indices, expected.indices[start:end]), f"indices differ for text {i}: {text[:50]!r}"
+        assert np.array_equal(weights, expected.data[start:end]), f"weights differ for text {i}: {text[:50]!r}"
+
+
+def main(repeat: int = 3):
+    from chatbot.encoder import QueryEncoder
+    from preprocessing.artifacts import current_version
+
+    with open(VECTORIZER_FILE, "rb") as f:
+        vectorizer = pickle.load(f)
+    services_data = read_records(ENRICHED_SERVICES_FILE)
+    encoder = QueryEncoder(current_version(MODEL_DIR)[1])
+    texts = service_texts(services_data)
+
+    check_equivalence(encoder, vectorizer, texts)
+    print(f"QueryEncoder matches vectorizer.transform bit for bit on {len(texts)} texts")
+
+    timings = {}
+    for name, encode_one in (
+        ("vectorizer.transform", lambda text: vectorizer.transform([text])),
+        ("QueryEncoder.encode", encoder.encode),
+    ):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for text in texts:
+                encode_one(text)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best / len(texts)
+        print(f"{name:<22} {timings[name] * 1e6:>9.1f} us/query")
+    return timings
+
+
+if __name__ == "__main__":
+    main()
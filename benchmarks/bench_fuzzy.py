@@ -0,0 +1,221 @@
+"""
+Recall and cost of the spelling correction of query words (`preprocessing/fuzzy.py`).
+
+Quality: the queries of `bench_rerank` (service names, two words of the names, first
+six words of the descriptions), each with one misspelled word of 4 letters or more:
+a deleted, inserted or substituted letter, two neighbouring letters swapped, or a
+colloquial spelling of a letter (ق -> ء, ث -> ت, ذ -> د, ظ -> ض, ...). Reported with
+the correction off and on: top-1 accuracy, recall@5 and answered rate (see
+`bench_rerank.evaluate`), and the same for the original queries, which must not get worse.
+
+False corrections: real, correctly spelled user queries whose words the vocabulary
+partly lacks (colloquial verbs, services the portal does not list). Every word they
+get replaced by is a false correction. Reported with the previous minimum length (4)
+and FUZZY_MIN_LENGTH: unknown words, words replaced, and answers (top service above
+the threshold, or none) changed by the replacements, kept as they are and with the
+score check of `get_tfidf_matches` (a correction must not lower the best score).
+
+Cost: us/query (response cache off) for the original and the misspelled queries,
+without correction, with it and an empty corrections cache, and with it once the
+corrections are cached. Then us/word to correct the misspelled words with the index
+vs a scan of the whole vocabulary with the same distance, which must agree.
+
+    python -m benchmarks.bench_fuzzy
+"""
+import random
+import time
+
+from config import MODEL_DIR, FUZZY_MIN_LENGTH
+
+ARABIC_LETTERS = "ابتثجحخدذرزسشصضطظعغفقكلمنهوي"
+DIALECT_SWAPS = {"ق": "ء", "ث": "ت", "ذ": "د", "ظ": "ض", "ض": "ظ", "ز": "ذ", "س": "ص", "ص": "س", "ت": "ط"}
+
+
+def delete(word, rng):
+    i = rng.randrange(len(word))
+    return word[:i] + word[i + 1:]
+
+
+def insert(word, rng):
+    i = rng.randrange(len(word) + 1)
+    return word[:i] + rng.choice(ARABIC_LETTERS) + word[i:]
+
+
+def substitute(word, rng):
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice(ARABIC_LETTERS.replace(word[i], "")) + word[i + 1:]
+
+
+def transpose(word, rng):
+    positions = [i for i in range(len(word) - 1) if word[i] != word[i + 1]]
+    if not positions:
+        return substitute(word, rng)
+    i = rng.choice(positions)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def dialect(word, rng):
+    positions = [i for i, letter in enumerate(word) if letter in DIALECT_SWAPS]
+    if not positions:
+        return substitute(word, rng)
+    i = rng.choice(positions)
+    return word[:i] + DIALECT_SWAPS[word[i]] + word[i + 1:]
+
+
+# Correctly spelled queries of the kind users send; none of their words is a typo
+REAL_QUERIES = [
+    "تجديد جواز السفر", "موعد تسلم جواز السفر", "عايز اجدد البطاقة", "محتاج اغير عنوان البطاقة",
+    "صرف معاش", "فاتورة الغاز", "عداد الكهرباء", "دفع فاتورة المياه", "حجز موعد في السفارة",
+    "ازاي اطلع شهادة ميلاد", "عاوز استخرج رخصة عربية", "فين مكتب الشهر العقاري", "تسجيل مولود جديد",
+    "قسط الشقة", "نتيجة الامتحانات", "تقديم المدارس", "شهادة قيد عائلي", "توثيق عقد الزواج",
+    "بدل فاقد للبطاقة", "تجديد رخصة القيادة", "مخالفات المرور", "نقل ملكية سيارة", "استخراج صحيفة الحالة الجنائية",
+    "تصريح عمل للاجانب", "تسجيل شركة جديدة", "البطاقة الضريبية", "التأمينات الاجتماعية", "حجز شقة اسكان اجتماعي",
+    "شكوى ضد شركة", "تموين بطاقة تموينية", "اضافة مولود على بطاقة التموين", "كشف طبي للرخصة",
+    "قيد طالب في الجامعة", "معادلة شهادة من الخارج", "تصالح مخالفات البناء", "رخصة مزاولة مهنة",
+    "شهادة وفاة", "تغيير محل الاقامة", "استعلام عن قضية", "توكيل في الشهر العقاري",
+]
+
+
+TYPOS = {"delete": delete, "insert": insert, "substitute": substitute, "transpose": transpose, "dialect": dialect}
+
+
+def misspell(queries, typo, seed=0):
+    """
+    The queries with one of their words of FUZZY_MIN_LENGTH letters or more misspelled
+    (queries without such a word are left out).
+    """
+    rng = random.Random(seed)
+    misspelled = []
+    for text, row in queries:
+        words = text.split()
+        long_words = [i for i, word in enumerate(words) if len(word) >= FUZZY_MIN_LENGTH]
+        if long_words:
+            i = rng.choice(long_words)
+            words[i] = typo(words[i], rng)
+            misspelled.append((" ".join(words), row))
+    return misspelled
+
+
+def false_corrections(bot, model, fuzzy, messages, min_length, threshold=0.3):
+    from config import FUZZY_TWO_EDITS_LENGTH
+
+    def answer(candidates):
+        return candidates[0][0] if candidates and bot.best_candidate_score(candidates) >= threshold else None
+
+    known = set(fuzzy.terms.tolist())
+    counts = {"unknown": 0, "replaced": 0, "changed": 0, "changed, score check": 0}
+    for message in messages:
+        tokens = model.encoder.tokenize(message)
+        corrected = fuzzy.correct(tokens, min_length, FUZZY_TWO_EDITS_LENGTH)
+        counts["unknown"] += sum(token not in known and not fuzzy.is_stop_word(token) for token in tokens)
+        counts["replaced"] += sum(token != word for token, word in zip(tokens, corrected))
+        if corrected == tokens:
+            continue
+        plain = bot.rank_candidates(*model.encoder.encode_tokens(tokens), model=model)
+        forced = bot.rank_candidates(*model.encoder.encode_tokens(corrected), model=model)
+        kept = forced if bot.best_candidate_score(forced) >= bot.best_candidate_score(plain) else plain
+        counts["changed"] += answer(forced) != answer(plain)
+        counts["changed, score check"] += answer(kept) != answer(plain)
+    return counts
+
+
+def time_queries(bot, model, messages, fuzzy, warm, rounds=7):
+    from chatbot.cache import ResponseCache
+
+    best = float("inf")
+    for _ in range(rounds):
+        model.fuzzy = fuzzy
+        if fuzzy is not None and not warm:
+            fuzzy.correct_word.cache_clear()
+        model.response_cache = ResponseCache(max_size=0)
+        start = time.perf_counter()
+        bot.get_tfidf_matches(messages, model=model)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e6
+
+
+def brute_force(fuzzy, word, max_distance):
+    from preprocessing.fuzzy import edit_distance
+
+    best = None
+    for term_id, term in enumerate(fuzzy.terms.tolist()):
+        distance = edit_distance(word, term, max_distance)
+        if distance <= max_distance:
+            key = (distance, float(fuzzy.idf[term_id]), term_id)
+            if best is None or key < best[0]:
+                best = (key, term)
+    return best[1] if best else None
+
+
+def time_words(fuzzy, words, rounds=3):
+    from config import FUZZY_TWO_EDITS_LENGTH
+
+    variants = {
+        "index": fuzzy.closest_term,
+        "scan": lambda word, distance: brute_force(fuzzy, word, distance),
+    }
+    best = {name: float("inf") for name in variants}
+    corrections = {}
+    for _ in range(rounds):
+        for name, correct in variants.items():
+            start = time.perf_counter()
+            corrections[name] = [correct(word, 1 if len(word) < FUZZY_TWO_EDITS_LENGTH else 2) for word in words]
+            best[name] = min(best[name], time.perf_counter() - start)
+    assert corrections["index"] == corrections["scan"], "the index and the scan disagree"
+    return {name: seconds / len(words) * 1e6 for name, seconds in best.items()}
+
+
+def main():
+    from chatbot import bot
+    from benchmarks.bench_rerank import build_queries, evaluate
+
+    model = bot.get_model()
+    fuzzy = model.fuzzy
+    if fuzzy is None:
+        raise SystemExit(f"The current artifacts in {MODEL_DIR} have no fuzzy index: run preprocess first")
+    services = list(model.services_data)
+    queries = [query for query_list in build_queries(services).values() for query in query_list if query[0]]
+    query_sets = {"original": queries}
+    query_sets.update({name: misspell(queries, typo) for name, typo in TYPOS.items()})
+
+    results = {}
+    print(f"{'queries':<11} {'n':>4} {'correction':>11} {'top-1':>6} {'recall@5':>9} {'answered':>9}")
+    for name, query_list in query_sets.items():
+        for label, index in (("off", None), ("on", fuzzy)):
+            model.fuzzy = index
+            top1, top5, answered = evaluate(bot, model, query_list, services)
+            results[(name, label)] = (top1, top5, answered)
+            print(f"{name:<11} {len(query_list):>4} {label:>11} {top1:>6.1%} {top5:>9.1%} {answered:>9.1%}")
+
+    print(f"\nFalse corrections, {len(REAL_QUERIES)} correctly spelled queries:")
+    print(f"{'min length':>10} {'unknown words':>14} {'replaced':>9} {'answers changed':>16} {'with score check':>17}")
+    for min_length in sorted({4, FUZZY_MIN_LENGTH}):
+        counts = false_corrections(bot, model, fuzzy, REAL_QUERIES, min_length)
+        results[("false corrections", min_length)] = counts
+        print(f"{min_length:>10} {counts['unknown']:>14} {counts['replaced']:>9} {counts['changed']:>16} "
+              f"{counts['changed, score check']:>17}")
+
+    latency = {}
+    for name in ("original", "substitute"):
+        messages = [text for text, _ in query_sets[name]]
+        variants = {"off": (None, True), "on, cold": (fuzzy, False), "on, cached": (fuzzy, True)}
+        best = {label: float("inf") for label in variants}
+        # Alternate the variants so they see the same machine noise
+        for _ in range(5):
+            for label, (index, warm) in variants.items():
+                best[label] = min(best[label], time_queries(bot, model, messages, index, warm, rounds=1))
+        latency[name] = best
+        print(f"\nus/query (cache off), {name} queries: " + ", ".join(f"{label} {us:.1f}" for label, us in best.items()))
+    model.fuzzy = fuzzy
+    results["latency"] = latency
+
+    tokens = {token for text, _ in query_sets["substitute"] for token in model.encoder.tokenize(text)}
+    words = sorted(token for token in tokens if len(token) >= FUZZY_MIN_LENGTH and token not in set(fuzzy.terms.tolist()))
+    results["words"] = time_words(fuzzy, words)
+    print(f"\nus/word to correct {len(words)} unknown words (same corrections): "
+          + ", ".join(f"{name} {us:.1f}" for name, us in results["words"].items()))
+    return results
+
+
+if __name__ == "__main__":
+    main()
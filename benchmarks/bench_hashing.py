@@ -0,0 +1,152 @@
+"""
+Hashing mode (`VECTORIZER_MODE = "hashing"`) vs the fitted vocabulary, on the scraped services.
+
+Both models are built by `preprocess()` into temporary directories. Reported:
+- build: preprocess time, and the size of the vectorizer state each mode keeps
+  (pickled vectorizer + vocabulary arrays vs the hashed IDF array).
+- shards: the hashed matrix built from 16-service shards in 4 processes must equal
+  the one built in a single shard, in this process.
+- encoder: the query vectors of the hashing model's `QueryEncoder` must equal the rows
+  `HashingTfidf.transform` gives for the same texts (stop words dropped by both).
+- collisions: vocabulary terms that share a hashed feature with another term.
+- quality: top-1 accuracy, recall@5 and answered rate of the name / name words /
+  description queries of `bench_rerank`, and how often both models pick the same service.
+- latency: query encoding alone, and `get_tfidf_matches` (response cache off).
+
+    python -m benchmarks.bench_hashing
+"""
+import io
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from config import SCRAPED_SERVICES_FILE
+from scraping.records import read_records
+
+
+def build_model(output_dir: Path, mode: str) -> float:
+    import config
+    from preprocessing.preprocess import preprocess
+    from benchmarks.bench_streaming import redirected_outputs
+
+    start = time.perf_counter()
+    with redirected_outputs(SCRAPED_SERVICES_FILE, output_dir), mock.patch.object(config, "VECTORIZER_MODE", mode), \
+            redirect_stdout(io.StringIO()):
+        preprocess()
+    return time.perf_counter() - start
+
+
+def check_shards(services, shard_size=16, workers=4):
+    from preprocessing.preprocess import build_hashed_matrix, enrich_services_with_texts, make_hashing_vectorizer
+
+    services = enrich_services_with_texts([dict(service) for service in services])
+    single, sharded = make_hashing_vectorizer(), make_hashing_vectorizer()
+    expected = build_hashed_matrix(services, single, workers=0, chunk_size=len(services))
+    matrix = build_hashed_matrix(services, sharded, workers=workers, chunk_size=shard_size)
+    assert np.array_equal(single.idf_, sharded.idf_), "different IDF weights"
+    assert (matrix != expected).nnz == 0 and np.array_equal(matrix.indptr, expected.indptr), "different matrix"
+
+
+def check_encoder(version_dir: Path, encoder, texts) -> int:
+    """
+    Compares the encoder with `HashingTfidf.transform` on the texts, and on the stop
+    words whose feature a service uses, alone and before every text. Returns the number
+    of those stop words.
+    """
+    from preprocessing.hashing import feature_ids
+    from preprocessing.preprocess import make_hashing_vectorizer
+
+    vectorizer = make_hashing_vectorizer(encoder.n_features)
+    vectorizer.idf_ = np.load(version_dir / "idf.npy")
+    stop_words = sorted(vectorizer.stop_words)
+    used = [word for word, feature in zip(stop_words, feature_ids(stop_words, encoder.n_features)) if vectorizer.idf_[feature] > 0]
+    texts = list(texts) + used + [f"{word} {text}" for word, text in zip(used * len(texts), texts)]
+    matrix = vectorizer.transform(texts)
+    for i, text in enumerate(texts):
+        indices, weights = encoder.encode(text)
+        start, end = matrix.indptr[i], matrix.indptr[i + 1]
+        assert np.array_equal(indices, matrix.indices[start:end]), f"indices differ for {text[:50]!r}"
+        assert np.array_equal(weights, matrix.data[start:end]), f"weights differ for {text[:50]!r}"
+    return len(used)
+
+
+def time_encoding(encoder, messages):
+    start = time.perf_counter()
+    for message in messages:
+        encoder.encode(message)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def main():
+    from chatbot import bot
+    from chatbot.model import ServingModel
+    from preprocessing.artifacts import current_version, load_vocabulary
+    from preprocessing.hashing import feature_ids
+    from benchmarks.bench_rerank import build_queries, evaluate, time_queries
+
+    services = read_records(SCRAPED_SERVICES_FILE)
+    check_shards(services)
+    print("Hashed index from 16-service shards in 4 processes == single shard")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        models, results = {}, {}
+        for mode in ("vocabulary", "hashing"):
+            (tmp / mode).mkdir()
+            build_s = build_model(tmp / mode, mode)
+            version_dir = current_version(tmp / mode / "model")[1]
+            state_files = [version_dir / name for name in ("idf.npy", "terms.npy", "stop_words.npy")] + [tmp / mode / "vectorizer.pkl"]
+            state_kb = sum(path.stat().st_size for path in state_files if path.exists()) / 1024
+            models[mode] = ServingModel(version_dir)
+            results[mode] = {"build_s": build_s, "state_kb": state_kb}
+
+        terms, _ = load_vocabulary(current_version(tmp / "vocabulary" / "model")[1], mmap_mode=None)
+        buckets = feature_ids(terms.tolist(), models["hashing"].encoder.n_features)
+        _, inverse, counts = np.unique(buckets, return_inverse=True, return_counts=True)
+        colliding = int((counts[inverse] > 1).sum())
+        print(f"{len(terms)} vocabulary terms, {colliding} of them share one of "
+              f"{models['hashing'].encoder.n_features} hashed features with another term\n")
+
+        print(f"{'mode':<11} {'build (s)':>10} {'state (KB)':>11}")
+        for mode, r in results.items():
+            print(f"{mode:<11} {r['build_s']:>10.2f} {r['state_kb']:>11.1f}")
+
+        queries = build_queries(list(models["vocabulary"].services_data))
+        texts = [text for query_list in queries.values() for text, _ in query_list]
+        n_stop_words = check_encoder(current_version(tmp / "hashing" / "model")[1], models["hashing"].encoder, texts)
+        print(f"Hashing query encoder == HashingTfidf.transform on the {len(texts)} queries "
+              f"and {n_stop_words} stop words sharing a used feature\n")
+        print(f"\n{'queries':<12} {'mode':<11} {'top-1':>6} {'recall@5':>9} {'answered':>9} {'same top-1':>11}")
+        for query_name, query_list in queries.items():
+            texts = [text for text, _ in query_list]
+            tops = {
+                mode: [matches[0][0] if matches else None for matches in bot.get_tfidf_matches(texts, similarity_threshold=0.0, model=model)]
+                for mode, model in models.items()
+            }
+            same = sum(a == b for a, b in zip(tops["vocabulary"], tops["hashing"])) / len(texts)
+            for mode, model in models.items():
+                top1, top5, answered = evaluate(bot, model, query_list, list(model.services_data))
+                results[mode][query_name] = (top1, top5, answered)
+                print(f"{query_name:<12} {mode:<11} {top1:>6.1%} {top5:>9.1%} {answered:>9.1%} {same:>11.1%}")
+
+        messages = [text for text, _ in queries["name"]]
+        # Alternate the modes so they see the same machine noise
+        for mode in models:
+            results[mode]["encode_us"] = results[mode]["match_us"] = float("inf")
+        for _ in range(7):
+            for mode, model in models.items():
+                results[mode]["encode_us"] = min(results[mode]["encode_us"], time_encoding(model.encoder, messages))
+                results[mode]["match_us"] = min(results[mode]["match_us"], time_queries(bot, model, messages, rounds=1))
+        print(f"\n{'mode':<11} {'encode (us)':>12} {'match (us)':>11}")
+        for mode in models:
+            print(f"{mode:<11} {results[mode]['encode_us']:>12.1f} {results[mode]['match_us']:>11.1f}")
+        models.clear()
+    return results
+
+
+if __name__ == "__main__":
+    main()
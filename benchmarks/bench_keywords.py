@@ -0,0 +1,67 @@
+"""
+Keyword extraction: the previous per-row loop (dense row + full argsort over the
+vocabulary) vs the batched `top_keywords` working on the CSR arrays.
+
+Synthetic corpora are the shipped services matrix repeated 10x and 100x, with the
+rows and the non-zero weights randomly perturbed so that rows differ.
+
+    python -m benchmarks.bench_keywords
+"""
+import pickle
+import time
+
+import numpy as np
+from scipy import sparse
+
+from config import SERVICES_MATRIX_FILE, MODEL_DIR
+from preprocessing.artifacts import current_version, load_vocabulary
+from preprocessing.preprocess import top_keywords
+
+
+def legacy_top_keywords(services_matrix, feature_names, top_n=4):
+    """The previous loop, with a stable sort so that ties have a defined order."""
+    keywords = []
+    for idx in range(services_matrix.shape[0]):
+        scores = services_matrix[idx].toarray().flatten()
+        top_indices = np.argsort(scores, kind="stable")[-top_n:][::-1]
+        keywords.append([feature_names[i] for i in top_indices if scores[i] > 0])
+    return keywords
+
+
+def synthetic_matrix(base, scale, seed=0):
+    if scale == 1:
+        return base.tocsr()
+    rng = np.random.default_rng(seed)
+    matrix = sparse.vstack([base] * scale, format="csr")
+    # Perturb the weights, but keep some exact ties like the real data has
+    matrix.data = matrix.data * rng.choice([1.0, 1.0, 0.9, 1.1], size=matrix.nnz)
+    return matrix
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main(scales=(1, 10, 100)):
+    with open(SERVICES_MATRIX_FILE, "rb") as f:
+        base = pickle.load(f)
+    feature_names, _ = load_vocabulary(current_version(MODEL_DIR)[1], mmap_mode=None)
+
+    results = {}
+    print(f"{'corpus':>8} {'rows':>7} {'loop (s)':>9} {'batched (s)':>12} {'speed-up':>9}")
+    for scale in scales:
+        matrix = synthetic_matrix(base, scale)
+        expected, loop_time = timed(legacy_top_keywords, matrix, feature_names)
+        keywords, batched_time = timed(top_keywords, matrix, feature_names)
+        assert keywords == expected, f"keywords differ at {scale}x"
+        # The chunked path must agree as well
+        assert top_keywords(matrix, feature_names, chunk_size=97) == expected
+        results[scale] = {"loop_s": loop_time, "batched_s": batched_time}
+        print(f"{scale:>7}x {matrix.shape[0]:>7} {loop_time:>9.3f} {batched_time:>12.4f} {loop_time / batched_time:>8.0f}x")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Quality and cost of lemmatization with the offline lemma table (`preprocessing/lemmas.py`).
+
+Uses the camel-tools analyzer when it is installed, otherwise a stand-in that only
+strips leading clitics (و, ف, ب, ك, ل, ال), so that the table, the checks and the
+serving cost can be measured without it. The quality numbers are those of the
+lemmatizer used, which is printed first.
+
+Checks, on the scraped services, that with the lemma table the parallel build gives
+the same matrix as `vectorizer.transform` and `QueryEncoder` the same query vectors
+(bit for bit), also for query words only found after stripping their clitics.
+
+Quality: the queries of `bench_rerank`, as they are and with a clitic added to every
+other word (والرخصة, بالجواز), scored by cosine similarity only, without and with
+lemmas: top-1 accuracy, recall@5 and answered rate (see `bench_rerank.evaluate`).
+
+Cost: us/query to tokenize the queries without and with the table, the time to
+analyze the corpus words and the size of the table.
+
+    python -m benchmarks.bench_lemmas
+"""
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config import SCRAPED_SERVICES_FILE
+from scraping.records import read_records
+
+CLITICS = ("و", "ب", "ال", "وال", "بال", "لل")
+
+
+def strip_clitics(word):
+    for prefix in ("وبال", "وال", "فال", "بال", "كال", "لل", "ال", "و", "ف", "ب", "ك", "ل"):
+        if word.startswith(prefix) and len(word) - len(prefix) >= 3:
+            return word[len(prefix):]
+    return None
+
+
+def add_clitics(queries, seed=0):
+    rng = random.Random(seed)
+    return [(" ".join(rng.choice(CLITICS) + word if i % 2 == 0 and not word.startswith("ال") else word
+                      for i, word in enumerate(text.split())), row) for text, row in queries]
+
+
+def build(services, lemmatizer):
+    from preprocessing.preprocess import build_vocabulary_matrix, iter_enriched_services
+
+    vectorizer, matrix = build_vocabulary_matrix((dict(s) for s in services), workers=0, lemmatizer=lemmatizer)
+    texts = [service["short_text"] for service in iter_enriched_services(dict(s) for s in services)]
+    return vectorizer, matrix, texts
+
+
+def check_equivalence(vectorizer, matrix, texts, queries):
+    from preprocessing.artifacts import save_vocabulary
+    from chatbot.encoder import QueryEncoder
+
+    expected = vectorizer.transform(texts)
+    for name in ("data", "indices", "indptr"):
+        assert np.array_equal(getattr(matrix, name), getattr(expected, name)), f"different matrix {name}"
+    with tempfile.TemporaryDirectory() as directory:
+        save_vocabulary(directory, vectorizer)
+        vectorizer.tokenizer.save(directory)
+        encoder = QueryEncoder(directory)
+        expected = vectorizer.transform(queries)
+        for i, query in enumerate(queries):
+            indices, weights = encoder.encode(query)
+            row = expected[i]
+            assert np.array_equal(indices, row.indices) and np.array_equal(weights, row.data), f"different vector for {query!r}"
+
+
+def evaluate(vectorizer, matrix, queries, services, threshold=0.3):
+    urls = [service["service_url"] for service in services]
+    scores = (vectorizer.transform([text for text, _ in queries]) @ matrix.T).toarray()
+    correct = answered = in_top5 = 0
+    for (_, row), query_scores in zip(queries, scores):
+        top = np.argsort(-query_scores, kind="stable")[:5]
+        if query_scores[top[0]] >= threshold:
+            answered += 1
+            correct += urls[top[0]] == urls[row]
+        in_top5 += any(urls[i] == urls[row] for i in top if query_scores[i] > 0)
+    n = len(queries)
+    return correct / n, in_top5 / n, answered / n
+
+
+def time_tokenize(tokenizers, texts, rounds=7):
+    best = {name: float("inf") for name in tokenizers}
+    # Alternate the tokenizers so they see the same machine noise
+    for _ in range(rounds):
+        for name, tokenize in tokenizers.items():
+            start = time.perf_counter()
+            for text in texts:
+                tokenize(text)
+            best[name] = min(best[name], time.perf_counter() - start)
+    return {name: seconds / len(texts) * 1e6 for name, seconds in best.items()}
+
+
+def main():
+    from benchmarks.bench_rerank import build_queries
+    from preprocessing.lemmas import LemmaTable, camel_lemmatizer
+    from preprocessing.preprocess import make_vectorizer
+    from preprocessing.text import preprocess_text
+
+    services = read_records(SCRAPED_SERVICES_FILE)
+    lemmatizer = camel_lemmatizer()
+    name = "camel-tools"
+    if lemmatizer is None:
+        lemmatizer, name = strip_clitics, "clitic stripping (camel-tools is not installed)"
+    print(f"Lemmatizer: {name}")
+
+    plain, plain_matrix, texts = build(services, None)
+    start = time.perf_counter()
+    lemmatized, lemmatized_matrix, _ = build(services, lemmatizer)
+    build_seconds = time.perf_counter() - start
+    queries = [query for query_list in build_queries(services).values() for query in query_list if query[0]]
+    query_sets = {"original": queries, "clitics": add_clitics(queries)}
+
+    check_equivalence(lemmatized, lemmatized_matrix, texts, [text for query_list in query_sets.values() for text, _ in query_list])
+    print("Lemma table: same matrix as vectorizer.transform, same query vectors as QueryEncoder (bit for bit)\n")
+
+    results = {}
+    print(f"{'queries':<9} {'lemmas':>7} {'terms':>6} {'top-1':>6} {'recall@5':>9} {'answered':>9}")
+    for query_name, query_list in query_sets.items():
+        for label, (vectorizer, matrix) in (("off", (plain, plain_matrix)), ("on", (lemmatized, lemmatized_matrix))):
+            top1, top5, answered = evaluate(vectorizer, matrix, query_list, services)
+            results[(query_name, label)] = (top1, top5, answered)
+            print(f"{query_name:<9} {label:>7} {len(vectorizer.vocabulary_):>6} {top1:>6.1%} {top5:>9.1%} {answered:>9.1%}")
+
+    table = lemmatized.tokenizer
+    start = time.perf_counter()
+    LemmaTable.build(table.forms.tolist(), lemmatizer, make_vectorizer().get_stop_words())
+    analyze_seconds = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as directory:
+        table.save(directory)
+        size = sum(path.stat().st_size for path in Path(directory).rglob("*.npy"))
+        loaded = LemmaTable.load(directory)
+        messages = [text for query_list in query_sets.values() for text, _ in query_list]
+        results["tokenize"] = time_tokenize({"off": preprocess_text, "on": loaded}, messages)
+        results["table"] = (len(table), len(table.lemmas), size, analyze_seconds, build_seconds)
+    print("\nus/query to tokenize: " + ", ".join(f"{label} {us:.1f}" for label, us in results["tokenize"].items()))
+    print(f"Table: {len(table):,} words, {len(table.lemmas):,} lemmas, {size:,} bytes; "
+          f"analyzing the words {analyze_seconds:.2f} s, whole lemmatized build {build_seconds:.2f} s")
+    return results
+
+
+if __name__ == "__main__":
+    main()
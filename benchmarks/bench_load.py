@@ -0,0 +1,98 @@
+"""
+Load test of `/chat`: requests/s and latency percentiles as gunicorn workers are added.
+
+Each configuration starts `manage.py run_app` in a subprocess on a free local port
+(workers = 0 is Flask's development server), then `clients` threads post service
+questions back to back for `duration` seconds. Production mode needs gunicorn.
+
+    python -m benchmarks.bench_load
+"""
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+from config import BASE_DIR, DEPLOYMENT_SERVICES_FILE
+from scraping.records import read_records
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(workers: int, port: int) -> subprocess.Popen:
+    command = [sys.executable, "manage.py", "run_app", "--port", str(port)]
+    if workers:
+        command += ["--workers", str(workers)]
+    process = subprocess.Popen(command, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"run_app with {workers} workers did not start")
+
+
+def load(url: str, messages, clients: int, duration: float):
+    latencies = [[] for _ in range(clients)]
+    errors = [0] * clients
+    stop_at = time.perf_counter() + duration
+
+    def client(k: int):
+        session = requests.Session()
+        i = k
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            response = session.post(url, json={"message": messages[i % len(messages)]})
+            latencies[k].append(time.perf_counter() - start)
+            errors[k] += response.status_code != 200
+            i += clients
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.concatenate([np.array(l) for l in latencies]), sum(errors)
+
+
+def main(workers=(0, 1, 2, 4), clients: int = 16, duration: float = 5.0, route: str = "/chat"):
+    messages = [service["service_name"] for service in read_records(DEPLOYMENT_SERVICES_FILE)]
+
+    results = {}
+    for n_workers in workers:
+        port = free_port()
+        process = start_app(n_workers, port)
+        try:
+            url = f"http://127.0.0.1:{port}{route}"
+            load(url, messages, clients, 1.0)  # warm up every worker
+            latencies, errors = load(url, messages, clients, duration)
+        finally:
+            process.terminate()
+            process.wait()
+        results[n_workers] = {
+            "requests_per_second": len(latencies) / duration,
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "p99_ms": float(np.percentile(latencies, 99) * 1000),
+            "errors": errors,
+        }
+
+    print(f"{route}, {clients} clients, {duration:.0f} s per run")
+    print(f"{'workers':<12} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'errors':>7}")
+    for n_workers, r in results.items():
+        label = "dev server" if n_workers == 0 else str(n_workers)
+        print(f"{label:<12} {r['requests_per_second']:>8.0f} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['errors']:>7}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+The int8 LSA backend (`preprocessing/lsa.py`) against the sparse postings lists.
+
+The shipped artifacts have no LSA index (`LSA_COMPONENTS = 0`): every model here gets
+one of `COMPONENTS` components fitted in memory.
+
+Quality, on the shipped services: the queries of `bench_rerank` (name, two name words,
+start of the description), answered by the bot with each backend (re-ranking as
+configured): top-1 accuracy, recall@5 and answered rate. Also the agreement of the
+int8 vectors with the same LSA vectors in float64 (same top-1 row, top-10 overlap).
+
+Scale: 1x/10x/100x copies of the shipped index (see `suite.build_model_dir`), with an
+LSA index fitted on each: the time to fit it, the serving memory of the index arrays
+of each backend, us/query with the response cache off (best of 5 alternating rounds)
+and the agreement with the sparse backend: same top-1 service URL, and sparse top-1
+URL among the LSA top 10.
+
+    python -m benchmarks.bench_lsa
+"""
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config import MODEL_DIR, LSA_COMPONENTS
+
+# Components of the benchmarked LSA indexes
+COMPONENTS = LSA_COMPONENTS or 128
+
+
+def answers(bot, model, messages, top_k=10):
+    from chatbot.cache import ResponseCache
+
+    model.response_cache = ResponseCache(max_size=0)
+    return [[row for row, _ in matches] for matches in bot.get_tfidf_matches(messages, top_k=top_k, similarity_threshold=0.0, model=model)]
+
+
+def int8_agreement(model, messages, top_k=10):
+    """
+    Share of the queries with the same top row with the int8 vectors as with the
+    unquantized ones, the mean overlap of their top `top_k` rows and the largest score difference.
+    """
+    lsa = model.lsa
+    exact = model.retrieval_index.matrix @ lsa.term_vectors.astype(np.float64)
+    exact /= np.maximum(np.linalg.norm(exact, axis=1, keepdims=True), 1e-12)
+    same = overlap = 0.0
+    max_error = 0.0
+    for message in messages:
+        indices, weights = model.encoder.encode(message)
+        vector = lsa.project(indices, weights)
+        if vector is None:
+            same += 1
+            overlap += 1
+            continue
+        rows, scores = lsa.score(indices, weights)
+        exact_scores = exact @ vector.astype(np.float64)
+        max_error = max(max_error, float(np.abs(exact_scores[rows] - scores).max(initial=0.0)))
+        got = rows[np.lexsort((rows, -scores))][:top_k]
+        expected = np.lexsort((np.arange(len(exact_scores)), -exact_scores))[:top_k]
+        same += got[0] == expected[0]
+        overlap += len(np.intersect1d(got, expected)) / top_k
+    return same / len(messages), overlap / len(messages), max_error
+
+
+def index_bytes(model):
+    sparse = sum(np.asarray(getattr(model.retrieval_index, name)).nbytes for name in model.retrieval_index.ARRAYS)
+    return sparse, model.lsa.nbytes
+
+
+def main(scales=(1, 10, 100), rounds=5):
+    from chatbot import bot
+    from chatbot.model import ServingModel
+    from benchmarks.bench_rerank import build_queries, evaluate, time_queries
+    from benchmarks.suite import build_model_dir
+    from preprocessing.index import RetrievalIndex
+    from preprocessing.lsa import LsaIndex
+
+    default_backend = bot.RETRIEVAL_BACKEND
+    model = bot.get_model()
+    if model.encoder.hashing:
+        raise SystemExit("Hashing-mode artifacts have no LSA index")
+    if model.lsa is None:
+        model.lsa = LsaIndex.build(model.retrieval_index, COMPONENTS)
+    services = list(model.services_data)
+    queries = build_queries(services)
+    messages = [text for query_list in queries.values() for text, _ in query_list if text]
+
+    results = {}
+    try:
+        print(f"LSA components: {model.lsa.n_components}\n")
+        print(f"{'queries':<12} {'backend':<8} {'top-1':>6} {'recall@5':>9} {'answered':>9}")
+        for query_name, query_list in queries.items():
+            for backend in ("sparse", "lsa"):
+                bot.RETRIEVAL_BACKEND = backend
+                top1, top5, answered = evaluate(bot, model, query_list, services)
+                results[(query_name, backend)] = (top1, top5, answered)
+                print(f"{query_name:<12} {backend:<8} {top1:>6.1%} {top5:>9.1%} {answered:>9.1%}")
+        same, overlap, max_error = int8_agreement(model, messages)
+        results["int8"] = (same, overlap, max_error)
+        print(f"\nint8 vs float64 LSA vectors: same top-1 for {same:.1%} of the queries, top-10 overlap {overlap:.1%}, "
+              f"largest score error {max_error:.4f}")
+
+        print(f"\n{'corpus':>7} {'rows':>7} {'fit (s)':>8} {'sparse KB':>10} {'lsa KB':>7} "
+              f"{'sparse us':>10} {'lsa us':>7} {'same top-1':>11} {'in lsa top-10':>14}")
+        for scale in scales:
+            with tempfile.TemporaryDirectory(dir=MODEL_DIR.parent) as tmp:
+                build_model_dir(Path(tmp), scale)
+                start = time.perf_counter()
+                LsaIndex.build(RetrievalIndex.load(tmp, mmap_mode=None), COMPONENTS).save(tmp)
+                fit_seconds = time.perf_counter() - start
+                scaled = ServingModel(tmp)
+                urls = [service["service_url"] for service in scaled.services_data]
+
+                top = {}
+                us = {"sparse": float("inf"), "lsa": float("inf")}
+                # Alternate the backends so they see the same machine noise
+                for _ in range(rounds):
+                    for backend in us:
+                        bot.RETRIEVAL_BACKEND = backend
+                        us[backend] = min(us[backend], time_queries(bot, scaled, messages, rounds=1))
+                for backend in us:
+                    bot.RETRIEVAL_BACKEND = backend
+                    top[backend] = answers(bot, scaled, messages)
+                pairs = [(sparse, lsa) for sparse, lsa in zip(top["sparse"], top["lsa"]) if sparse]
+                same_top1 = sum(bool(lsa) and urls[lsa[0]] == urls[sparse[0]] for sparse, lsa in pairs) / len(pairs)
+                in_top10 = sum(urls[sparse[0]] in {urls[row] for row in lsa} for sparse, lsa in pairs) / len(pairs)
+                sparse_bytes, lsa_bytes = index_bytes(scaled)
+                results[scale] = {
+                    "rows": scaled.retrieval_index.n_services, "fit_s": fit_seconds,
+                    "sparse_bytes": sparse_bytes, "lsa_bytes": lsa_bytes,
+                    "sparse_us": us["sparse"], "lsa_us": us["lsa"], "same_top1": same_top1, "in_top10": in_top10,
+                }
+                print(f"{scale:>6}x {scaled.retrieval_index.n_services:>7} {fit_seconds:>8.2f} {sparse_bytes / 1024:>10.0f} "
+                      f"{lsa_bytes / 1024:>7.0f} {us['sparse']:>10.1f} {us['lsa']:>7.1f} {same_top1:>11.1%} {in_top10:>14.1%}")
+                del scaled
+    finally:
+        bot.RETRIEVAL_BACKEND = default_backend
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Overhead of the per-stage instrumentation: `get_bot_response` per query with metrics
+enabled vs disabled (`METRICS_ENABLED`), with the response cache on (repeated queries,
+every stage is short so the timing calls weigh the most) and off, plus the cost of a
+single histogram observation.
+
+    python -m benchmarks.bench_metrics
+"""
+import time
+import timeit
+
+from config import DEPLOYMENT_SERVICES_FILE
+from scraping.records import read_records
+
+
+def main(repeat: int = 20, rounds: int = 7):
+    from chatbot import bot, metrics
+    from chatbot.cache import ResponseCache
+
+    messages = [service["service_name"] for service in read_records(DEPLOYMENT_SERVICES_FILE)] * repeat
+
+    model = bot.get_model()
+    results = {}
+    for cache_name, cache_size in (("cache on", 10_000), ("cache off", 0)):
+        best = {False: float("inf"), True: float("inf")}
+        # Alternate on and off so both see the same machine noise
+        for _ in range(rounds):
+            for enabled in (False, True):
+                metrics.METRICS_ENABLED = enabled
+                model.response_cache = ResponseCache(max_size=cache_size)
+                start = time.perf_counter()
+                for message in messages:
+                    bot.get_bot_response(message)
+                best[enabled] = min(best[enabled], (time.perf_counter() - start) / len(messages))
+        for enabled, seconds in best.items():
+            results[(cache_name, enabled)] = seconds * 1e6
+    metrics.METRICS_ENABLED = True
+    n = 200_000
+    observe_us = timeit.timeit(lambda: metrics.STAGE_SECONDS.observe(0.0001, "tokenize"), number=n) / n * 1e6
+
+    print(f"{'':<10} {'metrics off':>12} {'metrics on':>11} {'overhead':>9}")
+    for cache_name in ("cache on", "cache off"):
+        off, on = results[(cache_name, False)], results[(cache_name, True)]
+        print(f"{cache_name:<10} {off:>9.1f} us {on:>8.1f} us {on - off:>6.1f} us")
+    print(f"one histogram observation: {observe_us:.2f} us")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+`norm` / `preprocess_text` throughput: the previous chain of regex and replace calls
+vs the single `str.translate` pass with its LRU cache.
+
+Before timing, checks that both give exactly the same output on every text and every
+token of the scraped and deployment data.
+
+    python -m benchmarks.bench_norm
+"""
+import re
+import time
+import unicodedata
+
+from config import SCRAPED_SERVICES_FILE, ENRICHED_SERVICES_FILE
+from scraping.records import iter_records
+from preprocessing import text as text_module
+from preprocessing.text import norm, preprocess_text
+
+
+def legacy_norm(text: str) -> str:
+    """`norm` as it was: NFC, diacritics regex (compiled per call), alef regex, two replaces."""
+    normalized_text = unicodedata.normalize('NFC', text)
+    arabic_diacritics = re.compile(r'[\u0610-\u061A\u064B-\u065F\u06D6-\u06DC\u06DF-\u06E8\u06EA-\u06ED]')
+    normalized_text = re.sub(arabic_diacritics, '', normalized_text)
+    normalized_text = re.sub(r'[إأآ]', 'ا', normalized_text)
+    normalized_text = normalized_text.replace('ى', 'ي')
+    normalized_text = normalized_text.replace('ة', 'ه')
+    return normalized_text
+
+
+def legacy_preprocess_text(text: str):
+    text = re.sub(r'[^\w\s]', '', text)
+    tokens = re.findall(r'\b\w+\b', text)
+    return [legacy_norm(token) for token in tokens if len(token) > 1]
+
+
+def corpus_texts():
+    texts = []
+    for path in (SCRAPED_SERVICES_FILE, ENRICHED_SERVICES_FILE):
+        for service in iter_records(path):
+            for value in service.values():
+                if isinstance(value, str):
+                    texts.append(value)
+                elif isinstance(value, list):
+                    texts.extend(item for item in value if isinstance(item, str))
+    return texts
+
+
+def check_equivalence(texts):
+    # Every Arabic-block character alone and after a letter (covers NFC compositions)
+    samples = [chr(c) for c in range(0x0600, 0x0700)]
+    samples += [base + chr(c) for base in "اويه" for c in range(0x0600, 0x0700)]
+    for text in samples + texts:
+        assert norm(text) == legacy_norm(text), f"norm differs for {text[:50]!r}"
+        assert preprocess_text(text) == legacy_preprocess_text(text), f"preprocess_text differs for {text[:50]!r}"
+        for token in re.findall(r'\w+', text):
+            assert norm(token) == legacy_norm(token), f"norm differs for token {token!r}"
+
+
+def tokens_per_second(tokenize, texts, n_tokens, repeat=3, before_each=None):
+    best = float("inf")
+    for _ in range(repeat):
+        if before_each:
+            before_each()
+        start = time.perf_counter()
+        for text in texts:
+            tokenize(text)
+        best = min(best, time.perf_counter() - start)
+    return n_tokens / best
+
+
+def main():
+    texts = corpus_texts()
+    check_equivalence(texts)
+    n_tokens = sum(len(legacy_preprocess_text(text)) for text in texts)
+    print(f"new norm matches the old one on {len(texts)} texts ({n_tokens} tokens)")
+
+    results = {
+        "legacy": tokens_per_second(legacy_preprocess_text, texts, n_tokens),
+        "translate (cold cache)": tokens_per_second(
+            preprocess_text, texts, n_tokens, before_each=text_module._norm_cached.cache_clear
+        ),
+        "translate (warm cache)": tokens_per_second(preprocess_text, texts, n_tokens),
+    }
+    for name, rate in results.items():
+        print(f"preprocess_text {name:<24} {rate:>12,.0f} tokens/s")
+    return results
+
+
+if __name__ == "__main__":
+    main()
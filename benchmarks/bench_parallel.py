@@ -0,0 +1,90 @@
+"""
+Multi-process preprocessing (`build_vocabulary_matrix`: workers enrich and tokenize
+chunks of services once, the matrix is built from their partial counts) vs the serial
+pipeline (`bench_streaming.fit_category_vectorizer`, then `vectorizer.transform` of the short_texts in
+chunks, enriching the records in each pass).
+
+First checks, on the scraped services and on a 10x synthetic corpus, with 0, 2 and 4
+workers and small chunks, that the vocabulary, IDF weights, TF-IDF matrix (bit for bit)
+and keywords are the same as the serial ones. Then times both on growing synthetic
+corpora (see `suite.synthetic_services`), with 1 (in-process) to 4 workers.
+
+    python -m benchmarks.bench_parallel
+"""
+import os
+import time
+
+import numpy as np
+
+from config import SCRAPED_SERVICES_FILE
+from scraping.records import read_records
+
+
+def serial(services, chunk_size=1000):
+    from scipy import sparse
+    from benchmarks.bench_streaming import fit_category_vectorizer, iter_keyword_chunks
+    from preprocessing.preprocess import iter_enriched_services
+
+    vectorizer = fit_category_vectorizer(iter_enriched_services(dict(s) for s in services))
+    chunks = list(iter_keyword_chunks(iter_enriched_services(dict(s) for s in services), vectorizer, chunk_size=chunk_size))
+    keywords = [service["keywords"] for chunk, _ in chunks for service in chunk]
+    return vectorizer, sparse.vstack([matrix for _, matrix in chunks], format="csr"), keywords
+
+
+def parallel(services, workers, chunk_size=1000):
+    from preprocessing.preprocess import build_vocabulary_matrix, iter_enriched_services, iter_matrix_keyword_chunks
+
+    vectorizer, matrix = build_vocabulary_matrix((dict(s) for s in services), workers=workers, chunk_size=chunk_size)
+    chunks = iter_matrix_keyword_chunks(iter_enriched_services(dict(s) for s in services), vectorizer.get_feature_names_out(),
+                                        matrix, chunk_size=chunk_size)
+    keywords = [service["keywords"] for chunk in chunks for service in chunk]
+    return vectorizer, matrix, keywords
+
+
+def check_equivalence(services, workers, chunk_size):
+    expected, expected_matrix, expected_keywords = serial(services)
+    vectorizer, matrix, keywords = parallel(services, workers, chunk_size)
+    assert vectorizer.vocabulary_ == expected.vocabulary_, "different vocabulary"
+    assert np.array_equal(vectorizer.idf_, expected.idf_), "different IDF weights"
+    for name in ("data", "indices", "indptr"):
+        assert np.array_equal(getattr(matrix, name), getattr(expected_matrix, name)), f"different matrix {name}"
+    assert keywords == expected_keywords, "different keywords"
+
+
+def best_times(variants, rounds=5):
+    # Alternate the variants so they see the same machine noise
+    best = {name: float("inf") for name in variants}
+    for _ in range(rounds):
+        for name, function in variants.items():
+            start = time.perf_counter()
+            function()
+            best[name] = min(best[name], time.perf_counter() - start)
+    return best
+
+
+def main(scales=(1, 10, 40), worker_counts=(1, 2, 4)):
+    from benchmarks.suite import synthetic_services
+
+    services = read_records(SCRAPED_SERVICES_FILE)
+    for scale in (1, 10):
+        corpus = synthetic_services(services, scale)
+        for workers in (0, 2, 4):
+            check_equivalence(corpus, workers, chunk_size=64)
+    print("Parallel build: same vocabulary, IDF, matrix (bit for bit) and keywords as the serial pipeline "
+          "(1x, 10x; 0, 2, 4 workers)\n")
+
+    print(f"{os.cpu_count()} CPU(s)")
+    print(f"{'corpus':>7} {'services':>9} {'serial (s)':>11}" + "".join(f" {f'{n} worker(s)':>13}" for n in worker_counts))
+    results = {}
+    for scale in scales:
+        corpus = synthetic_services(services, scale)
+        variants = {"serial": lambda: serial(corpus)}
+        variants.update({workers: (lambda workers=workers: parallel(corpus, workers)) for workers in worker_counts})
+        times = best_times(variants, rounds=5 if scale < 40 else 3)
+        results[scale] = times
+        print(f"{scale:>6}x {len(corpus):>9} {times['serial']:>11.2f}" + "".join(f" {times[n]:>13.2f}" for n in worker_counts))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Hot reload under load: client threads keep querying `get_bot_response` while new
+artifact versions are published and swapped in (`reload_model`).
+
+Works on a temporary copy of `MODEL_DIR`. Every other published version has its
+services stored in a shuffled order (index rows and service records shuffled the same
+way), so a request pairing index rows of one version with service records of another
+would return the wrong service. Each response must be exactly what one of the two
+versions answers on its own. Also reports the latency seen by clients during the swaps.
+
+    python -m benchmarks.bench_reload
+"""
+import json
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config import DEPLOYMENT_SERVICES_FILE, MODEL_DIR
+from scraping.records import read_records
+from preprocessing.artifacts import (
+    VECTORIZER_META, ServiceStore, current_version, new_version, publish_version, save_services,
+)
+from preprocessing.index import RetrievalIndex
+
+
+def publish_shuffled(source_dir: Path, model_dir: Path, seed: int) -> str:
+    index = RetrievalIndex.load(source_dir, mmap_mode=None)
+    services = list(ServiceStore(source_dir))
+    order = np.random.default_rng(seed).permutation(len(services))
+
+    version_dir = new_version(model_dir)
+    RetrievalIndex.from_matrix(index.matrix[order]).save(version_dir)
+    save_services(version_dir, [services[i] for i in order])
+    for name in ("terms.npy", "idf.npy", VECTORIZER_META):
+        shutil.copy(source_dir / name, version_dir / name)
+    publish_version(version_dir, keep=2)
+    return version_dir.name
+
+
+def main(clients: int = 4, reloads: int = 10, interval: float = 0.2):
+    from chatbot import bot
+    from chatbot.model import ServingModel
+
+    messages = [service["service_name"] for service in read_records(DEPLOYMENT_SERVICES_FILE)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = Path(tmp) / "model"
+        source_dir = current_version(MODEL_DIR)[1]
+        shutil.copytree(source_dir, model_dir / "original")
+        publish_version(model_dir / "original")
+
+        # What each layout answers on its own (fresh models, no cache in the way)
+        models = [ServingModel(model_dir)]
+        publish_shuffled(model_dir / "original", model_dir, seed=0)
+        models.append(ServingModel(model_dir))
+        expected = [
+            {json.dumps(bot.get_tfidf_responses([message], model=model)[0], sort_keys=True) for model in models}
+            for message in messages
+        ]
+        publish_version(model_dir / "original")
+        bot.reload_model(model_dir=model_dir)
+
+        stop = threading.Event()
+        latencies, mismatches = [], []
+
+        def client(k: int):
+            i = k
+            while not stop.is_set():
+                message = messages[i % len(messages)]
+                start = time.perf_counter()
+                response = bot.get_bot_response(message)
+                latencies.append(time.perf_counter() - start)
+                data = response.get("data") if response["type"] == "tfidf" else None
+                if json.dumps(data, sort_keys=True) not in expected[i % len(messages)]:
+                    mismatches.append(message)
+                i += clients
+
+        threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+        for thread in threads:
+            thread.start()
+        swap_times = []
+        for n in range(reloads):
+            time.sleep(interval)
+            if n % 2 == 0:
+                publish_shuffled(model_dir / "original", model_dir, seed=0)
+            else:
+                publish_version(model_dir / "original")
+            start = time.perf_counter()
+            bot.reload_model(force=False, model_dir=model_dir)
+            swap_times.append(time.perf_counter() - start)
+        time.sleep(interval)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    latencies = np.array(latencies) * 1000
+    print(f"{len(latencies)} requests from {clients} threads during {reloads} reloads, {len(mismatches)} inconsistent responses")
+    print(f"load + swap: {np.mean(swap_times) * 1000:.1f} ms on average")
+    print(f"request latency: p50 {np.percentile(latencies, 50):.2f} ms, p99 {np.percentile(latencies, 99):.2f} ms, max {latencies.max():.2f} ms")
+    assert not mismatches, f"inconsistent responses, e.g. for {mismatches[0]!r}"
+    return {"requests": len(latencies), "swap_ms": float(np.mean(swap_times) * 1000), "mismatches": len(mismatches)}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Quality and cost of the category-aware re-ranking.
+
+Quality: every service is queried by its name, by two random words of its name and by
+the first six words of its description. An answer is right when it is the service
+itself or another listing of the same service URL. Reported per weighting: top-1
+accuracy, recall@5 (right answer among the first 5 candidates) and answered rate
+(best cosine score above the threshold, which re-ranking must not change).
+
+    python -m benchmarks.bench_rerank
+"""
+import random
+import time
+
+
+def build_queries(services, seed=0):
+    rng = random.Random(seed)
+    queries = {"name": [], "name words": [], "description": []}
+    for row, service in enumerate(services):
+        name_words = service["service_name"].split()
+        queries["name"].append((service["service_name"], row))
+        queries["name words"].append((" ".join(rng.sample(name_words, min(2, len(name_words)))), row))
+        queries["description"].append((" ".join(service.get("description", "").split()[:6]), row))
+    return queries
+
+
+def evaluate(bot, model, queries, services, threshold=0.3):
+    from chatbot.cache import ResponseCache
+
+    model.response_cache = ResponseCache(max_size=0)
+    urls = [service["service_url"] for service in services]
+    correct = answered = in_top5 = 0
+    for text, row in queries:
+        matches = bot.get_tfidf_matches([text], top_k=5, similarity_threshold=0.0, model=model)[0]
+        rows = [match_row for match_row, _ in matches]
+        if matches and max(score for _, score in matches) >= threshold:
+            answered += 1
+            correct += urls[rows[0]] == urls[row]
+        in_top5 += any(urls[match_row] == urls[row] for match_row in rows)
+    n = len(queries)
+    return correct / n, in_top5 / n, answered / n
+
+
+def time_queries(bot, model, messages, rounds=5):
+    from chatbot.cache import ResponseCache
+
+    best = float("inf")
+    for _ in range(rounds):
+        model.response_cache = ResponseCache(max_size=0)
+        start = time.perf_counter()
+        bot.get_tfidf_matches(messages, model=model)
+        best = min(best, time.perf_counter() - start)
+    return best / len(messages) * 1e6
+
+
+def check_no_match(bot, model, message="xyzqq"):
+    """
+    A message sharing no term with any service gets no candidates, for every number
+    of re-ranking candidates and backend.
+    """
+    import numpy as np
+    from chatbot.cache import ResponseCache
+
+    empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    for top_k in (1, 5):
+        rows, scores = model.retrieval_index.search(*empty, top_k=top_k)
+        assert len(rows) == len(scores) == 0, f"search(top_k={top_k}) found services for an empty query"
+    settings = (bot.RERANK_CANDIDATES, bot.RETRIEVAL_BACKEND)
+    try:
+        for candidates in (1, 10):
+            for backend in ("sparse", "lsa"):
+                bot.RERANK_CANDIDATES, bot.RETRIEVAL_BACKEND = candidates, backend
+                model.response_cache = ResponseCache(max_size=0)
+                assert bot.get_tfidf_matches([message], similarity_threshold=0.0, model=model) == [[]], \
+                    f"{message!r} answered with RERANK_CANDIDATES={candidates}, {backend}"
+    finally:
+        bot.RERANK_CANDIDATES, bot.RETRIEVAL_BACKEND = settings
+
+
+def main():
+    from chatbot import bot
+
+    model = bot.get_model()
+    services = list(model.services_data)
+    queries = build_queries(services)
+    weightings = {
+        "cosine only": (0.0, 0.0),
+        "+ category": (bot.RERANK_CATEGORY_WEIGHT, 0.0),
+        "+ keywords": (0.0, bot.RERANK_KEYWORD_WEIGHT),
+        "+ both": (bot.RERANK_CATEGORY_WEIGHT, bot.RERANK_KEYWORD_WEIGHT),
+    }
+    default_weights = weightings["+ both"]
+    check_no_match(bot, model)
+
+    results = {}
+    print(f"{'queries':<12} {'weighting':<12} {'top-1':>6} {'recall@5':>9} {'answered':>9}")
+    for query_name, query_list in queries.items():
+        for weighting, (category_weight, keyword_weight) in weightings.items():
+            bot.RERANK_CATEGORY_WEIGHT, bot.RERANK_KEYWORD_WEIGHT = category_weight, keyword_weight
+            top1, top5, answered = evaluate(bot, model, query_list, services)
+            results[(query_name, weighting)] = (top1, top5, answered)
+            print(f"{query_name:<12} {weighting:<12} {top1:>6.1%} {top5:>9.1%} {answered:>9.1%}")
+    bot.RERANK_CATEGORY_WEIGHT, bot.RERANK_KEYWORD_WEIGHT = default_weights
+
+    messages = [text for text, _ in queries["name"]]
+    categories = model.categories
+    plain_us = reranked_us = float("inf")
+    # Alternate both orderings so they see the same machine noise
+    for _ in range(7):
+        model.categories = None
+        plain_us = min(plain_us, time_queries(bot, model, messages, rounds=1))
+        model.categories = categories
+        reranked_us = min(reranked_us, time_queries(bot, model, messages, rounds=1))
+    results["latency"] = (plain_us, reranked_us)
+    print(f"\nus/query (cache off): cosine only {plain_us:.1f}, re-ranked {reranked_us:.1f}")
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
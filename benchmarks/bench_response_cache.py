@@ -0,0 +1,58 @@
+"""
+`get_bot_response` on repetitive traffic, with and without the response cache.
+
+The workload draws queries from the service names (plus the same names with their
+words shuffled) with a Zipf-like popularity, like real traffic where a handful of
+questions make up most requests. Both runs must give the same responses, and a
+shuffled query the same response as the original.
+
+    python -m benchmarks.bench_response_cache
+"""
+import random
+import time
+
+from config import DEPLOYMENT_SERVICES_FILE
+from scraping.records import read_records
+
+
+def make_workload(services_data, n_queries: int, seed: int = 0):
+    rng = random.Random(seed)
+    pool = []
+    for service in services_data:
+        name = service.get("service_name", "")
+        words = name.split()
+        rng.shuffle(words)
+        pool.extend([name, " ".join(words)])
+    weights = [1 / (rank + 1) for rank in range(len(pool))]
+    return pool, rng.choices(pool, weights=weights, k=n_queries)
+
+
+def main(n_queries: int = 5000):
+    from chatbot import bot
+    from chatbot.cache import ResponseCache
+
+    services_data = read_records(DEPLOYMENT_SERVICES_FILE)
+    pool, workload = make_workload(services_data, n_queries)
+
+    model = bot.get_model()
+    results = {}
+    for name, cache in (("no cache", ResponseCache(max_size=0)), ("cache", ResponseCache())):
+        model.response_cache = cache
+        bot.get_bot_response(workload[0])  # warm up
+        start = time.perf_counter()
+        responses = [bot.get_bot_response(query) for query in workload]
+        elapsed = time.perf_counter() - start
+        results[name] = {"responses": responses, "us_per_query": elapsed / n_queries * 1e6, "stats": cache.stats()}
+
+    assert results["cache"]["responses"] == results["no cache"]["responses"], "cached responses differ"
+    for original, shuffled in zip(pool[::2], pool[1::2]):
+        assert bot.get_bot_response(original) == bot.get_bot_response(shuffled), f"shuffled query differs: {original!r}"
+
+    print(f"{n_queries} queries, {len(set(workload))} distinct")
+    for name, r in results.items():
+        print(f"{name:<9} {r['us_per_query']:>8.1f} us/query  hit rate {r['stats']['hit_rate']:.1%}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Rule phrase matching: the word-level Aho–Corasick `RuleMatcher` vs scanning the message
+once per rule key (`str.find` of " key " in " message ", the straightforward way to find
+phrases anywhere in a message), as the rule table grows.
+
+Tables are `RESPONSE_RULES` plus synthetic 1-3 word phrases drawn from the words of the
+service names and descriptions. Messages are service names with a random phrase of the
+table inserted before, inside or after them. Both methods must find the same phrase
+occurrences in every message.
+
+    python -m benchmarks.bench_rules
+"""
+import random
+import time
+from collections import Counter
+
+from config import DEPLOYMENT_SERVICES_FILE, RESPONSE_RULES
+from scraping.records import read_records
+
+
+def synthetic_rules(words, size, seed=0):
+    rng = random.Random(seed)
+    rules = dict(RESPONSE_RULES)
+    while len(rules) < size:
+        rules[" ".join(rng.sample(words, rng.randint(1, 3)))] = "reply"
+    return rules
+
+
+def naive_find_all(phrases, words):
+    text = f" {' '.join(words)} "
+    found = Counter()
+    for phrase in phrases:
+        needle = f" {phrase} "
+        position = text.find(needle)
+        while position != -1:
+            found[phrase] += 1
+            position = text.find(needle, position + 1)
+    return found
+
+
+def main(sizes=(50, 500, 5000, 50_000), n_messages=1000, seed=0):
+    from chatbot.rules import RuleMatcher, rule_words
+
+    services = read_records(DEPLOYMENT_SERVICES_FILE)
+    vocabulary = sorted({word for service in services for word in rule_words(f"{service['service_name']} {service.get('description', '')}")})
+    rng = random.Random(seed)
+
+    results = {}
+    print(f"{'phrases':>8} {'build (ms)':>11} {'naive (us/msg)':>15} {'automaton (us/msg)':>19} {'speed-up':>9}")
+    for size in sizes:
+        rules = synthetic_rules(vocabulary, size, seed)
+        start = time.perf_counter()
+        matcher = RuleMatcher(rules)
+        build_ms = (time.perf_counter() - start) * 1000
+        phrases = list(matcher.replies)
+
+        messages = []
+        for _ in range(n_messages):
+            words = rule_words(rng.choice(services)["service_name"])
+            position = rng.randint(0, len(words))
+            messages.append(words[:position] + rng.choice(phrases).split() + words[position:])
+
+        start = time.perf_counter()
+        expected = [naive_find_all(phrases, words) for words in messages]
+        naive_us = (time.perf_counter() - start) / n_messages * 1e6
+        start = time.perf_counter()
+        found = [matcher.find_all(words) for words in messages]
+        automaton_us = (time.perf_counter() - start) / n_messages * 1e6
+
+        for words, naive, matches in zip(messages, expected, found):
+            if Counter(match.key for match in matches) != naive:
+                raise AssertionError(f"Different matches for {' '.join(words)!r}: {naive} vs {matches}")
+        results[size] = (build_ms, naive_us, automaton_us)
+        print(f"{len(phrases):>8} {build_ms:>11.1f} {naive_us:>15.1f} {automaton_us:>19.1f} {naive_us / automaton_us:>8.0f}x")
+    return results
+
+
+if __name__ == "__main__":
+    main()
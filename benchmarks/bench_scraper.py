@@ -0,0 +1,173 @@
+"""
+Service scraping against a local fixture copy of the portal (see
+`scraping/fixture_server.py`), with simulated network latency.
+
+- serial: the previous loop, one `requests.get` per page, no session or retries.
+- concurrent: `scrape_services` (pooled session, per-host rate limit, retries with
+  backoff, parsing in a process pool), with 10% of requests failing with a 503.
+
+Both must return exactly the saved records, in the same order.
+
+Then measures re-scrapes with the conditional-GET `ScrapeCache`: a cold run, a second
+run where every page is unchanged, and a run after 10 pages changed on the "portal".
+
+Last, `scrape_all_services` is interrupted after writing half of the records and run
+again: the scrape cache must have been saved with the pages fetched so far, a page
+whose processing raises (not an HTTP error) must only lose that service, the second
+run must only fetch the missing pages, and the NDJSON file it publishes must hold
+every record, in order.
+
+    python -m benchmarks.bench_scraper
+"""
+import json
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+import requests
+
+from config import SCRAPED_SERVICES_FILE
+from scraping import scraper
+from scraping.records import RecordWriter, read_records
+from scraping.fixture_server import FixtureServer, save_fixtures
+from scraping.cache import ScrapeCache
+from scraping.scraper import scrape_service_bs4, scrape_services
+
+
+def serial_scrape(services_by_category):
+    all_data = []
+    for category, services in services_by_category.items():
+        for service in services:
+            data = scrape_service_bs4(service["url"], category, session=requests)
+            if data:
+                all_data.append(data)
+    return all_data
+
+
+def main(latency: float = 0.05, max_workers: int = 16):
+    services_data = read_records(SCRAPED_SERVICES_FILE)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as fixtures_dir:
+        services_by_category = save_fixtures(services_data, fixtures_dir)
+
+        for name, failure_rate, scrape in (
+            ("serial", 0.0, serial_scrape),
+            ("concurrent", 0.1, lambda urls: scrape_services(
+                urls, max_workers=max_workers, requests_per_second=0, backoff_factor=0.01)),
+        ):
+            with FixtureServer(fixtures_dir, latency=latency, failure_rate=failure_rate) as server:
+                local_urls = {
+                    category: [{**service, "url": server.url(service["url"])} for service in services]
+                    for category, services in services_by_category.items()
+                }
+                expected = [
+                    {**service, "service_url": url["url"]}
+                    for service, url in zip(services_data, (u for services in local_urls.values() for u in services))
+                ]
+                start = time.perf_counter()
+                scraped = scrape(local_urls)
+                elapsed = time.perf_counter() - start
+                assert scraped == expected, f"{name} scrape does not match the saved records"
+                results[name] = {"seconds": elapsed, "requests": server.request_count}
+
+    for name, r in results.items():
+        print(f"{name:<11} {r['seconds']:>7.2f} s  {len(services_data) / r['seconds']:>7.1f} pages/s  {r['requests']:>4} requests")
+
+    results["cache"] = cached_rescrapes(services_data, latency, max_workers)
+    results["resume"] = interrupted_scrape(services_data, latency, max_workers)
+    return results
+
+
+def cached_rescrapes(services_data, latency, max_workers, n_changed=10):
+    results = {}
+    with tempfile.TemporaryDirectory() as fixtures_dir:
+        services_by_category = save_fixtures(services_data, fixtures_dir)
+        cache_file = Path(fixtures_dir) / "scrape_cache.json"
+        with FixtureServer(fixtures_dir, latency=latency) as server:
+            local_urls = {
+                category: [{**service, "url": server.url(service["url"])} for service in services]
+                for category, services in services_by_category.items()
+            }
+            for run in ("cold", "unchanged", f"{n_changed} changed"):
+                if run != "cold":
+                    time.sleep(1.1)  # Last-Modified has a one second resolution
+                if run == f"{n_changed} changed":
+                    for i in range(n_changed):
+                        page = Path(fixtures_dir) / "services" / f"{i * 7}.html"
+                        page.write_text(page.read_text(encoding="utf-8").replace("</h1>", " (محدث)</h1>"), encoding="utf-8")
+                cache = ScrapeCache(cache_file)
+                start = time.perf_counter()
+                scraped = scrape_services(local_urls, max_workers=max_workers, requests_per_second=0, cache=cache)
+                elapsed = time.perf_counter() - start
+                cache.save()
+                assert len(scraped) == len(services_data)
+                results[run] = {"seconds": elapsed, "fetched": cache.fetched, "reused": cache.not_modified + cache.unchanged}
+                print(f"cache, {run:<11} {elapsed:>6.2f} s  {cache.report()}")
+        assert sum(" (محدث)" in service["service_name"] for service in scraped) == n_changed
+    return results
+
+
+def interrupted_scrape(services_data, latency, max_workers):
+    with tempfile.TemporaryDirectory() as fixtures_dir:
+        fixtures_dir = Path(fixtures_dir)
+        services_by_category = save_fixtures(services_data, fixtures_dir)
+        output_file = fixtures_dir / "scraped.jsonl"
+        partial_file = fixtures_dir / "scraped.jsonl.partial"
+        cache_file = fixtures_dir / "scrape_cache.json"
+        with FixtureServer(fixtures_dir, latency=latency) as server:
+            local_urls = {
+                category: [{**service, "url": server.url(service["url"])} for service in services]
+                for category, services in services_by_category.items()
+            }
+            urls_file = fixtures_dir / "services_by_category.json"
+            urls_file.write_text(json.dumps(local_urls, ensure_ascii=False), encoding="utf-8")
+            expected = [
+                {**service, "service_url": url["url"]}
+                for service, url in zip(services_data, (u for services in local_urls.values() for u in services))
+            ]
+
+            write = RecordWriter.write
+            def crash_half_way(writer, record):
+                if writer.count == len(services_data) // 2:
+                    raise KeyboardInterrupt
+                write(writer, record)
+
+            # The last page fails with an error that is not an HTTP one, in the resumed run
+            failing_url = expected[-1]["service_url"]
+            fetch = scraper.fetch_service_page
+            def fail_last_page(service_url, *args, **kwargs):
+                if service_url == failing_url:
+                    raise ValueError("unexpected page")
+                return fetch(service_url, *args, **kwargs)
+
+            class FixtureCache(ScrapeCache):
+                def __init__(self, path=cache_file):
+                    super().__init__(path)
+
+            scrape_unthrottled = partial(scraper.iter_scraped_services, max_workers=max_workers, requests_per_second=0)
+            with mock.patch.multiple(scraper, SCRAPED_URLS_FILE=urls_file, SCRAPED_SERVICES_FILE=output_file,
+                                     SCRAPED_SERVICES_PARTIAL_FILE=partial_file, iter_scraped_services=scrape_unthrottled,
+                                     ScrapeCache=FixtureCache):
+                try:
+                    with mock.patch.object(RecordWriter, "write", crash_half_way):
+                        scraper.scrape_all_services()
+                except KeyboardInterrupt:
+                    pass
+                assert not output_file.exists() and len(read_records(partial_file)) == len(services_data) // 2
+                assert len(ScrapeCache(cache_file).entries) >= len(services_data) // 2, "scrape cache not saved on interruption"
+                requests_before = server.request_count
+                with mock.patch.object(scraper, "fetch_service_page", fail_last_page):
+                    scraper.scrape_all_services()
+            resumed_requests = server.request_count - requests_before
+
+        assert read_records(output_file) == expected[:-1], "resumed scrape does not match the saved records"
+        assert not partial_file.exists()
+    print(f"resume     {resumed_requests:>4} pages fetched after an interruption at {len(services_data) // 2}/{len(services_data)}")
+    return {"resumed_requests": resumed_requests}
+
+
+if __name__ == "__main__":
+    main()
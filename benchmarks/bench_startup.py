@@ -0,0 +1,98 @@
+"""
+Start-up time and memory of the chatbot: legacy pickle/JSON loading vs the
+memory-mapped artifacts in MODEL_DIR.
+
+Each variant runs in a fresh interpreter so imports are not shared:
+
+    python -m benchmarks.bench_startup
+"""
+import json
+import subprocess
+import sys
+import time
+
+import config  # noqa: F401  (puts the project root on sys.path)
+
+VARIANTS = ("pickle", "mmap")
+QUERY = "تجديد رخصة القيادة"
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import psutil
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def run_pickle():
+    """What chatbot/bot.py used to do at import time."""
+    start = time.perf_counter()
+    import pickle
+    from sklearn.metrics.pairwise import cosine_similarity
+    from config import VECTORIZER_FILE, DEPLOYMENT_SERVICES_FILE, SERVICES_MATRIX_FILE
+    from scraping.records import read_records
+    with open(VECTORIZER_FILE, "rb") as f:
+        vectorizer = pickle.load(f)
+    services_data = read_records(DEPLOYMENT_SERVICES_FILE)
+    with open(SERVICES_MATRIX_FILE, "rb") as f:
+        service_tfidf_matrix = pickle.load(f)
+    import_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    similarities = cosine_similarity(vectorizer.transform([QUERY]), service_tfidf_matrix).flatten()
+    services_data[int(similarities.argmax())]
+    first_query_time = time.perf_counter() - start
+    return import_time, first_query_time
+
+
+def run_mmap():
+    start = time.perf_counter()
+    from chatbot import bot
+    import_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bot.get_tfidf_response(QUERY)
+    first_query_time = time.perf_counter() - start
+    return import_time, first_query_time
+
+
+def child(variant: str):
+    import_time, first_query_time = {"pickle": run_pickle, "mmap": run_mmap}[variant]()
+    print(json.dumps({
+        "variant": variant,
+        "import_s": import_time,
+        "first_query_s": first_query_time,
+        "rss_mb": rss_mb(),
+    }))
+
+
+def main(repeat: int = 5):
+    results = {}
+    for variant in VARIANTS:
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_startup", "--child", variant],
+                capture_output=True, text=True, check=True,
+            )
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        results[variant] = {key: min(run[key] for run in runs) for key in ("import_s", "first_query_s", "rss_mb")}
+
+    print(f"{'variant':<8} {'import (ms)':>12} {'first query (ms)':>17} {'total (ms)':>11} {'RSS (MB)':>9}")
+    for variant, r in results.items():
+        total = r["import_s"] + r["first_query_s"]
+        print(f"{variant:<8} {r['import_s'] * 1000:>12.1f} {r['first_query_s'] * 1000:>17.1f} {total * 1000:>11.1f} {r['rss_mb']:>9.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        child(sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,183 @@
+"""
+Streaming preprocess (NDJSON in and out, records enriched as they are read, two-pass
+TF-IDF fit, vectorized in chunks) vs the former in-memory one (the whole JSON array
+loaded and enriched in place, the vectorizer fitted on the category-level texts,
+the enriched records dumped twice as indented JSON).
+
+First checks, on the scraped services and on a 10x synthetic corpus, that the
+streamed fit gives the same vocabulary, IDF weights, TF-IDF matrix and keywords
+as `vectorizer.fit` on the category-level texts. Then runs both pipelines on
+growing synthetic corpora (see `suite.synthetic_services`) and reports the time and
+the peak of Python memory allocations (tracemalloc, NumPy/SciPy buffers included).
+
+    python -m benchmarks.bench_streaming
+"""
+import io
+import json
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager, redirect_stdout
+from itertools import islice
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from config import SCRAPED_SERVICES_FILE
+from scraping.records import read_records, write_records
+
+
+def legacy_category_level_full_texts(services_data):
+    category_to_texts = defaultdict(list)
+    for service in services_data:
+        category_to_texts[service.get("category", "")].append(service["full_text"])
+    category_to_bigtext = {cat: " ".join(texts) for cat, texts in category_to_texts.items()}
+    return [category_to_bigtext[service.get("category", "")] for service in services_data]
+
+
+def legacy_extract_keywords(services_data, top_n=4):
+    from preprocessing.preprocess import make_vectorizer, top_keywords
+
+    vectorizer = make_vectorizer()
+    vectorizer.fit(legacy_category_level_full_texts(services_data))
+    services_matrix = vectorizer.transform([service["short_text"] for service in services_data])
+    for service, keywords in zip(services_data, top_keywords(services_matrix, vectorizer.get_feature_names_out(), top_n)):
+        service["keywords"] = keywords
+    return services_data, vectorizer, services_matrix
+
+
+def fit_category_vectorizer(services_data):
+    """
+    The serial streamed fit: one pass over the enriched services keeps the term set and
+    size of every category (see `preprocessing.preprocess._fit_category_terms`).
+    """
+    from preprocessing.preprocess import _fit_category_terms, make_vectorizer
+
+    analyze = make_vectorizer().build_analyzer()
+    category_terms = defaultdict(set)
+    category_sizes = Counter()
+    for service in services_data:
+        category = service.get("category", "")
+        category_terms[category].update(analyze(service["full_text"]))
+        category_sizes[category] += 1
+    return _fit_category_terms(category_terms, category_sizes)
+
+
+def iter_keyword_chunks(services_data, vectorizer, top_n=4, chunk_size=1000):
+    """
+    Transforms the short_texts with a fitted vectorizer `chunk_size` services at a time
+    and yields every chunk of services (with their 'keywords') along with its rows of
+    the TF-IDF matrix.
+    """
+    from preprocessing.preprocess import top_keywords
+
+    feature_names = vectorizer.get_feature_names_out()
+    services = iter(services_data)
+    while chunk := list(islice(services, chunk_size)):
+        matrix = vectorizer.transform([service["short_text"] for service in chunk])
+        for service, keywords in zip(chunk, top_keywords(matrix, feature_names, top_n)):
+            service["keywords"] = keywords
+        yield chunk, matrix
+
+
+def legacy_preprocess(scraped_file: Path, output_dir: Path):
+    """The former `preprocess()` up to the enriched and deployment JSON files."""
+    from preprocessing.preprocess import enrich_services_with_texts
+
+    with open(scraped_file, "r", encoding="utf-8") as f:
+        services_data = json.load(f)
+    enriched_services = enrich_services_with_texts(services_data)
+    enriched_services, vectorizer, services_matrix = legacy_extract_keywords(enriched_services)
+    for name in ("enriched_services_data.json", "deployment_services.json"):
+        with open(output_dir / name, "w", encoding="utf-8") as f:
+            json.dump(enriched_services, f, ensure_ascii=False, indent=2)
+
+
+@contextmanager
+def redirected_outputs(scraped_file: Path, output_dir: Path):
+    """`preprocess()` reading `scraped_file` and writing everything into `output_dir`."""
+    import config
+    from preprocessing import incremental
+
+    paths = {
+        "SCRAPED_SERVICES_FILE": scraped_file,
+        "ENRICHED_SERVICES_FILE": output_dir / "enriched_services_data.jsonl",
+        "DEPLOYMENT_SERVICES_FILE": output_dir / "deployment_services.jsonl",
+        "VECTORIZER_FILE": output_dir / "vectorizer.pkl",
+        "SERVICES_MATRIX_FILE": output_dir / "services_matrix.pkl",
+        "SERVICE_HASHES_FILE": output_dir / "service_hashes.json",
+        "MODEL_DIR": output_dir / "model",
+    }
+    # incremental.py imports its paths at module level
+    with mock.patch.multiple(config, **paths), \
+            mock.patch.multiple(incremental, **{name: path for name, path in paths.items() if hasattr(incremental, name)}):
+        yield
+
+
+def streaming_preprocess(scraped_file: Path, output_dir: Path):
+    from preprocessing.preprocess import preprocess
+
+    with redirected_outputs(scraped_file, output_dir), redirect_stdout(io.StringIO()):
+        preprocess()
+
+
+def check_equivalence(services, chunk_size=100):
+    from scipy import sparse
+    from preprocessing.preprocess import enrich_services_with_texts
+
+    expected_services, expected, expected_matrix = legacy_extract_keywords(enrich_services_with_texts([dict(s) for s in services]))
+    vectorizer = fit_category_vectorizer(enrich_services_with_texts([dict(s) for s in services]))
+    assert vectorizer.vocabulary_ == expected.vocabulary_, "different vocabulary"
+    assert np.array_equal(vectorizer.idf_, expected.idf_), "different IDF weights"
+
+    chunks = list(iter_keyword_chunks(enrich_services_with_texts([dict(s) for s in services]), vectorizer, chunk_size=chunk_size))
+    matrix = sparse.vstack([chunk_matrix for _, chunk_matrix in chunks], format="csr")
+    assert (matrix != expected_matrix).nnz == 0 and np.array_equal(matrix.indptr, expected_matrix.indptr), "different matrix"
+    keywords = [service["keywords"] for chunk, _ in chunks for service in chunk]
+    assert keywords == [service["keywords"] for service in expected_services], "different keywords"
+
+
+def measure(function, *args):
+    """Seconds for one run, then peak MiB of a second run (tracemalloc slows it down)."""
+    start = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        function(*args)
+        return seconds, tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def main(scales=(1, 10, 20, 40)):
+    from benchmarks.suite import synthetic_services
+
+    services = read_records(SCRAPED_SERVICES_FILE)
+    for scale in (1, 10):
+        check_equivalence(synthetic_services(services, scale))
+    print("Streamed fit: same vocabulary, IDF, matrix and keywords as the category-level fit (1x, 10x)\n")
+
+    results = {}
+    print(f"{'corpus':>7} {'services':>9} {'in-memory (s)':>14} {'peak (MiB)':>11} {'streaming (s)':>14} {'peak (MiB)':>11}")
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            corpus = synthetic_services(services, scale)
+            with open(tmp / "scraped.json", "w", encoding="utf-8") as f:
+                json.dump(corpus, f, ensure_ascii=False, indent=4)
+            write_records(tmp / "scraped.jsonl", corpus)
+            del corpus
+            (tmp / "legacy").mkdir()
+            (tmp / "streaming").mkdir()
+            legacy = measure(legacy_preprocess, tmp / "scraped.json", tmp / "legacy")
+            streaming = measure(streaming_preprocess, tmp / "scraped.jsonl", tmp / "streaming")
+        results[scale] = (legacy, streaming)
+        print(f"{scale:>6}x {len(services) * scale:>9} {legacy[0]:>14.2f} {legacy[1]:>11.1f} {streaming[0]:>14.2f} {streaming[1]:>11.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Bytes on the wire for the chat page and for `/chat` answers.
+
+Page: what a first visit and a repeat visit download, with the former routes (source
+files sent as they are, revalidated on every load) and with the static build
+(`chatbot/static.py`: gzip page, assets cached for a year under versioned URLs).
+
+`/chat`: average response size and time per request (Flask test client, response
+cache on) for the service names as messages, with and without alternatives:
+- escaped: JSON with \\uXXXX escapes, as before
+- utf-8: UTF-8 JSON
+- gzip: UTF-8 JSON, compressed when the client accepts it (CHAT_COMPRESS_MIN_BYTES)
+- fields: gzip with `"fields": ["service_name", "service_url"]`
+
+    python -m benchmarks.bench_transport
+"""
+import time
+
+from config import DEPLOYMENT_SERVICES_FILE
+from scraping.records import read_records
+
+VARIANTS = {
+    "escaped": (True, {}, None),
+    "utf-8": (False, {}, None),
+    "gzip": (False, {"Accept-Encoding": "gzip, br"}, None),
+    "fields": (False, {"Accept-Encoding": "gzip, br"}, ["service_name", "service_url"]),
+}
+
+
+def page_loads(client):
+    from chatbot.app import static_build
+    from chatbot.static import SOURCE_DIR, source_files
+
+    headers = {"Accept-Encoding": "gzip, br"}
+    former = sum((SOURCE_DIR / name).stat().st_size for name in source_files())
+    page = client.get("/", headers=headers)
+    first = len(page.data)
+    files = static_build().files
+    for name, entry in files.items():
+        if name != "index.html":
+            first += len(client.get(f"/{name}?v={entry['etag']}", headers=headers).data)
+    repeat = client.get("/", headers=dict(headers, **{"If-None-Match": page.headers["ETag"]}))
+    assert repeat.status_code == 304
+    n_files = len(files)
+    return {
+        "former": {"first": (n_files, former), "repeat": (n_files, 0)},
+        "static build": {"first": (n_files, first), "repeat": (1, len(repeat.data))},
+    }
+
+
+def chat_requests(client, messages, alternatives, rounds=5):
+    from chatbot.app import app
+
+    sizes = {}
+    best = {name: float("inf") for name in VARIANTS}
+    # Alternate the variants so they see the same machine noise
+    for _ in range(rounds):
+        for name, (ensure_ascii, headers, fields) in VARIANTS.items():
+            app.json.ensure_ascii = ensure_ascii
+            payload = {"alternatives": alternatives}
+            if fields:
+                payload["fields"] = fields
+            total = 0
+            start = time.perf_counter()
+            for message in messages:
+                total += len(client.post("/chat", json=dict(payload, message=message), headers=headers).data)
+            best[name] = min(best[name], (time.perf_counter() - start) / len(messages))
+            sizes[name] = total / len(messages)
+    app.json.ensure_ascii = False
+    return {name: (sizes[name], best[name] * 1e6) for name in VARIANTS}
+
+
+def main():
+    from chatbot.app import app
+
+    client = app.test_client()
+    results = {"page": page_loads(client)}
+    print(f"{'page':<13} {'first visit':>22} {'repeat visit':>22}")
+    for name, visits in results["page"].items():
+        print(f"{name:<13}" + "".join(f" {visits[visit][0]:>3} requests {visits[visit][1]:>9,} B" for visit in ("first", "repeat")))
+
+    messages = [service["service_name"] for service in read_records(DEPLOYMENT_SERVICES_FILE)]
+    print(f"\n{'/chat':<9} {'alternatives':>12} {'bytes':>8} {'us/request':>11}")
+    for alternatives in (0, 3):
+        results[alternatives] = chat_requests(client, messages, alternatives)
+        for name, (size, us) in results[alternatives].items():
+            print(f"{name:<9} {alternatives:>12} {size:>8,.0f} {us:>11.0f}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Replays a `/chat` capture (see `chatbot/capture.py`) as a load test: `manage.py replay`.
+
+The captured requests are sent in order, with their `alternatives` and `fields`, either
+to a running server (`--url`, POST <url>/chat) or in this process to `get_bot_response`
+(scoring only: no HTTP, JSON or compression).
+
+- Back to back (default): `concurrency` clients each send their next request as soon as
+  the previous one is answered. This measures the throughput the target can sustain.
+- At a fixed `rate` (requests per second): requests are started on schedule by up to
+  `concurrency` clients, whether the earlier ones were answered or not. A latency is
+  counted from the scheduled start, so the time a request waited for a free client is
+  included when the target falls behind.
+
+Reports the throughput, latency percentiles, errors, and the response types compared
+with the capture (they differ when the model or the rules changed since).
+"""
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from scraping.records import iter_records
+
+PERCENTILES = (50, 90, 99)
+
+
+def load_capture(path: Path, limit: Optional[int] = None) -> List[dict]:
+    requests = []
+    for record in iter_records(path):
+        if limit is not None and len(requests) >= limit:
+            break
+        requests.append(record)
+    return requests
+
+
+def http_sender(url: str):
+    import requests
+
+    local = threading.local()
+    chat_url = url.rstrip("/") + "/chat"
+
+    def send(record):
+        # One connection per client thread
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        payload = {"message": record.get("message", ""), "alternatives": record.get("alternatives", 0)}
+        if record.get("fields") is not None:
+            payload["fields"] = record["fields"]
+        response = local.session.post(chat_url, json=payload, headers={"Accept-Encoding": "gzip"})
+        response.raise_for_status()
+        return response.json()["response"]["type"]
+    return send
+
+
+def in_process_sender():
+    from chatbot.bot import get_bot_response
+
+    def send(record):
+        return get_bot_response(record.get("message", ""), alternatives=record.get("alternatives", 0))["type"]
+    return send
+
+
+def run_load(send, records: List[dict], concurrency: int = 1, rate: Optional[float] = None):
+    """
+    Sends every record once; returns the latencies (seconds, in record order), the
+    response types (None for errors) and the wall time.
+    """
+    latencies = [0.0] * len(records)
+    types: List[Optional[str]] = [None] * len(records)
+    next_index = iter(range(len(records)))
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def client():
+        while True:
+            with lock:
+                i = next(next_index, None)
+            if i is None:
+                return
+            sent = time.perf_counter()
+            if rate:
+                scheduled = start + i / rate
+                if scheduled > sent:
+                    time.sleep(scheduled - sent)
+                    # Waking up late is this client's delay, not the target's
+                    sent = time.perf_counter()
+                else:
+                    # Behind schedule: the wait for a free client counts
+                    sent = scheduled
+            try:
+                types[i] = send(records[i])
+            except Exception:
+                types[i] = None
+            latencies[i] = time.perf_counter() - sent
+
+    threads = [threading.Thread(target=client) for _ in range(max(concurrency, 1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), types, time.perf_counter() - start
+
+
+def report(records: List[dict], latencies: np.ndarray, types: List[Optional[str]], seconds: float) -> dict:
+    errors = sum(response_type is None for response_type in types)
+    captured = Counter(record.get("type") for record in records)
+    replayed = Counter(response_type for response_type in types if response_type is not None)
+    changed = sum(response_type is not None and response_type != record.get("type")
+                  for record, response_type in zip(records, types))
+    result = {
+        "requests": len(records),
+        "seconds": seconds,
+        "requests_per_second": len(records) / seconds if seconds else 0.0,
+        "errors": errors,
+        "changed_types": changed,
+        "captured_types": dict(captured),
+        "replayed_types": dict(replayed),
+        "max_ms": float(latencies.max() * 1000) if len(latencies) else 0.0,
+    }
+    for percentile in PERCENTILES:
+        result[f"p{percentile}_ms"] = float(np.percentile(latencies, percentile) * 1000) if len(latencies) else 0.0
+    return result
+
+
+def replay(capture: Path, url: Optional[str] = None, concurrency: int = 1, rate: Optional[float] = None,
+           limit: Optional[int] = None) -> dict:
+    records = load_capture(capture, limit)
+    if not records:
+        raise SystemExit(f"No requests in {capture}")
+    if url:
+        send, target = http_sender(url), url
+    else:
+        from chatbot.bot import get_model
+
+        send, target = in_process_sender(), "in-process get_bot_response"
+        # Load the model before the clock starts, then forget the warm-up answer:
+        # the first captured message must not be a cache hit
+        send(records[0])
+        get_model().response_cache.clear()
+    pace = f"{rate:g} requests/s" if rate else "back to back"
+    print(f"Replaying {len(records):,} requests against {target}, {pace}, concurrency {concurrency}...")
+
+    latencies, types, seconds = run_load(send, records, concurrency=concurrency, rate=rate)
+    result = report(records, latencies, types, seconds)
+    print(f"{result['requests']:,} requests in {seconds:.2f} s: {result['requests_per_second']:.1f} requests/s, "
+          f"{result['errors']} errors")
+    print("latency (ms): " + ", ".join(f"p{p} {result[f'p{p}_ms']:.2f}" for p in PERCENTILES) + f", max {result['max_ms']:.2f}")
+    print(f"response types: captured {result['captured_types']}, replayed {result['replayed_types']}, "
+          f"{result['changed_types']} changed")
+    return result
@@ -0,0 +1,361 @@
+"""
+Benchmark suite for the query hot path and the preprocessing pipeline (`manage.py bench`).
+
+Measures, on the shipped data and on synthetic corpora scaled up from it:
+
+- `text.*`: `preprocess_text` throughput over every text of the scraped services.
+- `load.*` / `query.*`: loading the serving model, single `get_bot_response` latency
+  (response cache off, and on for repeated queries) and batched `get_bot_responses`
+  latency per message. Scaled indexes stack perturbed copies of the shipped matrix.
+- `chat.e2e`: `/chat` through Flask's test client (JSON parsing and serialization included).
+- `startup.*`: import + first query of a fresh interpreter (see `bench_startup.py`).
+- `preprocess.*`: a full `preprocess()` (hashes, TF-IDF fit, keywords, enriched files and
+  a published model version, written into a temporary directory) of scaled copies of
+  the scraped services (each copy in its own categories, with its own marker word).
+
+Results are written as JSON and compared with a stored baseline (`benchmarks/baseline.json`);
+metrics that got worse by more than the tolerance are reported as regressions. Timings
+are machine dependent: record the baseline on the machine that runs the comparison.
+
+    python -m benchmarks.suite
+"""
+import json
+import pickle
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from config import BASE_DIR, MODEL_DIR, SCRAPED_SERVICES_FILE, SERVICES_MATRIX_FILE
+from scraping.records import read_records
+
+BASELINE_FILE = BASE_DIR / "benchmarks" / "baseline.json"
+RESULTS_DIR = BASE_DIR / "benchmarks" / "results"
+
+QUERY_SCALES = (1, 10, 100, 1000)
+PREPROCESS_SCALES = (1, 10)
+BATCH_SIZE = 64
+
+
+def metric(value: float, unit: str, better: str = "lower") -> dict:
+    return {"value": value, "unit": unit, "better": better}
+
+
+def best_of(function: Callable[[], object], rounds: int) -> float:
+    """Best wall time of `rounds` calls, in seconds."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def load_services() -> List[dict]:
+    return read_records(SCRAPED_SERVICES_FILE)
+
+
+def service_texts(services: List[dict]) -> List[str]:
+    texts = []
+    for service in services:
+        texts.extend([service.get("category", ""), service.get("service_name", ""), service.get("description", "")])
+        texts.extend(service.get("terms", []))
+        texts.extend(service.get("Documents", []))
+    return texts
+
+
+def synthetic_services(services: List[dict], scale: int, seed: int = 0) -> List[dict]:
+    """
+    `scale` copies of the scraped services. Every copy gets its own categories (so the
+    category-level texts the vectorizer is fitted on keep their size), a marker word in
+    the service name and shuffled description words.
+    """
+    if scale == 1:
+        return [dict(service) for service in services]
+    rng = random.Random(seed)
+    copies = []
+    for k in range(scale):
+        for service in services:
+            words = service.get("description", "").split()
+            rng.shuffle(words)
+            copies.append({
+                **service,
+                "category": f"{service.get('category', '')} نسخه{k}",
+                "service_name": f"{service.get('service_name', '')} رقم{k}",
+                "description": " ".join(words),
+            })
+    return copies
+
+
+def build_model_dir(directory: Path, scale: int, seed: int = 0) -> Path:
+    """
+    Serving artifacts for `scale` perturbed copies of the shipped index (same vocabulary),
+    with the rows of each category stored together like a scrape by category gives.
+    """
+    import numpy as np
+    from preprocessing.artifacts import VECTORIZER_META, ServiceStore, current_version, load_vocabulary, save_services
+    from preprocessing.categories import CategoryIndex, vocabulary_feature_ids
+    from preprocessing.index import RetrievalIndex
+    from benchmarks.bench_keywords import synthetic_matrix
+
+    source_dir = current_version(MODEL_DIR)[1]
+    with open(SERVICES_MATRIX_FILE, "rb") as f:
+        matrix = synthetic_matrix(pickle.load(f), scale, seed)
+    services = list(ServiceStore(source_dir)) * scale
+    categories = [service.get("category", "") for service in services]
+    first_row = {}
+    for row, category in enumerate(categories):
+        first_row.setdefault(category, row)
+    order = np.argsort([first_row[category] for category in categories], kind="stable")
+    services = [services[row] for row in order]
+
+    directory = Path(directory)
+    retrieval_index = RetrievalIndex.from_matrix(matrix[order])
+    retrieval_index.save(directory)
+    save_services(directory, services)
+    for name in ("terms.npy", "idf.npy", VECTORIZER_META):
+        shutil.copy(source_dir / name, directory / name)
+    terms, _ = load_vocabulary(directory, mmap_mode=None)
+    CategoryIndex.build(
+        retrieval_index,
+        [service.get("category", "") for service in services],
+        [vocabulary_feature_ids(terms, service.get("keywords", [])) for service in services],
+    ).save(directory)
+    return directory
+
+
+def bench_text(services: List[dict], rounds: int) -> Dict[str, dict]:
+    from preprocessing.text import _norm_cached, preprocess_text
+
+    texts = service_texts(services)
+    n_tokens = sum(len(preprocess_text(text)) for text in texts)
+
+    def run():
+        _norm_cached.cache_clear()
+        for text in texts:
+            preprocess_text(text)
+
+    return {"text.preprocess_text": metric(n_tokens / best_of(run, rounds), "tokens/s", "higher")}
+
+
+def bench_queries(messages: List[str], scales: Sequence[int], rounds: int) -> Dict[str, dict]:
+    from chatbot import bot
+    from chatbot.cache import ResponseCache
+
+    results = {}
+    try:
+        for scale in scales:
+            with tempfile.TemporaryDirectory() as tmp:
+                build_model_dir(tmp, scale)
+                load_time = best_of(lambda: bot.reload_model(model_dir=tmp), rounds)
+                results[f"load.model[{scale}x]"] = metric(load_time * 1000, "ms")
+                model = bot.get_model()
+
+                def single():
+                    model.response_cache = ResponseCache(max_size=0)
+                    for message in messages:
+                        bot.get_bot_response(message)
+
+                def batched():
+                    model.response_cache = ResponseCache(max_size=0)
+                    for i in range(0, len(messages), BATCH_SIZE):
+                        bot.get_bot_responses(messages[i:i + BATCH_SIZE])
+
+                results[f"query.single[{scale}x]"] = metric(best_of(single, rounds) / len(messages) * 1e6, "us/query")
+                results[f"query.batch[{scale}x]"] = metric(best_of(batched, rounds) / len(messages) * 1e6, "us/query")
+                if scale == 1:
+                    model.response_cache = ResponseCache()
+                    for message in messages:
+                        bot.get_bot_response(message)
+
+                    def cached():
+                        for message in messages:
+                            bot.get_bot_response(message)
+
+                    results["query.cached[1x]"] = metric(best_of(cached, rounds) / len(messages) * 1e6, "us/query")
+                del model
+    finally:
+        bot.reload_model(model_dir=MODEL_DIR)
+    return results
+
+
+def bench_chat(messages: List[str], rounds: int) -> Dict[str, dict]:
+    from chatbot.app import app
+    from chatbot.bot import get_model
+    from chatbot.cache import ResponseCache
+
+    client = app.test_client()
+    model = get_model()
+
+    def run():
+        model.response_cache = ResponseCache(max_size=0)
+        for message in messages:
+            client.post("/chat", json={"message": message})
+
+    seconds = best_of(run, rounds)
+    model.response_cache = ResponseCache()
+    return {"chat.e2e": metric(seconds / len(messages) * 1e6, "us/request")}
+
+
+def bench_startup(rounds: int) -> Dict[str, dict]:
+    runs = []
+    for _ in range(rounds):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--child", "mmap"],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "startup.import": metric(min(run["import_s"] for run in runs) * 1000, "ms"),
+        "startup.first_query": metric(min(run["first_query_s"] for run in runs) * 1000, "ms"),
+        "startup.rss": metric(min(run["rss_mb"] for run in runs), "MB"),
+    }
+
+
+def bench_preprocess(services: List[dict], scales: Sequence[int], rounds: int) -> Dict[str, dict]:
+    from scraping.records import write_records
+    from benchmarks.bench_streaming import streaming_preprocess
+
+    results = {}
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            write_records(tmp / "scraped.jsonl", synthetic_services(services, scale))
+            runs = iter(range(rounds))
+
+            def run():
+                # `preprocess()` with every output, MODEL_DIR included, in a fresh directory
+                output_dir = tmp / f"run{next(runs)}"
+                output_dir.mkdir()
+                streaming_preprocess(tmp / "scraped.jsonl", output_dir)
+
+            # Large corpora are timed once
+            results[f"preprocess[{scale}x]"] = metric(best_of(run, rounds if scale == 1 else 1), "s")
+    return results
+
+
+def run_suite(scales: Sequence[int] = QUERY_SCALES, preprocess_scales: Sequence[int] = PREPROCESS_SCALES,
+              rounds: int = 3) -> dict:
+    import numpy
+    import sklearn
+
+    services = load_services()
+    # Every service name a few times, so one round takes long enough to time reliably
+    messages = [service["service_name"] for service in services] * 4
+
+    metrics = {}
+    for name, bench in (
+        ("text", lambda: bench_text(services, rounds)),
+        ("queries", lambda: bench_queries(messages, scales, rounds)),
+        ("chat", lambda: bench_chat(messages, rounds)),
+        ("startup", lambda: bench_startup(rounds)),
+        ("preprocess", lambda: bench_preprocess(services, preprocess_scales, rounds)),
+    ):
+        print(f"Running {name} benchmarks...")
+        metrics.update(bench())
+
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "scikit-learn": sklearn.__version__,
+            "platform": platform.platform(),
+            "scales": list(scales),
+            "preprocess_scales": list(preprocess_scales),
+            "rounds": rounds,
+        },
+        "metrics": metrics,
+    }
+
+
+def median_results(runs: List[dict]) -> dict:
+    """
+    Per-metric median of several suite runs, which is far less sensitive to a noisy
+    machine than a single run.
+    """
+    merged = {"meta": {**runs[0]["meta"], "repeat": len(runs)}, "metrics": {}}
+    for name, first in runs[0]["metrics"].items():
+        values = sorted(run["metrics"][name]["value"] for run in runs)
+        merged["metrics"][name] = {**first, "value": values[len(values) // 2]}
+    return merged
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[dict]:
+    """
+    One row per metric present in both runs. `change` is the relative change in the
+    "worse" direction (positive: slower / lower throughput); beyond `tolerance` it is a regression.
+    """
+    rows = []
+    for name, current in results["metrics"].items():
+        base = baseline["metrics"].get(name)
+        if base is None:
+            continue
+        if current["better"] == "higher":
+            change = base["value"] / current["value"] - 1
+        else:
+            change = current["value"] / base["value"] - 1
+        rows.append({
+            "name": name, "unit": current["unit"], "baseline": base["value"], "current": current["value"],
+            "change": change, "regression": change > tolerance,
+        })
+    return rows
+
+
+def print_report(results: dict, rows: Optional[List[dict]]):
+    if rows is None:
+        print(f"{'metric':<26} {'value':>12}  unit")
+        for name, m in results["metrics"].items():
+            print(f"{name:<26} {m['value']:>12.2f}  {m['unit']}")
+        return
+    print(f"{'metric':<26} {'baseline':>12} {'current':>12}  {'unit':<10} {'change':>8}")
+    for row in rows:
+        status = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['name']:<26} {row['baseline']:>12.2f} {row['current']:>12.2f}  {row['unit']:<10} {row['change']:>+8.1%}{status}")
+
+
+def run(scales: Sequence[int] = QUERY_SCALES, preprocess_scales: Sequence[int] = PREPROCESS_SCALES, rounds: int = 3,
+        repeat: int = 1, output: Optional[Path] = None, baseline: Path = BASELINE_FILE, save_baseline: bool = False,
+        tolerance: float = 0.3) -> int:
+    """
+    Runs the suite `repeat` times (keeping the median of every metric), writes the
+    results and compares them with the baseline.
+    Returns 1 if any metric regressed by more than `tolerance`, else 0.
+    """
+    results = median_results([run_suite(scales, preprocess_scales, rounds) for _ in range(repeat)])
+
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if save_baseline:
+        shutil.copy(output, baseline)
+        print(f"Baseline saved to {baseline}")
+        print_report(results, None)
+        return 0
+
+    if not Path(baseline).exists():
+        print(f"No baseline at {baseline} (create one with --save-baseline).")
+        print_report(results, None)
+        return 0
+
+    with open(baseline, "r", encoding="utf-8") as f:
+        rows = compare(results, json.load(f), tolerance)
+    print_report(results, rows)
+    regressions = [row["name"] for row in rows if row["regression"]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
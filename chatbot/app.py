@@ -1,32 +1,288 @@
-from flask import Flask, request, jsonify, send_from_directory
+import asyncio
+import hmac
+import importlib.util
+import mimetypes
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from flask import Flask, Response, abort, g, request, jsonify, send_from_directory
 from flask_cors import CORS
-from .bot import get_bot_response
+from .bot import SERVICE_FIELDS, get_bot_responses, get_cache_stats, get_model, reload_model
+from .batching import MicroBatcher
+from .capture import CaptureWriter
+from .metrics import REGISTRY, REQUEST_SECONDS, STAGE_SECONDS
+from .static import ENCODINGS, load_static
+from config import (CHAT_BATCH_WINDOW_MS, CHAT_MAX_BATCH_SIZE, CHAT_ASYNC_THREADS, ADMIN_TOKEN, MAX_ALTERNATIVES,
+                    ASSET_MAX_AGE, CHAT_COMPRESS_MIN_BYTES, CHAT_COMPRESS_LEVEL, CHAT_CAPTURE_FILE)
 
-app = Flask(__name__, static_folder=".")
+# The page and its assets are served from the static build (see static.py), not from Flask's static folder
+app = Flask(__name__, static_folder=None)
+# Arabic text as UTF-8 (2 bytes a letter) instead of \uXXXX escapes (6 bytes)
+app.json.ensure_ascii = False
 CORS(app)
 
+@lru_cache(maxsize=1)
+def static_build():
+    # Checked (and built if needed) on the first page request, not when the app is imported
+    return load_static()
+
+def answer_messages(messages, debug=False, alternatives=0):
+    # (response, best cosine score) of every message, the score for the capture
+    best_scores = []
+    responses = get_bot_responses(messages, debug=debug, alternatives=alternatives, best_scores=best_scores)
+    return list(zip(responses, best_scores))
+
+def answer_message(message, debug=False, alternatives=0):
+    return answer_messages([message], debug=debug, alternatives=alternatives)[0]
+
+# Collects concurrent single /chat calls and scores them together (disabled when the window is 0)
+chat_batcher = None
+if CHAT_BATCH_WINDOW_MS > 0:
+    chat_batcher = MicroBatcher(
+        lambda messages: answer_messages(messages, debug=app.config.get("DEBUG", False)),
+        window_ms=CHAT_BATCH_WINDOW_MS,
+        max_batch_size=CHAT_MAX_BATCH_SIZE,
+    )
+
+# Records /chat requests for `manage.py replay` (see capture.py)
+chat_capture = CaptureWriter(CHAT_CAPTURE_FILE) if CHAT_CAPTURE_FILE else None
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    if "start_time" in g:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - g.start_time, route)
+    return response
+
+def read_json():
+    start = time.perf_counter()
+    data = request.get_json()
+    STAGE_SECONDS.observe(time.perf_counter() - start, "parse")
+    return data
+
+def read_alternatives(data):
+    # Other matching services to list with a TF-IDF answer, capped at MAX_ALTERNATIVES (None if invalid)
+    alternatives = data.get("alternatives", 0)
+    if isinstance(alternatives, bool) or not isinstance(alternatives, int) or alternatives < 0:
+        return None
+    return min(alternatives, MAX_ALTERNATIVES)
+
+ALTERNATIVES_ERROR = {"error": "'alternatives' must be a non-negative integer"}
+
+def read_fields(data):
+    # Service fields to return, all of them by default (None if invalid)
+    fields = data.get("fields")
+    if fields is None:
+        return SERVICE_FIELDS
+    if not isinstance(fields, list) or not all(field in SERVICE_FIELDS for field in fields):
+        return None
+    return tuple(dict.fromkeys(fields))
+
+FIELDS_ERROR = {"error": f"'fields' must be a list of service fields: {', '.join(SERVICE_FIELDS)}"}
+
+def project_fields(response, fields):
+    # Drops the service fields the client did not ask for, in the main record and the alternatives
+    if len(fields) == len(SERVICE_FIELDS) or response["type"] != "tfidf":
+        return response
+    projected = dict(response, data={field: response["data"][field] for field in fields})
+    if "alternatives" in response:
+        projected["alternatives"] = [{field: service[field] for field in fields} for service in response["alternatives"]]
+    return projected
+
+def json_response(payload):
+    start = time.perf_counter()
+    response = jsonify(payload)
+    STAGE_SECONDS.observe(time.perf_counter() - start, "serialize")
+    return compress_response(response)
+
+def compress_response(response):
+    # gzip for large responses (e.g. long `terms` lists, batches), when the client accepts it.
+    # Plain header writes: werkzeug's parsed `vary` / `content_length` cost more than the check.
+    response.headers["Vary"] = "Accept-Encoding"
+    data = response.get_data()
+    if len(data) < CHAT_COMPRESS_MIN_BYTES or request.accept_encodings.quality("gzip") <= 0:
+        return response
+    start = time.perf_counter()
+    # zlib directly (wbits=31: gzip container) skips the GzipFile object `gzip.compress` builds
+    compressor = zlib.compressobj(CHAT_COMPRESS_LEVEL, zlib.DEFLATED, 31)
+    response.set_data(compressor.compress(data) + compressor.flush())
+    response.headers["Content-Encoding"] = "gzip"
+    STAGE_SECONDS.observe(time.perf_counter() - start, "compress")
+    return response
+
+def capture_chat(data, response, best_score, answer_seconds):
+    # Only builds the record: the capture writer serializes and writes it in the background
+    if chat_capture is None:
+        return
+    chat_capture.write({
+        "time": time.time(),
+        "message": data.get("message", ""),
+        "alternatives": data.get("alternatives", 0),
+        "fields": data.get("fields"),
+        "type": response["type"],
+        "best_score": best_score,
+        "answer_ms": answer_seconds * 1000,
+        "request_ms": (time.perf_counter() - g.start_time) * 1000,
+    })
+
+def send_static(name):
+    """
+    Serves a file of the static build: the best precompressed variant the client
+    accepts, its content hash as the ETag (304 when the client has it), cached for
+    ASSET_MAX_AGE when requested with that hash (`?v=`), else revalidated on every load.
+    """
+    build = static_build()
+    entry = build.files.get(name)
+    if entry is None:
+        abort(404)
+    encoding = next((encoding for encoding in ENCODINGS if encoding in entry["encodings"]
+                     and request.accept_encodings.quality(encoding) > 0), None)
+    path = name + ENCODINGS[encoding] if encoding else name
+    etag = f"{entry['etag']}-{encoding}" if encoding else entry["etag"]
+    response = send_from_directory(build.directory, path, mimetype=mimetypes.guess_type(name)[0], etag=etag, conditional=True)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    if request.args.get("v") == entry["etag"]:
+        response.headers["Cache-Control"] = f"public, max-age={ASSET_MAX_AGE}, immutable"
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
 @app.route("/")
 def index():
-    return app.send_static_file("index.html")
+    return send_static("index.html")
 
 @app.route("/assets/<path:filename>")
 def serve_assets(filename):
-    return send_from_directory(f"{app.static_folder}/assets", filename)
+    return send_static(f"assets/{filename}")
 
 # Define a route that listens for POST requests at "/chat"
 @app.route("/chat", methods=["POST"])
 def chat():
     # Get the JSON data sent in the request body
-    data = request.get_json()
-    
+    data = read_json()
+
     # Extract the "message" field from the JSON data (default to empty string if not provided)
     message = data.get("message", "")
-    
+    alternatives = read_alternatives(data)
+    if alternatives is None:
+        return jsonify(ALTERNATIVES_ERROR), 400
+    fields = read_fields(data)
+    if fields is None:
+        return jsonify(FIELDS_ERROR), 400
+
     debug = app.config.get("DEBUG", False)  # Get debug flag from config
-    response = get_bot_response(message, debug=debug)
-    
+    start = time.perf_counter()
+    if chat_batcher is not None and not alternatives:
+        response, best_score = chat_batcher.submit(message)
+    else:
+        response, best_score = answer_message(message, debug=debug, alternatives=alternatives)
+    answer_seconds = time.perf_counter() - start
+
     # Return the bot's response as a JSON object
-    return jsonify({"response": response})
+    http_response = json_response({"response": project_fields(response, fields)})
+    capture_chat(data, response, best_score, answer_seconds)
+    return http_response
+
+# Async variant of /chat: scoring runs in a thread pool instead of the request's
+# event loop. Only registered when Flask's async support is installed (pip install "flask[async]").
+if importlib.util.find_spec("asgiref") is not None:
+    chat_executor = ThreadPoolExecutor(max_workers=CHAT_ASYNC_THREADS)
+
+    @app.route("/chat/async", methods=["POST"])
+    async def chat_async():
+        data = read_json()
+        message = data.get("message", "")
+        alternatives = read_alternatives(data)
+        if alternatives is None:
+            return jsonify(ALTERNATIVES_ERROR), 400
+        fields = read_fields(data)
+        if fields is None:
+            return jsonify(FIELDS_ERROR), 400
+
+        debug = app.config.get("DEBUG", False)
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        response, best_score = await loop.run_in_executor(chat_executor, answer_message, message, debug, alternatives)
+        answer_seconds = time.perf_counter() - start
+        http_response = json_response({"response": project_fields(response, fields)})
+        capture_chat(data, response, best_score, answer_seconds)
+        return http_response
+
+# Score many messages in one request: {"messages": [...]} -> {"responses": [...]} in the same order
+@app.route("/chat/batch", methods=["POST"])
+def chat_batch():
+    data = read_json()
+    messages = data.get("messages", [])
+    if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+        return jsonify({"error": "'messages' must be a list of strings"}), 400
+    alternatives = read_alternatives(data)
+    if alternatives is None:
+        return jsonify(ALTERNATIVES_ERROR), 400
+    fields = read_fields(data)
+    if fields is None:
+        return jsonify(FIELDS_ERROR), 400
+
+    debug = app.config.get("DEBUG", False)
+    responses = get_bot_responses(messages, debug=debug, alternatives=alternatives)
+    return json_response({"responses": [project_fields(response, fields) for response in responses]})
+
+# Hit/miss counters of the TF-IDF response cache
+@app.route("/chat/cache", methods=["GET"])
+def chat_cache():
+    return jsonify(get_cache_stats())
+
+def collect_model_metrics():
+    model = get_model()
+    stats = model.response_cache.stats()
+    return [
+        "# HELP najeeb_model_info Artifacts version being served.",
+        "# TYPE najeeb_model_info gauge",
+        f'najeeb_model_info{{version="{model.version}"}} 1',
+        "# HELP najeeb_response_cache_lookups_total Response cache lookups, by result.",
+        "# TYPE najeeb_response_cache_lookups_total counter",
+        f'najeeb_response_cache_lookups_total{{result="hit"}} {stats["hits"]}',
+        f'najeeb_response_cache_lookups_total{{result="miss"}} {stats["misses"]}',
+        "# HELP najeeb_response_cache_entries Entries in the response cache.",
+        "# TYPE najeeb_response_cache_entries gauge",
+        f"najeeb_response_cache_entries {stats['size']}",
+    ]
+
+REGISTRY.collectors.append(collect_model_metrics)
+
+# Prometheus text exposition of the latency histograms and counters of this process
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+def is_admin_request():
+    # No token, no admin calls: behind a reverse proxy every client looks local
+    if not ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN)
+
+# Switch to the artifacts version published by the last preprocess run without a restart.
+# Only reloads the worker that gets the call; all workers also check by themselves
+# every MODEL_WATCH_INTERVAL seconds. Disabled unless ADMIN_TOKEN is set.
+@app.route("/reload", methods=["POST"])
+def reload():
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "reload is disabled, set NAJEEB_ADMIN_TOKEN to enable it"}), 403
+    if not is_admin_request():
+        return jsonify({"error": "forbidden"}), 403
+
+    previous_version = get_model().version
+    try:
+        model = reload_model(force=False)
+    except Exception as e:
+        return jsonify({"error": f"reload failed, still serving {previous_version}: {e}"}), 500
+    return jsonify({"previous_version": previous_version, "version": model.version})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+
+class MicroBatcher:
+    """
+    Collects items submitted concurrently from many threads for a short window and
+    hands them to `handler` as one list, so the scoring cost is paid once per batch.
+
+    `submit` blocks the calling thread until its own result is ready.
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], List[Any]], window_ms: float = 5, max_batch_size: int = 64):
+        self.handler = handler
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending: List[tuple] = []
+        self._cond = threading.Condition()
+        self._worker = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so pre-forked workers start their own.
+        if self._worker is None or self._pid != os.getpid():
+            self._pending = []
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name="chat-micro-batcher", daemon=True)
+            self._worker.start()
+
+    def submit(self, item: Any) -> Any:
+        future: Future = Future()
+        with self._cond:
+            self._ensure_worker()
+            self._pending.append((item, future))
+            self._cond.notify()
+        return future.result()
+
+    def _take_batch(self) -> List[tuple]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # Keep the window open until it expires or the batch is full
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            items = [item for item, _ in batch]
+            try:
+                results = self.handler(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
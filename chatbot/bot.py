@@ -1,27 +1,104 @@
-import json
 import os
-import pickle
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
 import random
-from preprocessing.preprocess import norm
-from config import RESPONSE_RULES, DEFAULT_RESPONSE, VECTORIZER_FILE, DEPLOYMENT_SERVICES_FILE, SERVICES_MATRIX_FILE
+import threading
+import time
+from .metrics import STAGE_SECONDS, RESPONSES, BEST_SCORE
+from .rules import RuleMatcher, rule_words
+from config import (
+    RESPONSE_RULES, WHOLE_MESSAGE_RULES, DEFAULT_RESPONSE, MODEL_DIR, MODEL_WATCH_INTERVAL,
+    RERANK_CANDIDATES, RERANK_CATEGORY_WEIGHT, RERANK_KEYWORD_WEIGHT, RETRIEVAL_BACKEND,
+    FUZZY_MIN_LENGTH, FUZZY_TWO_EDITS_LENGTH,
+)
 
-# Load TF-IDF vectorizer
-with open(VECTORIZER_FILE, "rb") as f:
-    vectorizer = pickle.load(f)
+# The artifacts are loaded lazily on the first query instead of at import, so
+# importing this module (manage.py, forked workers) stays cheap.
+_model = None
+_model_lock = threading.Lock()
+_watcher_lock = threading.Lock()
+_watcher_pid = None
+_rule_matcher = None
+_whole_message_rules = {" ".join(rule_words(key)) for key in WHOLE_MESSAGE_RULES}
 
-# Load services data
-with open(os.path.join(DEPLOYMENT_SERVICES_FILE), "r", encoding="utf-8") as f:
-    services_data = json.load(f)
+def _reset_locks():
+    # A fork can happen while the watcher of the parent holds a lock (e.g. mid-reload)
+    global _model_lock, _watcher_lock
+    _model_lock = threading.Lock()
+    _watcher_lock = threading.Lock()
 
-# Load TF-IDF matrix (pickle file)
-with open(SERVICES_MATRIX_FILE, "rb") as f:
-    service_tfidf_matrix = pickle.load(f)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_locks)
 
-def get_rule_response(user_input):
-    normalized = norm(user_input)
-    response = RESPONSE_RULES.get(normalized)
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from .model import ServingModel  # pulls in numpy, so only on first use
+                _model = ServingModel()
+    if MODEL_WATCH_INTERVAL > 0 and _watcher_pid != os.getpid():
+        _start_watcher()
+    return _model
+
+def reload_model(force=True, model_dir=None):
+    """
+    Loads the artifacts version published by the last `preprocess()` run while the
+    current model keeps serving, then swaps it in with a single assignment. Requests
+    in flight finish on the model they started with, and the response cache belongs to
+    the model, so the cached matches of the previous artifacts go with it.
+
+    Without `force`, nothing is loaded if that version is already being served.
+    `model_dir` defaults to the directory of the current model (MODEL_DIR at first).
+    Returns the model in use afterwards.
+    """
+    global _model
+    from .model import ServingModel, published_version
+    with _model_lock:
+        if model_dir is None:
+            model_dir = _model.model_dir if _model is not None else MODEL_DIR
+        if not force and _model is not None and published_version(model_dir) == _model.version:
+            return _model
+        model = ServingModel(model_dir)
+        _model = model
+    print(f"Serving artifacts version {model.version}")
+    return model
+
+def _start_watcher():
+    # Threads do not survive a fork, so pre-forked workers start their own.
+    global _watcher_pid
+    with _watcher_lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+    threading.Thread(target=_watch_artifacts, name="artifact-watcher", daemon=True).start()
+
+def _watch_artifacts():
+    # Every worker polls the published version and switches over by itself
+    while True:
+        time.sleep(MODEL_WATCH_INTERVAL)
+        try:
+            reload_model(force=False)
+        except Exception as e:
+            print(f"Reloading the artifacts failed, still serving the previous version: {e}")
+
+def get_cache_stats():
+    return get_model().response_cache.stats()
+
+def __getattr__(name):
+    # Keep `bot.services_data`, `bot.retrieval_index`, ... working as module attributes
+    if name in ("encoder", "services_data", "retrieval_index"):
+        return getattr(get_model(), name)
+    if name == "service_tfidf_matrix":
+        return get_model().retrieval_index.matrix
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_rule_matcher():
+    # Built once from RESPONSE_RULES (before the workers fork, by the warm-up query)
+    global _rule_matcher
+    if _rule_matcher is None:
+        _rule_matcher = RuleMatcher(RESPONSE_RULES)
+    return _rule_matcher
+
+def pick_reply(response):
     if isinstance(response, list):
         return random.choice(response)
     elif isinstance(response, str):
@@ -29,19 +106,47 @@ def get_rule_response(user_input):
     else:
         return None
 
-def get_tfidf_response(user_input, similarity_threshold=0.3, debug=False):
-    query_vec = vectorizer.transform([user_input])
-    similarities = cosine_similarity(query_vec, service_tfidf_matrix).flatten()
-    best_idx = np.argmax(similarities)
-    best_score = similarities[best_idx]
+def match_rules(user_input, model=None):
+    """
+    Finds the rule phrases in a message in one pass.
+    Returns (reply, rest of the message):
+    - only rule phrases: the reply to the first one and "".
+    - rule phrases and other words: the reply to the first phrase that may be part of a
+      longer message and the other words, or (None, message). Phrases in
+      WHOLE_MESSAGE_RULES and phrases with a term of the model's vocabulary (تسلم in
+      "موعد تسلم جواز السفر") may not: they are left in the message.
+    - no rule phrase: (None, message).
+    """
+    matcher = get_rule_matcher()
+    words = rule_words(user_input)
+    matches = matcher.find(words)
+    if not matches:
+        return None, user_input
+    if sum(match.end - match.start for match in matches) == len(words):
+        return pick_reply(matcher.replies[matches[0].key]), ""
 
-    if debug:
-        print(f"[DEBUG] Best index: {best_idx}, Best score: {best_score}")
+    vocabulary_rules = (model or get_model()).vocabulary_rules
+    matches = [match for match in matches if match.key not in _whole_message_rules and match.key not in vocabulary_rules]
+    if not matches:
+        return None, user_input
+    covered = set()
+    for match in matches:
+        covered.update(range(match.start, match.end))
+    rest = " ".join(word for i, word in enumerate(words) if i not in covered)
+    return pick_reply(matcher.replies[matches[0].key]), rest
 
-    if best_score < similarity_threshold:
-        return None
+def get_rule_response(user_input):
+    """
+    Rule reply when the message consists of rule phrases only, else None.
+    """
+    response, rest = match_rules(user_input)
+    return response if not rest else None
+
+# Fields of the service records in TF-IDF responses (a request may ask for a subset of them)
+SERVICE_FIELDS = ("category", "service_name", "service_url", "description", "terms", "keywords")
 
-    service = services_data[best_idx]
+def build_service_response(service_idx, model=None):
+    service = (model or get_model()).services_data[service_idx]
     return {
         "category": service.get("category", ""),
         "service_name": service.get("service_name", ""),
@@ -51,16 +156,214 @@ def get_tfidf_response(user_input, similarity_threshold=0.3, debug=False):
         "keywords": service.get("keywords", []),
     }
 
-def get_bot_response(user_input, debug = False):
-    # 1) Try rule-based first (greeting/bye)
-    rule_response = get_rule_response(user_input)
-    if rule_response:
-        return {"type": "rule", "response": rule_response}
-    
-    # 2) Try TF-IDF similarity matching
-    tfidf_response = get_tfidf_response(user_input, debug=debug)
-    if tfidf_response:
-        return {"type": "tfidf", "data": tfidf_response}
-    
-    # 3) Default fallback
-    return {"type": "default", "response": DEFAULT_RESPONSE}
+def rank_candidates(query_indices, query_weights, model=None):
+    """
+    `rank_candidates_batch` for one encoded query.
+    """
+    return rank_candidates_batch([(query_indices, query_weights)], model=model)[0]
+
+def rank_candidates_batch(queries, model=None):
+    """
+    Scores the services for encoded queries ((term ids, weights) pairs) and returns,
+    per query, the best RERANK_CANDIDATES as (service index, cosine score) pairs,
+    ordered by the re-ranked score: the cosine score plus the weighted similarity of
+    the query to the service's category centroid and the weighted share of the
+    service's keywords found in the query. Both come out of the same pass over the
+    postings lists as the cosine scores, done once per group of queries (see
+    `RetrievalIndex.query_groups`).
+
+    Artifacts without category data are ordered by cosine score alone.
+
+    With RETRIEVAL_BACKEND = "lsa" (and an LSA index in the artifacts), the cosine
+    scores are those of the int8 LSA vectors, for every service. The keyword shares
+    still come from a pass over the postings lists, so services that share no term
+    with the query get none.
+    """
+    model = model or get_model()
+    lsa = model.lsa if RETRIEVAL_BACKEND == "lsa" else None
+    if len(queries) == 1 or lsa is not None:
+        return _rank_group(queries, model, lsa)
+    results = [None] * len(queries)
+    for group in model.retrieval_index.query_groups(queries):
+        for i, candidates in zip(group, _rank_group([queries[i] for i in group], model, lsa)):
+            results[i] = candidates
+    return results
+
+def _rank_group(queries, model, lsa):
+    from preprocessing.index import pair_values, top_k_per_query
+
+    categories = model.categories
+    if lsa is None or categories is not None:
+        sparse_ids, sparse_rows, sparse_scores, keyword_overlap = model.retrieval_index.score_batch(
+            queries, posting_values=None if categories is None else categories.postings_keywords)
+    if lsa is not None:
+        query_ids, rows, scores = lsa.score_batch(queries)
+    else:
+        query_ids, rows, scores = sparse_ids, sparse_rows, sparse_scores
+
+    ranked = scores
+    if categories is not None:
+        service_categories = categories.service_categories[rows]
+        if lsa is not None:
+            category_scores = categories.category_scores_batch(queries)
+            keyword_overlap = pair_values(query_ids, rows, sparse_ids, sparse_rows, keyword_overlap,
+                                          model.retrieval_index.n_services)
+        else:
+            category_scores = categories.category_scores_from_pairs(query_ids, service_categories, scores, len(queries))
+        ranked = (scores + RERANK_CATEGORY_WEIGHT * category_scores[query_ids, service_categories]
+                  + RERANK_KEYWORD_WEIGHT * keyword_overlap)
+
+    # Highest re-ranked score first, the lowest row on ties (like the plain search)
+    best = top_k_per_query(query_ids, rows, ranked, len(queries), RERANK_CANDIDATES)
+    return [list(zip(rows[positions].tolist(), scores[positions].tolist())) for positions in best]
+
+def best_candidate_score(candidates):
+    return max((score for _, score in candidates), default=0.0)
+
+def get_tfidf_matches(user_inputs, top_k=1, similarity_threshold=0.3, debug=False, model=None, best_scores=None):
+    """
+    Encodes all messages, then looks them up in the retrieval index together.
+    Returns, per message in order, up to `top_k` (service index, cosine score) pairs,
+    best first, leaving out services scoring below `similarity_threshold`.
+
+    The ranked candidates of a query are cached under its sorted, normalized tokens:
+    the TF-IDF vector only depends on which tokens occur how often, not on their order.
+    The messages missing from the cache are scored in one `rank_candidates_batch` call.
+    Unknown words are corrected (see `preprocessing/fuzzy.py`), and the corrections
+    are kept only when they do not lower the best score: a correctly
+    spelled word the vocabulary does not have (جواز) would otherwise become an
+    unrelated term (جهاز) and push the right service down.
+
+    With a `best_scores` list, the best cosine score of every message (whether above
+    the threshold or not) is appended to it.
+    """
+    model = model or get_model()
+    cache_keys, found, misses = [], {}, {}
+    for user_input in user_inputs:
+        start = time.perf_counter()
+        tokens = model.encoder.tokenize(user_input)
+        corrected = tokens
+        if model.fuzzy is not None:
+            corrected = model.fuzzy.correct(tokens, FUZZY_MIN_LENGTH, FUZZY_TWO_EDITS_LENGTH)
+        cache_key = " ".join(sorted(tokens))
+        tokenized = time.perf_counter()
+        STAGE_SECONDS.observe(tokenized - start, "tokenize")
+
+        cache_keys.append(cache_key)
+        if cache_key in found or cache_key in misses:
+            # Messages with the same tokens are looked up and scored once
+            continue
+        candidates = model.response_cache.get(cache_key)
+        STAGE_SECONDS.observe(time.perf_counter() - tokenized, "cache")
+        if candidates is None:
+            misses[cache_key] = (tokens, corrected)
+        else:
+            found[cache_key] = candidates
+
+    if misses:
+        start = time.perf_counter()
+        queries, corrected_queries = [], []
+        for tokens, corrected in misses.values():
+            queries.append(model.encoder.encode_tokens(tokens))
+            if corrected != tokens:
+                corrected_queries.append((len(queries) - 1, model.encoder.encode_tokens(corrected)))
+        encoded = time.perf_counter()
+        STAGE_SECONDS.observe(encoded - start, "encode")
+        ranked = rank_candidates_batch(queries + [query for _, query in corrected_queries], model=model)
+        for (i, _), corrected_candidates in zip(corrected_queries, ranked[len(queries):]):
+            if best_candidate_score(corrected_candidates) >= best_candidate_score(ranked[i]):
+                ranked[i] = corrected_candidates
+        for cache_key, candidates in zip(misses, ranked):
+            model.response_cache.put(cache_key, candidates)
+            found[cache_key] = candidates
+        STAGE_SECONDS.observe(time.perf_counter() - encoded, "search")
+
+    results = []
+    for cache_key in cache_keys:
+        candidates = found[cache_key]
+        best_score = best_candidate_score(candidates)
+        BEST_SCORE.observe(best_score)
+        if best_scores is not None:
+            best_scores.append(best_score)
+
+        if debug:
+            best_idx, best_score = candidates[0] if candidates else (None, 0.0)
+            print(f"[DEBUG] Best index: {best_idx}, Best score: {best_score}")
+
+        results.append([(row, score) for row, score in candidates if score >= similarity_threshold][:top_k])
+    return results
+
+def get_tfidf_responses(user_inputs, similarity_threshold=0.3, debug=False, model=None):
+    """
+    Best matching service of every message (or None when nothing scores above the threshold).
+    """
+    model = model or get_model()
+    results = []
+    for matches in get_tfidf_matches(user_inputs, similarity_threshold=similarity_threshold, debug=debug, model=model):
+        results.append(build_service_response(matches[0][0], model) if matches else None)
+    return results
+
+def get_tfidf_response(user_input, similarity_threshold=0.3, debug=False):
+    return get_tfidf_responses([user_input], similarity_threshold=similarity_threshold, debug=debug)[0]
+
+def get_bot_responses(user_inputs, debug=False, alternatives=0, best_scores=None):
+    """
+    Batched version of `get_bot_response`. Rule matches are answered directly and
+    the remaining messages are scored together in a single TF-IDF pass.
+
+    With a `best_scores` list, the best cosine score of every message is appended to
+    it, None for the messages answered by a rule alone.
+    """
+    # One model for the whole batch, even if a reload swaps it in the meantime
+    model = get_model()
+    responses = [None] * len(user_inputs)
+
+    # 1) Try rule-based first (greeting/bye); not cached, so the reply still varies.
+    # A message with other words besides its rule phrases also goes to TF-IDF, without them.
+    pending = []
+    pending_texts = []
+    rule_responses = {}
+    for i, user_input in enumerate(user_inputs):
+        start = time.perf_counter()
+        rule_response, rest = match_rules(user_input, model)
+        STAGE_SECONDS.observe(time.perf_counter() - start, "rules")
+        if rule_response and not rest:
+            responses[i] = {"type": "rule", "response": rule_response}
+        else:
+            pending.append(i)
+            pending_texts.append(rest)
+            rule_responses[i] = rule_response
+
+    # 2) Try TF-IDF similarity matching for everything left, in one batch
+    pending_scores = []
+    matches = get_tfidf_matches(pending_texts, top_k=1 + alternatives, debug=debug, model=model, best_scores=pending_scores)
+    for i, service_matches in zip(pending, matches):
+        if service_matches:
+            start = time.perf_counter()
+            responses[i] = {"type": "tfidf", "data": build_service_response(service_matches[0][0], model)}
+            if rule_responses[i]:
+                # e.g. a greeting before the question, answered before the service
+                responses[i]["rule_response"] = rule_responses[i]
+            if alternatives:
+                # The next best services, for a "did you mean" list
+                responses[i]["alternatives"] = [build_service_response(row, model) for row, _ in service_matches[1:]]
+            STAGE_SECONDS.observe(time.perf_counter() - start, "build")
+        else:
+            # 3) Default fallback: the rest of the message was a question that went unanswered
+            responses[i] = {"type": "default", "response": DEFAULT_RESPONSE}
+            if rule_responses[i]:
+                responses[i]["rule_response"] = rule_responses[i]
+
+    for response in responses:
+        RESPONSES.inc(response["type"])
+    if best_scores is not None:
+        scores = dict(zip(pending, pending_scores))
+        best_scores.extend(scores.get(i) for i in range(len(user_inputs)))
+    return responses
+
+def get_bot_response(user_input, debug=False, alternatives=0):
+    """
+    Answers one message. With `alternatives` > 0, a TF-IDF answer also lists up to that
+    many other matching services, best first.
+    """
+    return get_bot_responses([user_input], debug=debug, alternatives=alternatives)[0]
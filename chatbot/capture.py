@@ -0,0 +1,98 @@
+"""
+Capture of `/chat` traffic, to replay it as a load test (`manage.py replay`).
+
+With CHAT_CAPTURE_FILE set (NAJEEB_CHAT_CAPTURE environment variable), every `/chat`
+and `/chat/async` request is recorded as one NDJSON line (see `scraping/records.py`):
+the message and the options of the request, the response type, the best cosine score
+(null for rule answers) and the server times.
+
+A request only appends its record to a queue. A background thread turns the queued
+records into JSON and appends them to the file in one write, every
+CHAT_CAPTURE_FLUSH_INTERVAL seconds or as soon as CHAT_CAPTURE_FLUSH_RECORDS are
+waiting. The file is opened in append mode for every write, so gunicorn workers can
+share it (their blocks never interleave) and it can be rotated by moving it away.
+When more than CHAT_CAPTURE_MAX_PENDING records are waiting, new ones are dropped and
+counted instead of slowing requests down.
+"""
+import atexit
+import json
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from config import CHAT_CAPTURE_FLUSH_RECORDS, CHAT_CAPTURE_FLUSH_INTERVAL, CHAT_CAPTURE_MAX_PENDING
+
+
+class CaptureWriter:
+    def __init__(self, path: Path, flush_records: int = CHAT_CAPTURE_FLUSH_RECORDS,
+                 flush_interval: float = CHAT_CAPTURE_FLUSH_INTERVAL, max_pending: int = CHAT_CAPTURE_MAX_PENDING):
+        self.path = Path(path)
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.written = 0
+        self.dropped = 0
+        # deque appends and pops are atomic, so requests never wait for a lock
+        self._pending = deque()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+        atexit.register(self.flush)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The writer of the parent may hold the lock, and writes the parent's records itself
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending.clear()
+
+    def write(self, record: dict):
+        if self._pid != os.getpid():
+            self._ensure_worker()
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append(record)
+        if len(self._pending) >= self.flush_records:
+            self._wake.set()
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so pre-forked workers start their own
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name="chat-capture-writer", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Writing the chat capture to {self.path} failed: {e}")
+
+    def flush(self):
+        """
+        Appends the waiting records to the file (also called at exit).
+        """
+        with self._lock:
+            records = []
+            while self._pending:
+                records.append(self._pending.popleft())
+            if not records:
+                return
+            data = "".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in records)
+            data = data.encode("utf-8")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                while data:
+                    data = data[os.write(fd, data):]
+            finally:
+                os.close(fd)
+            self.written += len(records)
@@ -0,0 +1,93 @@
+from pathlib import Path
+from typing import List, Tuple
+import json
+import numpy as np
+from preprocessing.text import preprocess_text
+from preprocessing.artifacts import load_vocabulary, VECTORIZER_META
+from preprocessing.hashing import HASHING_MODE, STOP_WORDS_FILE, token_hashes
+from preprocessing.lemmas import LemmaTable
+from config import MODEL_DIR
+
+
+class QueryEncoder:
+    """
+    Pure-NumPy replacement for the fitted `TfidfVectorizer.transform` at serving time.
+
+    Reproduces exactly what the deployed vectorizer does for a word-unigram model:
+    lowercase -> `preprocess_text` -> lemma lookup (versions with a lemma table, see
+    `preprocessing/lemmas.py`) -> vocabulary lookup -> term counts * IDF -> L2 norm.
+    Stop words need no filtering here: they were removed before the vocabulary was
+    built, so they can never be found in it.
+
+    A query is encoded as `(indices, weights)`: the sorted feature ids and their weights,
+    i.e. one row of the CSR matrix `vectorizer.transform` would return.
+
+    Artifacts built in hashing mode (see `preprocessing/hashing.py`) have no vocabulary:
+    the feature id of a token is its hash, and tokens whose feature no service uses
+    (IDF 0) are dropped, like unknown terms. Stop words do need filtering there, as
+    their bucket may be used by a real term: tokens whose hash is one of the saved
+    stop-word hashes (`stop_words.npy`) are dropped first, like `HashingTfidf.analyze`
+    drops the stop words.
+    """
+
+    def __init__(self, model_dir: Path = MODEL_DIR):
+        with open(Path(model_dir) / VECTORIZER_META, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.hashing = meta.get("mode") == HASHING_MODE
+        if self.hashing:
+            self.terms = None
+            self.idf = np.load(Path(model_dir) / "idf.npy", mmap_mode="r")
+            # Versions saved before the stop-word hashes were added have none to drop
+            stop_words_file = Path(model_dir) / STOP_WORDS_FILE
+            self.stop_words = np.load(stop_words_file) if stop_words_file.exists() else np.empty(0, dtype=np.int64)
+        else:
+            # `terms` is sorted (sklearn orders the features alphabetically), so the position
+            # of a term is its feature id and lookups are a binary search on the mapped array.
+            self.terms, self.idf = load_vocabulary(model_dir)
+        self.lemmas = None if self.hashing else LemmaTable.load(model_dir, mmap_mode="r")
+        self.lowercase = meta.get("lowercase", True)
+        if meta.get("norm", "l2") != "l2" or meta.get("sublinear_tf", False) or meta.get("ngram_range", [1, 1]) != [1, 1]:
+            raise ValueError("QueryEncoder only supports unigrams with norm='l2' and sublinear_tf=False")
+
+    @property
+    def n_features(self) -> int:
+        return len(self.idf)
+
+    def tokenize(self, text: str) -> List[str]:
+        if self.lowercase:
+            text = text.lower()
+        tokens = preprocess_text(text)
+        return self.lemmas.lemmatize(tokens) if self.lemmas is not None else tokens
+
+    def encode(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        return self.encode_tokens(self.tokenize(text))
+
+    def encode_tokens(self, tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        if not tokens or not self.n_features:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        if self.hashing:
+            hashes = token_hashes(tokens)
+            if len(self.stop_words):
+                # Binary search in the sorted stop-word hashes, like the vocabulary lookup below
+                positions = np.searchsorted(self.stop_words, hashes)
+                positions[positions == len(self.stop_words)] = 0
+                hashes = hashes[self.stop_words[positions] != hashes]
+            indices, counts = np.unique(hashes % self.n_features, return_counts=True)
+            used = self.idf[indices] > 0
+            indices, counts = indices[used], counts[used]
+        else:
+            # Vocabulary lookup for all tokens at once; unknown tokens are dropped
+            tokens = np.array(tokens)
+            positions = np.searchsorted(self.terms, tokens)
+            positions[positions == self.n_features] = 0
+            known = self.terms[positions] == tokens
+            indices, counts = np.unique(positions[known], return_counts=True)
+        if len(indices) == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        weights = counts.astype(np.float64) * self.idf[indices]
+        # Sequential sum of squares, same order as sklearn's row normalization,
+        # so the result is bit-identical (np.sum would sum pairwise).
+        weights /= np.sqrt(np.cumsum(weights * weights)[-1])
+        return indices.astype(np.int32), weights
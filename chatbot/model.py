@@ -0,0 +1,61 @@
+from pathlib import Path
+from preprocessing.index import RetrievalIndex
+from preprocessing.categories import CategoryIndex
+from preprocessing.fuzzy import FuzzyIndex
+from preprocessing.lsa import LsaIndex
+from preprocessing.artifacts import ServiceStore, current_version
+from config import MODEL_DIR, FUZZY_CORRECTION, RESPONSE_RULES
+from .encoder import QueryEncoder
+from .cache import ResponseCache
+from .rules import rule_words, vocabulary_phrases
+
+
+class ServingModel:
+    """
+    Everything needed to answer TF-IDF queries, loaded from the compact artifacts
+    written by `preprocess()`. The index arrays and service records are memory-mapped,
+    so loading only maps files; pages are read (and shared between workers) on use.
+    Nothing here imports scikit-learn or scipy.
+
+    All parts come from the same published version, which is checked for consistency
+    when loading. Matches of recent queries are cached per model, so a reloaded model
+    never serves results computed on the previous artifacts.
+    """
+
+    def __init__(self, model_dir: Path = MODEL_DIR):
+        self.model_dir = Path(model_dir)
+        self.version, version_dir = current_version(model_dir)
+        self.encoder = QueryEncoder(version_dir)
+        self.retrieval_index = RetrievalIndex.load(version_dir, mmap_mode="r")
+        self.services_data = ServiceStore(version_dir)
+        # None for versions written before category artifacts existed (no re-ranking)
+        self.categories = CategoryIndex.load(version_dir, mmap_mode="r")
+        # None without a vocabulary to correct against (hashing mode, older versions) or with
+        # FUZZY_CORRECTION off: no spelling correction
+        self.fuzzy = FuzzyIndex.load(version_dir, mmap_mode="r") if FUZZY_CORRECTION else None
+        # None for versions without an LSA index (hashing mode, older versions): sparse scoring only
+        self.lsa = LsaIndex.load(version_dir, mmap_mode="r")
+        self.response_cache = ResponseCache()
+        # Rule phrases sharing a term with this vocabulary: rules only as the whole message (see `bot.match_rules`)
+        self.vocabulary_rules = vocabulary_phrases({" ".join(rule_words(key)) for key in RESPONSE_RULES}, self.encoder)
+
+        expected_shape = (len(self.services_data), self.encoder.n_features)
+        if (self.retrieval_index.n_services, self.retrieval_index.n_features) != expected_shape:
+            raise ValueError(
+                f"Inconsistent artifacts in {version_dir}: index is {self.retrieval_index.n_services}x"
+                f"{self.retrieval_index.n_features}, expected {expected_shape[0]}x{expected_shape[1]}"
+            )
+        if self.categories is not None and len(self.categories.service_categories) != expected_shape[0]:
+            raise ValueError(
+                f"Inconsistent artifacts in {version_dir}: categories cover {len(self.categories.service_categories)}"
+                f" services, expected {expected_shape[0]}"
+            )
+        if self.lsa is not None and (self.lsa.n_services, self.lsa.n_features) != expected_shape:
+            raise ValueError(
+                f"Inconsistent artifacts in {version_dir}: LSA index is {self.lsa.n_services}x"
+                f"{self.lsa.n_features}, expected {expected_shape[0]}x{expected_shape[1]}"
+            )
+
+
+def published_version(model_dir: Path = MODEL_DIR):
+    return current_version(model_dir)[0]
@@ -0,0 +1,112 @@
+"""
+Multi-pattern matcher for the rule phrases (`RESPONSE_RULES`): an Aho–Corasick
+automaton over words, built once from the normalized rule keys.
+
+One pass over the words of a message finds every rule phrase in it, wherever it is,
+in time linear in the number of words (plus the matches), however many phrases the
+table holds. Working on whole words means a phrase never matches part of a word.
+"""
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+from preprocessing.text import PUNCTUATION_RE, norm, simple_word_tokenize
+
+
+class RuleMatch(NamedTuple):
+    start: int  # index of the first word of the phrase in the message
+    end: int  # index after its last word
+    key: str  # the normalized rule phrase
+
+
+def rule_words(text: str) -> List[str]:
+    """
+    Words of a message or rule key as the matcher compares them: lowercased, without
+    punctuation, normalized like the TF-IDF tokens (one-letter words are kept).
+    """
+    return [norm(word) for word in simple_word_tokenize(PUNCTUATION_RE.sub("", text.lower()))]
+
+
+def vocabulary_phrases(phrases: Iterable[str], encoder) -> Set[str]:
+    """
+    The phrases with a word the TF-IDF model knows (`QueryEncoder.encode` keeps a term
+    of them). Inside a longer message, such a phrase is more likely part of a question
+    about a service ("موعد تسلم جواز السفر") than small talk.
+    """
+    return {phrase for phrase in phrases if len(encoder.encode(phrase)[0])}
+
+
+class RuleMatcher:
+    """
+    Args:
+        rules: Rule key -> reply(s), like `RESPONSE_RULES`. Keys are normalized with
+            `rule_words`; when two keys normalize to the same phrase the first one is kept.
+    """
+
+    def __init__(self, rules: Dict[str, object]):
+        self.replies: Dict[str, object] = {}
+        for key, reply in rules.items():
+            phrase = " ".join(rule_words(key))
+            if phrase:
+                self.replies.setdefault(phrase, reply)
+
+        # Trie of the phrases, one node per word prefix; node 0 is the root
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Optional[Tuple[int, str]]] = [None]  # (number of words, phrase) ending here
+        self.output_link: List[int] = [0]  # next node on the fail chain with an output (0: none)
+        for phrase in self.replies:
+            words = phrase.split()
+            node = 0
+            for word in words:
+                if word not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(None)
+                    self.output_link.append(0)
+                    self.goto[node][word] = len(self.goto) - 1
+                node = self.goto[node][word]
+            self.output[node] = (len(words), phrase)
+        self._build_links()
+
+    def _build_links(self):
+        # Breadth-first, so the fail target of a node is always final before its children
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and word not in self.goto[state]:
+                    state = self.fail[state]
+                target = self.goto[state].get(word, 0)
+                self.fail[child] = target if target != child else 0
+                self.output_link[child] = target if self.output[target] is not None else self.output_link[target]
+
+    def find_all(self, words: Sequence[str]) -> List[RuleMatch]:
+        """
+        Every occurrence of every phrase in the words, by end position (overlaps included).
+        """
+        matches = []
+        node = 0
+        for i, word in enumerate(words):
+            while node and word not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(word, 0)
+            state = node if self.output[node] is not None else self.output_link[node]
+            while state:
+                length, phrase = self.output[state]
+                matches.append(RuleMatch(i + 1 - length, i + 1, phrase))
+                state = self.output_link[state]
+        return matches
+
+    def find(self, words: Sequence[str]) -> List[RuleMatch]:
+        """
+        Non-overlapping phrase occurrences, left to right, preferring the longest phrase
+        among those starting at the same word (e.g. "شكرا جزيلا" over "شكرا").
+        """
+        selected = []
+        covered_until = 0
+        for match in sorted(self.find_all(words), key=lambda m: (m.start, m.start - m.end)):
+            if match.start >= covered_until:
+                selected.append(match)
+                covered_until = match.end
+        return selected
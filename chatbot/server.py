@@ -0,0 +1,56 @@
+"""
+Production serving of the chatbot with gunicorn (`manage.py run_app --workers N`).
+
+gunicorn is an optional dependency (`pip install gunicorn`, Linux/macOS only); the
+development server (`manage.py run_app`) does not need it.
+"""
+import sys
+from config import APP_HOST, APP_PORT, APP_THREADS
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+
+def run_server(host: str = APP_HOST, port: int = APP_PORT, workers: int = 1, threads: int = APP_THREADS):
+    """
+    Serves the app from `workers` processes with `threads` threads each.
+
+    The app and the model are loaded once in the master process before the workers
+    are forked (`preload_app`), so the workers share the mapped artifact pages instead
+    of each loading its own copy.
+    """
+    if BaseApplication is None:
+        print("Production mode needs gunicorn: pip install gunicorn", file=sys.stderr)
+        sys.exit(1)
+
+    from .app import app
+    from .bot import get_bot_response
+
+    # Map the artifacts and answer one query so the workers inherit warm pages
+    get_bot_response("")
+
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        "preload_app": True,
+    }
+    _GunicornApplication(app, options).run()
+
+
+if BaseApplication is not None:
+    class _GunicornApplication(BaseApplication):
+        def __init__(self, application, options: dict):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
@@ -0,0 +1,163 @@
+"""
+The chat page (`index.html`) and its `assets/`, prepared for caching and compression.
+
+`build_static` (`manage.py build_static`) copies them into STATIC_BUILD_DIR with
+precompressed variants: `.gz`, and `.br` when the optional `brotli` package is
+installed, each kept only when it is clearly smaller (PNGs are already compressed).
+It also writes a manifest with the content hash of every file. The hashes are the
+ETags, the same in every worker and on every host, and index.html gets its asset
+URLs versioned with them (`/assets/logo.png?v=<hash>`). Browsers can keep a
+versioned asset for a year and only revalidate the page, which costs a 304 when
+nothing changed.
+
+The app loads the build on the first page request, not at import. It checks the
+manifest against the source files and rebuilds when one of them changed, so a stale
+build is never served. When the build directory cannot be written (a read-only
+deployment that skipped `build_static`), it serves the source files uncompressed.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+from config import STATIC_BUILD_DIR
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SOURCE_DIR = Path(__file__).resolve().parent
+MANIFEST = "manifest.json"
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+# A variant is only kept when it saves at least this share of the size
+MIN_SAVING = 0.1
+ASSET_URL_RE = re.compile(r"/assets/([\w./-]+)")
+
+
+class StaticBuild(NamedTuple):
+    directory: Path  # where the files are served from
+    files: Dict[str, dict]  # the manifest entry of every file, by path
+
+
+def source_files(source_dir: Path = SOURCE_DIR) -> List[str]:
+    """
+    Paths of the files to serve, relative to `source_dir`: the page, then the assets.
+    """
+    assets = sorted(path.relative_to(source_dir).as_posix() for path in (source_dir / "assets").rglob("*") if path.is_file())
+    return ["index.html"] + assets
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def version_asset_urls(html: str, hashes: Dict[str, str]) -> str:
+    """
+    Appends `?v=<content hash>` to every `/assets/...` URL of the page that names a known asset.
+    """
+    def versioned(match):
+        name = f"assets/{match.group(1)}"
+        return f"/{name}?v={hashes[name]}" if name in hashes else match.group(0)
+    return ASSET_URL_RE.sub(versioned, html)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        # mtime=0: the same input always gives the same bytes
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+
+def _write(path: Path, data: bytes):
+    # Written next to the target and moved into place, so a running app never reads half a file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + f".{os.getpid()}.tmp")
+    temporary.write_bytes(data)
+    os.replace(temporary, path)
+
+
+def build_static(source_dir: Path = SOURCE_DIR, build_dir: Path = STATIC_BUILD_DIR) -> dict:
+    """
+    Writes the files to serve, their compressed variants and the manifest into
+    `build_dir`, and returns the manifest.
+    """
+    source_dir, build_dir = Path(source_dir), Path(build_dir)
+    names = source_files(source_dir)
+    contents = {name: (source_dir / name).read_bytes() for name in names}
+    hashes = {name: content_hash(data) for name, data in contents.items() if name != "index.html"}
+    contents["index.html"] = version_asset_urls(contents["index.html"].decode("utf-8"), hashes).encode("utf-8")
+
+    encodings = [encoding for encoding in ENCODINGS if encoding != "br" or brotli is not None]
+    files = {}
+    for name, data in contents.items():
+        _write(build_dir / name, data)
+        kept = []
+        for encoding in encodings:
+            compressed = compress(data, encoding)
+            if len(compressed) <= len(data) * (1 - MIN_SAVING):
+                _write(build_dir / (name + ENCODINGS[encoding]), compressed)
+                kept.append(encoding)
+            elif (build_dir / (name + ENCODINGS[encoding])).exists():
+                os.remove(build_dir / (name + ENCODINGS[encoding]))
+        stat = (source_dir / name).stat()
+        files[name] = {
+            "etag": content_hash(data),
+            "size": len(data),
+            "encodings": kept,
+            "source": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+        }
+        sizes = ", ".join(f"{encoding} {(build_dir / (name + ENCODINGS[encoding])).stat().st_size:,}" for encoding in kept)
+        print(f"{name}: {len(data):,} bytes" + (f" ({sizes})" if sizes else ""))
+
+    manifest = {"files": files}
+    _write(build_dir / MANIFEST, json.dumps(manifest, indent=2).encode("utf-8"))
+    return manifest
+
+
+def load_static(source_dir: Path = SOURCE_DIR, build_dir: Path = STATIC_BUILD_DIR) -> StaticBuild:
+    """
+    The build, rebuilt first when it is missing or a source file was added, removed or
+    changed since. The source files, uncompressed, when it cannot be written.
+    """
+    source_dir, build_dir = Path(source_dir), Path(build_dir)
+    manifest = _read_manifest(build_dir)
+    if manifest is None or not _is_current(manifest, source_dir):
+        print("Building static files...")
+        try:
+            manifest = build_static(source_dir, build_dir)
+        except OSError as e:
+            print(f"Cannot write the static build ({e}), serving the source files uncompressed")
+            return StaticBuild(source_dir, _source_entries(source_dir))
+    return StaticBuild(build_dir, manifest["files"])
+
+
+def _source_entries(source_dir: Path) -> Dict[str, dict]:
+    # Manifest entries of the files as they are: no variants, asset URLs not versioned
+    files = {}
+    for name in source_files(source_dir):
+        data = (source_dir / name).read_bytes()
+        files[name] = {"etag": content_hash(data), "size": len(data), "encodings": []}
+    return files
+
+
+def _read_manifest(build_dir: Path) -> Optional[dict]:
+    try:
+        with open(build_dir / MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_current(manifest: dict, source_dir: Path) -> bool:
+    files = manifest.get("files", {})
+    if sorted(files) != sorted(source_files(source_dir)):
+        return False
+    for name, entry in files.items():
+        stat = (source_dir / name).stat()
+        if entry["source"] != {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}:
+            return False
+    return True
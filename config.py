@@ -1,5 +1,6 @@
 # config.py
 from pathlib import Path
+import os
 import sys
 
 # Get the project root (where config.py lives)
@@ -15,13 +16,132 @@ DATA_DIR.mkdir(exist_ok=True)  # Ensure it exists
 
 # Example files
 SCRAPED_URLS_FILE = DATA_DIR / "services_by_category.json"
-SCRAPED_SERVICES_FILE = DATA_DIR / "scraped_services_data.json"
+# Service data files are NDJSON: one JSON record per line (see scraping/records.py)
+SCRAPED_SERVICES_FILE = DATA_DIR / "scraped_services_data.jsonl"
+# Records of a scrape in progress, appended as they come in; an interrupted scrape resumes from it
+SCRAPED_SERVICES_PARTIAL_FILE = DATA_DIR / "scraped_services_data.jsonl.partial"
+
+# Service page scraping: downloading threads (sharing one pooled session), parsing
+# processes (None = one per CPU, 0 = parse in the downloading threads), per-host
+# request rate, request timeout in seconds, and retries with exponential backoff
+SCRAPE_MAX_WORKERS = 8
+SCRAPE_PARSE_WORKERS = None
+SCRAPE_REQUESTS_PER_SECOND = 5
+SCRAPE_TIMEOUT = 30
+SCRAPE_MAX_RETRIES = 3
+SCRAPE_BACKOFF_FACTOR = 0.5
+# HTTP validators, body hashes and parsed data of scraped pages, for conditional re-scrapes
+SCRAPE_CACHE_FILE = DATA_DIR / "scrape_cache.json"
+# Scraped records between two saves of the scrape cache (it is also saved when a scrape ends or fails)
+SCRAPE_CACHE_SAVE_EVERY = 500
+# Browser tabs clicking through the category buttons in parallel
+CATEGORY_PAGES = 4
+# How long to wait for a category's links to show up after clicking it (ms)
+CATEGORY_LINKS_TIMEOUT_MS = 2000
+# Server-rendered listing of one category, formatted with the button id suffix
+# (e.g. "?category={id}"). None: the listing needs JavaScript, always use the browser
+CATEGORY_LISTING_URL = None
 
 # Output files for preprocessing
-ENRICHED_SERVICES_FILE = DATA_DIR / "enriched_services_data.json"
-DEPLOYMENT_SERVICES_FILE = DATA_DIR / "deployment_services.json"
+# Enriched: scraped data + full_text, short_text and keywords. Deployment: the same without the texts
+ENRICHED_SERVICES_FILE = DATA_DIR / "enriched_services_data.jsonl"
+DEPLOYMENT_SERVICES_FILE = DATA_DIR / "deployment_services.jsonl"
 VECTORIZER_FILE = DATA_DIR / "vectorizer.pkl"
 SERVICES_MATRIX_FILE = DATA_DIR / "services_matrix.pkl"
+# Content hash of every scraped service at the last preprocess (for incremental runs)
+SERVICE_HASHES_FILE = DATA_DIR / "service_hashes.json"
+# `preprocess --incremental` refits the vectorizer when changed services bring in more
+# new terms than this share of the vocabulary
+INCREMENTAL_DRIFT_THRESHOLD = 0.02
+# Services vectorized (and their keywords extracted) at a time by the streaming preprocess
+PREPROCESS_CHUNK_SIZE = 1000
+# Processes enriching, tokenizing and vectorizing those chunks (None: one per CPU, 0 or 1: in-process)
+PREPROCESS_WORKERS = None
+# Feature space of the TF-IDF model: "vocabulary" (fitted TfidfVectorizer, one feature per
+# term) or "hashing" (features are term hashes: fixed memory, no vocabulary, index built
+# from shards in parallel; see preprocessing/hashing.py)
+VECTORIZER_MODE = "vocabulary"
+# Number of hashed features (hashing mode). Terms sharing a bucket are conflated
+HASHING_N_FEATURES = 2 ** 18
+# Lemmatization (preprocessing/lemmas.py): preprocess analyzes every word of the corpus once with
+# camel-tools and saves a word -> lemma table with the model; serving only looks words up.
+# Words are used as they are when this is False, camel-tools or its morphology data is not installed,
+# or in hashing mode. Off by default: camel-tools is an optional dependency (`pip install .[lemmas]`)
+# and its lemmas have not been measured yet (benchmarks/bench_lemmas.py used a stand-in).
+LEMMATIZE = False
+# Dense LSA index (preprocessing/lsa.py): preprocess also projects the TF-IDF rows on this many
+# truncated-SVD components and stores them as int8, for RETRIEVAL_BACKEND = "lsa" (0: not built,
+# the default backend does not use it; 128 is the size measured in benchmarks/bench_lsa.py).
+# Not built in hashing mode.
+LSA_COMPONENTS = 0
+
+# Compact serving artifacts (memory-mapped .npy arrays + offset-indexed service records)
+MODEL_DIR = DATA_DIR / "model"
+# Previous artifact versions kept next to the published one
+MODEL_KEEP_VERSIONS = 2
+# Seconds between checks for a newly published artifacts version (0: no hot reload)
+MODEL_WATCH_INTERVAL = 5
+# Token for the admin /reload route (X-Admin-Token header). Unset: /reload is disabled
+ADMIN_TOKEN = os.environ.get("NAJEEB_ADMIN_TOKEN")
+
+# =================== Serving ============================
+# Address of `manage.py run_app` (dev server and production mode)
+APP_HOST = "127.0.0.1"
+APP_PORT = 5000
+# Threads per gunicorn worker in production mode (`run_app --workers N`)
+APP_THREADS = 4
+# Thread pool the async /chat/async route offloads scoring to
+CHAT_ASYNC_THREADS = 4
+# Concurrent /chat calls arriving within this window (milliseconds) are scored
+# together in one batch. 0 disables micro-batching.
+CHAT_BATCH_WINDOW_MS = 0
+CHAT_MAX_BATCH_SIZE = 64
+# TF-IDF matches of recent queries (keyed on their sorted, normalized tokens).
+# Entries expire after the TTL (seconds, 0: never); a size of 0 disables the cache.
+RESPONSE_CACHE_SIZE = 10_000
+RESPONSE_CACHE_TTL = 3600
+# Re-ranking: services sharing a term with the query are ordered by their cosine score
+# plus the weighted similarity of the query to the service's category centroid and the
+# weighted share of the service's keywords found in the query (weights picked with
+# benchmarks/bench_rerank.py). The best RERANK_CANDIDATES are kept (and cached) per query.
+RERANK_CANDIDATES = 10
+RERANK_CATEGORY_WEIGHT = 0.2
+RERANK_KEYWORD_WEIGHT = 0.02
+# Scoring of the queries: "sparse" (TF-IDF postings lists: only the services sharing a term)
+# or "lsa" (every service, with the int8 LSA vectors; also matches related terms). Versions
+# without an LSA index are scored with the postings lists.
+RETRIEVAL_BACKEND = "sparse"
+# Spelling correction (preprocessing/fuzzy.py): an unknown query word of FUZZY_MIN_LENGTH letters
+# or more is replaced by the closest vocabulary term within 1 edit, 2 edits from
+# FUZZY_TWO_EDITS_LENGTH letters, unless that lowers the best score of the query. Shorter
+# words are left alone: most of them are real words the corpus does not have (جواز, معاش),
+# one edit away from an unrelated term. FUZZY_MAX_DISTANCE is the largest distance the
+# index built by preprocess supports (0: no index, no correction).
+FUZZY_MAX_DISTANCE = 2
+FUZZY_MIN_LENGTH = 6
+FUZZY_TWO_EDITS_LENGTH = 8
+# Serving-time switch: False ignores the fuzzy index of the served artifacts
+FUZZY_CORRECTION = True
+# Other matching services a /chat request may ask for ({"alternatives": n})
+MAX_ALTERNATIVES = 5
+# Capture of /chat requests as NDJSON, for load tests with `manage.py replay` (chatbot/capture.py).
+# Unset: no capture
+CHAT_CAPTURE_FILE = os.environ.get("NAJEEB_CHAT_CAPTURE")
+# The capture is written by a background thread every CHAT_CAPTURE_FLUSH_INTERVAL seconds, or once
+# CHAT_CAPTURE_FLUSH_RECORDS records are waiting; beyond CHAT_CAPTURE_MAX_PENDING, records are dropped
+CHAT_CAPTURE_FLUSH_RECORDS = 256
+CHAT_CAPTURE_FLUSH_INTERVAL = 1.0
+CHAT_CAPTURE_MAX_PENDING = 100_000
+# Per-stage latency histograms and response counters, served on /metrics
+METRICS_ENABLED = True
+# The chat page and its assets with precompressed variants and content hashes (manage.py build_static)
+STATIC_BUILD_DIR = DATA_DIR / "static"
+# Seconds browsers may keep an asset requested with its content hash (/assets/logo.png?v=<hash>).
+# The page and unversioned asset URLs are revalidated on every load (304 when unchanged).
+ASSET_MAX_AGE = 365 * 24 * 3600
+# /chat responses of at least this many bytes of JSON are gzip-compressed for clients that accept it
+CHAT_COMPRESS_MIN_BYTES = 1024
+CHAT_COMPRESS_LEVEL = 6
 
 # =================== Rule-based chatbot ============================
 # Rule-based greetings/farewells
@@ -85,5 +205,10 @@ RESPONSE_RULES = {
     "مضبوط": ["تماماً", "بالفعل"],
 }
 
+# Rule phrases are also found inside longer messages ("السلام عليكم عايز اجدد البطاقة"),
+# and their reply then comes with the TF-IDF answer. These ones only count as the whole
+# message: inside a sentence they are not small talk ("لا" in "لا استطيع الدخول").
+# Phrases with a term of the model's vocabulary (تسلم, عندي سؤال) are added at load time.
+WHOLE_MESSAGE_RULES = {"ايوه", "نعم", "لا", "صح", "مضبوط", "تمام", "ماشي", "اوكي", "ok", "حسنا", "العفو"}
 
 DEFAULT_RESPONSE = "عذراً، لم أفهم سؤالك."
\ No newline at end of file
@@ -12,11 +12,11 @@ def scrape_url(args=None):
 
 def scrape_services(args=None):
     from scraping.scraper import scrape_all_services
-    scrape_all_services()
+    scrape_all_services(use_cache=not getattr(args, "no_cache", False), resume=not getattr(args, "restart", False))
 
 def preprocess(args=None):
     from preprocessing.preprocess import preprocess
-    preprocess()
+    preprocess(incremental=getattr(args, "incremental", False))
 
 def run_pipeline(args=None):
     from scraping.get_services_urls import scrape_all_categories
@@ -27,23 +27,86 @@ def run_pipeline(args=None):
     preprocess()
 
 def run_app(args=None):
+    from config import APP_HOST, APP_PORT, APP_THREADS
+    host = getattr(args, "host", None) or APP_HOST
+    port = getattr(args, "port", None) or APP_PORT
+    workers = getattr(args, "workers", 0)
+    if workers:
+        # Production mode: gunicorn workers sharing the preloaded artifacts
+        from chatbot.server import run_server
+        run_server(host=host, port=port, workers=workers, threads=getattr(args, "threads", None) or APP_THREADS)
+        return
+
     from chatbot.app import app
     debug = getattr(args, "debug", False)
     app.config["DEBUG"] = debug  # Add this line
-    app.run(debug=debug)
+    app.run(host=host, port=port, debug=debug)
+
+def build_static(args=None):
+    from chatbot.static import build_static
+    build_static()
+
+def bench(args=None):
+    from benchmarks.suite import run, QUERY_SCALES, PREPROCESS_SCALES, BASELINE_FILE
+    sys.exit(run(
+        scales=getattr(args, "scales", None) or QUERY_SCALES,
+        preprocess_scales=getattr(args, "preprocess_scales", None) or PREPROCESS_SCALES,
+        rounds=getattr(args, "rounds", 3),
+        repeat=getattr(args, "repeat", 1),
+        output=getattr(args, "output", None),
+        baseline=getattr(args, "baseline", None) or BASELINE_FILE,
+        save_baseline=getattr(args, "save_baseline", False),
+        tolerance=getattr(args, "tolerance", 0.3),
+    ))
+
+def replay(args=None):
+    from benchmarks.replay import replay
+    replay(
+        args.capture,
+        url=getattr(args, "url", None),
+        concurrency=getattr(args, "concurrency", 1),
+        rate=getattr(args, "rate", None),
+        limit=getattr(args, "limit", None),
+    )
 
 def main():
     parser = argparse.ArgumentParser(description="Manage Najeeb Chatbot tasks.")
     subparsers = parser.add_subparsers(dest="command")
 
     subparsers.add_parser("scrape_url", help="get all services URLs grouped by category.")
-    subparsers.add_parser("scrape_services", help="Scrape all services.")
-    subparsers.add_parser("preprocess", help="Preprocess data.")
+    scrape_services_parser = subparsers.add_parser("scrape_services", help="Scrape all services.")
+    scrape_services_parser.add_argument("--no-cache", action="store_true", help="Download and parse every page, ignoring the scrape cache.")
+    scrape_services_parser.add_argument("--restart", action="store_true", help="Start over instead of resuming an interrupted scrape.")
+    preprocess_parser = subparsers.add_parser("preprocess", help="Preprocess data.")
+    preprocess_parser.add_argument("--incremental", action="store_true", help="Only re-vectorize services that changed since the last run.")
     subparsers.add_parser("run_pipeline", help="scrape then preprocess.")
 
     # Add run_app command with --debug flag
     run_app_parser = subparsers.add_parser("run_app", help="Run the Flask app.")
     run_app_parser.add_argument("--debug", action="store_true", help="Run Flask app in debug mode.")
+    run_app_parser.add_argument("--host", help="Address to listen on (default: APP_HOST in config.py).")
+    run_app_parser.add_argument("--port", type=int, help="Port to listen on (default: APP_PORT in config.py).")
+    run_app_parser.add_argument("--workers", type=int, default=0, help="Serve with N gunicorn worker processes (production mode, needs gunicorn).")
+    run_app_parser.add_argument("--threads", type=int, help="Threads per worker in production mode (default: APP_THREADS in config.py).")
+
+    subparsers.add_parser("build_static", help="Precompress the chat page and its assets and hash them for caching.")
+
+    bench_parser = subparsers.add_parser("bench", help="Run the benchmark suite and compare with the baseline.")
+    bench_parser.add_argument("--scales", type=int, nargs="+", help="Corpus sizes (multiples of the shipped data) for the query benchmarks (default: 1 10 100 1000).")
+    bench_parser.add_argument("--preprocess-scales", type=int, nargs="+", help="Corpus sizes for the preprocess benchmark (default: 1 10).")
+    bench_parser.add_argument("--rounds", type=int, default=3, help="Repetitions per measurement; the best one is kept.")
+    bench_parser.add_argument("--repeat", type=int, default=1, help="Run the whole suite N times and keep the median of every metric (steadier on noisy machines).")
+    bench_parser.add_argument("--output", help="Where to write the JSON results (default: benchmarks/results/<time>.json).")
+    bench_parser.add_argument("--baseline", help="Baseline results to compare with (default: benchmarks/baseline.json).")
+    bench_parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline.")
+    bench_parser.add_argument("--tolerance", type=float, default=0.3, help="Relative slowdown reported as a regression (default: 0.3).")
+
+    replay_parser = subparsers.add_parser("replay", help="Replay captured /chat traffic (NAJEEB_CHAT_CAPTURE) and report throughput and latency.")
+    replay_parser.add_argument("capture", help="NDJSON capture file written by the app.")
+    replay_parser.add_argument("--url", help="Base URL of a running server, e.g. http://127.0.0.1:5000 (default: in-process get_bot_response).")
+    replay_parser.add_argument("--concurrency", type=int, default=1, help="Clients sending requests at the same time (default: 1).")
+    replay_parser.add_argument("--rate", type=float, help="Start requests at this many per second instead of back to back.")
+    replay_parser.add_argument("--limit", type=int, help="Only replay the first N captured requests.")
 
     if len(sys.argv) == 1:
         parser.print_help()
@@ -61,6 +124,12 @@ def main():
         run_pipeline(args)
     elif args.command == "run_app":
         run_app(args)
+    elif args.command == "build_static":
+        build_static(args)
+    elif args.command == "bench":
+        bench(args)
+    elif args.command == "replay":
+        replay(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
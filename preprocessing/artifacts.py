@@ -0,0 +1,141 @@
+"""
+Compact, pickle-free serving artifacts.
+
+Everything the chatbot needs at query time is written to one directory (`MODEL_DIR`):
+- `terms.npy` / `idf.npy`: the vectorizer vocabulary (sorted, so the position is the feature id) and IDF weights,
+  plus `vectorizer_meta.json` with the vectorizer settings a query encoder must reproduce.
+- the retrieval index arrays (see `RetrievalIndex.save`).
+- `services.jsonl` + `services_offsets.npy`: one compact JSON record per line and the byte
+  offset of every line, so a single service can be read without parsing the whole file.
+
+All `.npy` files can be memory-mapped, which keeps worker start-up cheap and lets
+forked workers share the same pages.
+
+Each preprocessing run writes a complete set into a new version directory under
+`MODEL_DIR` and then publishes it by atomically replacing the `CURRENT` pointer file.
+Files of a published version are never modified, so a running server can keep
+serving (and mapping) one version while the next one is written and loaded.
+"""
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+
+CURRENT_VERSION = "CURRENT"
+VECTORIZER_META = "vectorizer_meta.json"
+SERVICES_RECORDS = "services.jsonl"
+SERVICES_OFFSETS = "services_offsets.npy"
+
+
+def save_vocabulary(directory: Path, vectorizer):
+    """
+    Saves the fitted vectorizer's vocabulary and IDF weights as plain arrays.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    terms = vectorizer.get_feature_names_out().astype(str)
+    np.save(directory / "terms.npy", terms)
+    np.save(directory / "idf.npy", vectorizer.idf_)
+    with open(directory / VECTORIZER_META, "w", encoding="utf-8") as f:
+        json.dump({
+            "lowercase": vectorizer.lowercase,
+            "norm": vectorizer.norm,
+            "sublinear_tf": vectorizer.sublinear_tf,
+            "ngram_range": list(vectorizer.ngram_range),
+        }, f)
+
+
+def load_vocabulary(directory: Path, mmap_mode: str = "r"):
+    directory = Path(directory)
+    terms = np.load(directory / "terms.npy", mmap_mode=mmap_mode)
+    idf = np.load(directory / "idf.npy", mmap_mode=mmap_mode)
+    return terms, idf
+
+
+def save_services(directory: Path, services_data: List[dict]):
+    """
+    Writes the service records as JSON lines plus an offsets array (n_services + 1 entries).
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    offsets = [0]
+    with open(directory / SERVICES_RECORDS, "wb") as f:
+        for service in services_data:
+            line = json.dumps(service, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(directory / SERVICES_OFFSETS, np.array(offsets, dtype=np.int64))
+
+
+class ServiceStore:
+    """
+    Read-only, list-like access to the saved service records.
+    Records are decoded on access only, straight from the memory-mapped file.
+    """
+
+    def __init__(self, directory: Path):
+        directory = Path(directory)
+        self.offsets = np.load(directory / SERVICES_OFFSETS, mmap_mode="r")
+        with open(directory / SERVICES_RECORDS, "rb") as f:
+            self._records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("service index out of range")
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        return json.loads(self._records[start:end])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+def new_version(model_dir: Path) -> Path:
+    """
+    Creates an empty, not yet published version directory (named after the current time).
+    """
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    version_dir = Path(tempfile.mkdtemp(prefix=time.strftime("%Y%m%d-%H%M%S-"), dir=model_dir))
+    os.chmod(version_dir, 0o755)  # mkdtemp makes it private to the user running preprocess
+    return version_dir
+
+
+def publish_version(version_dir: Path, keep: int = 2):
+    """
+    Makes `version_dir` the current version, then deletes the older versions except the
+    `keep` newest ones (workers that have not switched yet may still be using them).
+    """
+    version_dir = Path(version_dir)
+    model_dir = version_dir.parent
+    tmp_path = model_dir / f"{CURRENT_VERSION}.tmp"
+    tmp_path.write_text(version_dir.name, encoding="utf-8")
+    os.replace(tmp_path, model_dir / CURRENT_VERSION)
+
+    older = sorted(path for path in model_dir.iterdir() if path.is_dir() and path != version_dir)
+    for path in older[:max(len(older) - keep, 0)]:
+        # Fails on Windows while a process still maps the files; retried on the next publish
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def current_version(model_dir: Path) -> Tuple[Optional[str], Path]:
+    """
+    Returns the name and directory of the published version. Artifacts written before
+    versioning (directly in `model_dir`) are returned as version None.
+    """
+    model_dir = Path(model_dir)
+    pointer = model_dir / CURRENT_VERSION
+    if not pointer.exists():
+        return None, model_dir
+    version = pointer.read_text(encoding="utf-8").strip()
+    return version, model_dir / version
@@ -0,0 +1,127 @@
+"""
+Category structure of the services, used at query time to re-rank the TF-IDF
+candidates.
+
+Written by `preprocess()` to the `categories/` directory of each artifacts version:
+- the category centroids (sum of the normalized service rows of a category, L2-normalized),
+  saved as a `RetrievalIndex` with one row per category, and the norm of every sum.
+- `categories.json`: the category names, in centroid row order.
+- `service_categories.npy`: the category id of every service row.
+- `postings_keywords.npy`: one value per posting of the service index, 1 / (number of
+  keywords of the service) where the posting's term is one of the service's `keywords`,
+  else 0. Summed over the query terms, it gives the share of the keywords in the query.
+
+Like the retrieval index, everything is plain NumPy and can be memory-mapped.
+"""
+import json
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+from .index import RetrievalIndex
+
+CATEGORIES_DIR = "categories"
+
+
+class CategoryIndex:
+    ARRAYS = ("service_categories", "category_norms", "postings_keywords")
+
+    def __init__(self, names: List[str], centroids: RetrievalIndex, service_categories, category_norms, postings_keywords):
+        self.names = names
+        self.centroids = centroids
+        self.service_categories = service_categories
+        self.category_norms = category_norms
+        self.postings_keywords = postings_keywords
+
+    @property
+    def n_categories(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def build(cls, index: RetrievalIndex, categories: List[str], keyword_ids: List[np.ndarray]) -> "CategoryIndex":
+        """
+        Builds the category data of a (normalized) retrieval index, given the category and
+        the feature ids of the keywords of every service row (see `vocabulary_feature_ids`).
+        NumPy only, like `RetrievalIndex.search`.
+        """
+        names = list(dict.fromkeys(categories))
+        category_ids = {name: i for i, name in enumerate(names)}
+        service_categories = np.array([category_ids[category] for category in categories], dtype=np.int32)
+
+        # Sum the entries of each (category, term) pair; sorted keys are a valid CSR layout
+        entry_categories = np.repeat(service_categories.astype(np.int64), np.diff(index.indptr))
+        keys, inverse = np.unique(entry_categories * index.n_features + index.indices, return_inverse=True)
+        data = np.bincount(inverse, weights=index.data)
+        centroid_rows = keys // index.n_features
+        category_norms = np.sqrt(np.bincount(centroid_rows, weights=data * data, minlength=len(names)))
+        data /= category_norms[centroid_rows]
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(centroid_rows, minlength=len(names)))))
+        centroids = RetrievalIndex.from_csr(indptr, keys % index.n_features, data, (len(names), index.n_features))
+
+        keyword_keys = []
+        keyword_counts = np.zeros(len(categories))
+        for row, ids in enumerate(keyword_ids):
+            keyword_keys.append(row * index.n_features + np.asarray(ids, dtype=np.int64))
+            keyword_counts[row] = len(ids)
+        posting_terms = np.repeat(np.arange(index.n_features, dtype=np.int64), np.diff(index.postings_indptr))
+        posting_keys = np.asarray(index.postings_rows, dtype=np.int64) * index.n_features + posting_terms
+        is_keyword = np.isin(posting_keys, np.concatenate(keyword_keys + [np.empty(0, dtype=np.int64)]))
+        postings_keywords = is_keyword / np.maximum(keyword_counts, 1)[index.postings_rows]
+        return cls(names, centroids, service_categories, category_norms, postings_keywords)
+
+    def save(self, directory: Path):
+        directory = Path(directory) / CATEGORIES_DIR
+        self.centroids.save(directory)
+        for name in self.ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        with open(directory / "categories.json", "w", encoding="utf-8") as f:
+            json.dump(self.names, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: Path, mmap_mode: str = "r") -> Optional["CategoryIndex"]:
+        """
+        Loads the category data of a version directory, or returns None for versions
+        written before it existed.
+        """
+        directory = Path(directory) / CATEGORIES_DIR
+        if not directory.exists():
+            return None
+        with open(directory / "categories.json", "r", encoding="utf-8") as f:
+            names = json.load(f)
+        centroids = RetrievalIndex.load(directory, mmap_mode=mmap_mode)
+        arrays = [np.load(directory / f"{name}.npy", mmap_mode=mmap_mode) for name in cls.ARRAYS]
+        return cls(names, centroids, *arrays)
+
+    def category_scores_batch(self, queries) -> np.ndarray:
+        """
+        Cosine similarity of every query ((term ids, weights) pairs) to every category
+        centroid (0 when they share no term), in one pass over the centroid postings:
+        an (n_queries, n_categories) array.
+        """
+        scores = np.zeros((len(queries), self.n_categories))
+        query_ids, rows, values, _ = self.centroids.score_batch(queries)
+        scores[query_ids, rows] = values
+        return scores
+
+    def category_scores_from_pairs(self, query_ids: np.ndarray, service_categories: np.ndarray, scores: np.ndarray,
+                                   n_queries: int) -> np.ndarray:
+        """
+        Same as `category_scores_batch`, from the (query, service) pairs of the queries
+        (see `RetrievalIndex.score_batch`): a centroid is the normalized sum of its service
+        rows, so a query's similarity to it is the sum of their scores divided by the norm
+        of that sum. An (n_queries, n_categories) array.
+        """
+        sums = np.bincount(query_ids * self.n_categories + service_categories, weights=scores,
+                           minlength=n_queries * self.n_categories)
+        return sums.reshape(n_queries, self.n_categories) / np.maximum(self.category_norms, 1e-12)
+
+
+def vocabulary_feature_ids(terms: np.ndarray, words: List[str]) -> np.ndarray:
+    """
+    Feature ids of the words found in a sorted vocabulary (its positions are the feature
+    ids); words it does not know are left out.
+    """
+    words = np.array(words, dtype=str)
+    positions = np.searchsorted(terms, words)
+    positions[positions == len(terms)] = 0
+    return positions[terms[positions] == words]
+
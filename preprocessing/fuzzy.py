@@ -0,0 +1,190 @@
+"""
+Spelling correction of query words against the vocabulary (symmetric delete, as in SymSpell).
+
+Query words that are not in the vocabulary (typos, colloquial spellings) would be
+dropped by the encoder. Each one is replaced by the closest vocabulary term instead,
+when there is one within a small edit distance (optimal string alignment: insertions,
+deletions, substitutions and swaps of two neighbouring letters).
+
+Two words are within distance d only if deleting at most d letters from each gives
+a common string. `preprocess()` therefore indexes every string obtained by deleting
+up to `max_distance` letters from each term. At query time, the deletes of the
+unknown word are looked up, and only the terms found are checked with the real
+distance. There is no scan over the whole vocabulary.
+
+Written to the `fuzzy/` directory of each artifacts version, as plain NumPy arrays
+that can be memory-mapped:
+- `keys.npy`: the sorted CRC-32 hashes of the delete strings.
+- `indptr.npy` / `term_ids.npy`: the terms of every key, CSR style. Hash collisions
+  only add candidates, which the distance check rejects.
+- `stop_words.npy`: the sorted hashes of the stop words of the vectorizer. They are not
+  in the vocabulary either, but they are real words and are left alone.
+
+Hashing-mode artifacts have no vocabulary, so they have no fuzzy index.
+"""
+import json
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Optional, Set
+import numpy as np
+from .artifacts import load_vocabulary
+
+FUZZY_DIR = "fuzzy"
+# Corrections kept per model (the same misspellings come back)
+CORRECTIONS_CACHE_SIZE = 100_000
+
+
+def deletes(word: str, max_distance: int) -> Set[str]:
+    """
+    The word and every string obtained by deleting up to `max_distance` of its letters.
+    """
+    variants = {word}
+    level = {word}
+    for _ in range(max_distance):
+        level = {variant[:i] + variant[i + 1:] for variant in level for i in range(len(variant))}
+        variants |= level
+    return variants
+
+
+def string_hashes(strings: Iterable[str]) -> np.ndarray:
+    return np.fromiter((zlib.crc32(string.encode("utf-8")) for string in strings), dtype=np.uint32)
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance between two words, or `max_distance + 1` as soon
+    as it is known to be larger than `max_distance`.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+class FuzzyIndex:
+    ARRAYS = ("keys", "indptr", "term_ids", "stop_words")
+
+    def __init__(self, terms: np.ndarray, idf: np.ndarray, keys, indptr, term_ids, stop_words, max_distance: int):
+        # Plain views of the memory maps: indexing a np.memmap costs more than the lookups themselves
+        self.terms = np.asarray(terms)
+        self.idf = np.asarray(idf)
+        self.keys = np.asarray(keys)
+        self.indptr = np.asarray(indptr)
+        self.term_ids = np.asarray(term_ids)
+        self.stop_words = np.asarray(stop_words)
+        self.max_distance = max_distance
+        self.correct_word = lru_cache(maxsize=CORRECTIONS_CACHE_SIZE)(self._correct_word)
+
+    @classmethod
+    def build(cls, terms: np.ndarray, idf: np.ndarray, stop_words: Iterable[str], max_distance: int) -> "FuzzyIndex":
+        """
+        Indexes the deletes of every term of a sorted vocabulary (its positions are the term ids).
+        """
+        hashes, ids = [], []
+        for term_id, term in enumerate(terms.tolist()):
+            variants = deletes(term, max_distance)
+            hashes.append(string_hashes(variants))
+            ids.append(np.full(len(variants), term_id, dtype=np.int32))
+        hashes = np.concatenate(hashes + [np.empty(0, dtype=np.uint32)])
+        ids = np.concatenate(ids + [np.empty(0, dtype=np.int32)])
+        pairs = np.unique(hashes.astype(np.uint64) << np.uint64(32) | ids.astype(np.uint64))
+        pair_keys = (pairs >> np.uint64(32)).astype(np.uint32)
+        keys, counts = np.unique(pair_keys, return_counts=True)
+        indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        term_ids = (pairs & np.uint64(0xFFFFFFFF)).astype(np.int32)
+        stop_words = np.unique(string_hashes(stop_words))
+        return cls(terms, idf, keys, indptr, term_ids, stop_words, max_distance)
+
+    def save(self, directory: Path):
+        directory = Path(directory) / FUZZY_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        with open(directory / "fuzzy_meta.json", "w", encoding="utf-8") as f:
+            json.dump({"max_distance": self.max_distance}, f)
+
+    @classmethod
+    def load(cls, directory: Path, mmap_mode: str = "r") -> Optional["FuzzyIndex"]:
+        """
+        Loads the fuzzy index of a version directory, or returns None for versions
+        without one (written before it existed, or in hashing mode).
+        """
+        directory = Path(directory)
+        if not (directory / FUZZY_DIR).exists():
+            return None
+        terms, idf = load_vocabulary(directory, mmap_mode=mmap_mode)
+        with open(directory / FUZZY_DIR / "fuzzy_meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = [np.load(directory / FUZZY_DIR / f"{name}.npy", mmap_mode=mmap_mode) for name in cls.ARRAYS]
+        return cls(terms, idf, *arrays, max_distance=meta["max_distance"])
+
+    def candidates(self, word: str, max_distance: int) -> np.ndarray:
+        """
+        Ids of the terms sharing a delete string with the word (a superset of the terms within `max_distance`).
+        """
+        hashes = string_hashes(deletes(word, max_distance))
+        positions = np.searchsorted(self.keys, hashes)
+        positions[positions == len(self.keys)] = 0
+        found = positions[self.keys[positions] == hashes]
+        if len(found) == 0:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate([self.term_ids[self.indptr[p]:self.indptr[p + 1]] for p in found]))
+
+    def closest_term(self, word: str, max_distance: int) -> Optional[str]:
+        """
+        The vocabulary term closest to the word within `max_distance` edits; among equally
+        close terms, the most common one (lowest IDF), then the first one. None if there is none.
+        """
+        max_distance = min(max_distance, self.max_distance)
+        best = None
+        for term_id in self.candidates(word, max_distance).tolist():
+            term = str(self.terms[term_id])
+            distance = edit_distance(word, term, max_distance)
+            if distance <= max_distance:
+                key = (distance, float(self.idf[term_id]), term_id)
+                if best is None or key < best[0]:
+                    best = (key, term)
+        return best[1] if best else None
+
+    def is_stop_word(self, word: str) -> bool:
+        word_hash = string_hashes([word])[0]
+        position = np.searchsorted(self.stop_words, word_hash)
+        return bool(position < len(self.stop_words) and self.stop_words[position] == word_hash)
+
+    def _correct_word(self, word: str, max_distance: int) -> Optional[str]:
+        if self.is_stop_word(word):
+            return None
+        return self.closest_term(word, max_distance)
+
+    def correct(self, tokens: List[str], min_length: int, two_edits_length: int) -> List[str]:
+        """
+        The tokens with every unknown word of at least `min_length` letters replaced by its
+        closest term (1 edit, 2 from `two_edits_length` letters); unknown words with no
+        close term, and stop words, are kept as they are.
+        """
+        if not tokens:
+            return tokens
+        words = np.array(tokens)
+        positions = np.searchsorted(self.terms, words)
+        positions[positions == len(self.terms)] = 0
+        unknown = self.terms[positions] != words
+        if not unknown.any():
+            return tokens
+        corrected = list(tokens)
+        for i in np.flatnonzero(unknown).tolist():
+            word = tokens[i]
+            if len(word) >= min_length:
+                corrected[i] = self.correct_word(word, 1 if len(word) < two_edits_length else 2) or word
+        return corrected
@@ -0,0 +1,190 @@
+"""
+Hashed feature space, the alternative to the fitted vocabulary (`VECTORIZER_MODE = "hashing"`).
+
+The feature id of a term is a hash of the term (CRC-32 modulo `n_features`), so neither
+preprocessing nor query encoding keeps a vocabulary: memory is set by `n_features`,
+whatever the number of distinct terms, and a query is encoded without any lookup.
+Terms that share a bucket are conflated; with far fewer terms than buckets that is rare.
+
+Document frequencies come from the category-level documents, like the vocabulary
+model (see `preprocess._fit_category_terms`), and are tracked separately from the rows as one
+set of used features per category. A shard of services (`HashedShard`) holds those
+sets and its raw term count rows; shards merge by joining the sets and stacking the
+rows, so they can be built in parallel and merged in order.
+"""
+import json
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Sequence
+import numpy as np
+from .text import preprocess_text
+
+HASHING_MODE = "hashing"
+# Sorted hashes of the stop words, saved with the IDF weights for the query encoder
+STOP_WORDS_FILE = "stop_words.npy"
+
+
+def token_hashes(tokens: Sequence[str]) -> np.ndarray:
+    """
+    CRC-32 of every token (same token, same hash, in every process).
+    """
+    return np.fromiter((zlib.crc32(token.encode("utf-8")) for token in tokens), dtype=np.int64, count=len(tokens))
+
+
+def feature_ids(tokens: Sequence[str], n_features: int) -> np.ndarray:
+    """
+    Hashed feature id of every token.
+    """
+    return token_hashes(tokens) % n_features
+
+
+class CategoryFeatures:
+    """
+    The hashed features used by the services of each category, and the number of
+    services of each category: all the category-level fit needs, in fixed memory
+    (one byte per feature and category).
+    """
+
+    def __init__(self, n_features: int):
+        self.n_features = n_features
+        self.used: Dict[str, np.ndarray] = {}
+        self.sizes: Counter = Counter()
+
+    def add(self, category: str, ids: np.ndarray):
+        if category not in self.used:
+            self.used[category] = np.zeros(self.n_features, dtype=bool)
+        self.used[category][ids] = True
+        self.sizes[category] += 1
+
+    def merge(self, other: "CategoryFeatures") -> "CategoryFeatures":
+        for category, used in other.used.items():
+            if category in self.used:
+                self.used[category] |= used
+            else:
+                self.used[category] = used.copy()
+        self.sizes.update(other.sizes)
+        return self
+
+    def idf(self) -> np.ndarray:
+        """
+        Smoothed IDF of every feature, ln((1 + n) / (1 + df)) + 1 as in `TfidfTransformer`,
+        where df is the number of services whose category uses the feature. Features no
+        service uses get 0, so queries drop them like unknown terms.
+        """
+        document_frequency = np.zeros(self.n_features)
+        for category, used in self.used.items():
+            document_frequency[used] += self.sizes[category]
+        n_documents = sum(self.sizes.values())
+        idf = np.log((n_documents + 1) / (document_frequency + 1)) + 1.0
+        idf[document_frequency == 0] = 0.0
+        return idf
+
+
+class HashedShard(NamedTuple):
+    categories: CategoryFeatures
+    counts: object  # scipy CSR matrix: raw term counts of the short_texts, one row per service
+
+
+def merge_shards(shards: Iterable[HashedShard]) -> HashedShard:
+    """
+    Merges shards in the given order (the rows of the result follow it).
+    """
+    from scipy import sparse
+
+    categories, counts = None, []
+    for shard in shards:
+        categories = shard.categories if categories is None else categories.merge(shard.categories)
+        counts.append(shard.counts)
+    if categories is None:
+        raise ValueError("no shards to merge")
+    return HashedShard(categories, sparse.vstack(counts, format="csr"))
+
+
+class HashingTfidf:
+    """
+    TF-IDF over hashed features, the counterpart of the fitted `TfidfVectorizer`: same
+    analyzer (lowercase, `preprocess_text`, stop words removed), smoothed IDF from the
+    category-level document frequencies, L2-normalized rows.
+    """
+
+    def __init__(self, n_features: int, stop_words: Iterable[str] = (), lowercase: bool = True):
+        self.n_features = n_features
+        self.stop_words = frozenset(stop_words)
+        self.lowercase = lowercase
+        self.idf_ = None
+
+    def analyze(self, text: str) -> List[str]:
+        if self.lowercase:
+            text = text.lower()
+        return [token for token in preprocess_text(text) if token not in self.stop_words]
+
+    def counts(self, texts: Iterable[str]):
+        """
+        Raw term counts of the texts, as a CSR matrix with sorted indices.
+        """
+        from scipy import sparse
+
+        indptr, indices, data = [0], [], []
+        for text in texts:
+            ids, row_counts = np.unique(feature_ids(self.analyze(text), self.n_features), return_counts=True)
+            indices.append(ids)
+            data.append(row_counts)
+            indptr.append(indptr[-1] + len(ids))
+        return sparse.csr_matrix(
+            (np.concatenate(data + [np.empty(0, dtype=np.int64)]).astype(np.float64),
+             np.concatenate(indices + [np.empty(0, dtype=np.int64)]).astype(np.int32),
+             np.array(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, self.n_features),
+        )
+
+    def build_shard(self, services: List[dict]) -> HashedShard:
+        """
+        Shard of (enriched) services: the category features of their full_texts and the
+        term counts of their short_texts. Runs in a worker process.
+        """
+        categories = CategoryFeatures(self.n_features)
+        for service in services:
+            categories.add(service.get("category", ""), feature_ids(self.analyze(service["full_text"]), self.n_features))
+        return HashedShard(categories, self.counts(service["short_text"] for service in services))
+
+    def fit_shards(self, shards: Iterable[HashedShard]):
+        """
+        Merges the shards, sets the IDF weights and returns the TF-IDF matrix of all their rows.
+        """
+        merged = merge_shards(shards)
+        self.idf_ = merged.categories.idf()
+        return self.weigh(merged.counts)
+
+    def weigh(self, counts):
+        from sklearn.preprocessing import normalize
+
+        matrix = counts.astype(np.float64, copy=True)
+        matrix.data *= self.idf_[matrix.indices]
+        return normalize(matrix, norm="l2", copy=False)
+
+    def transform(self, texts: Iterable[str]):
+        return self.weigh(self.counts(texts))
+
+    def save(self, directory: Path):
+        """
+        Saves what a query encoder needs: the IDF weights, the hashes of the stop words
+        (their buckets may hold real terms, so queries must drop them before hashing to
+        features) and the hashing settings (`vectorizer_meta.json`, like `save_vocabulary`).
+        There is no vocabulary to save.
+        """
+        from .artifacts import VECTORIZER_META
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "idf.npy", self.idf_)
+        np.save(directory / STOP_WORDS_FILE, np.unique(token_hashes(sorted(self.stop_words))))
+        with open(directory / VECTORIZER_META, "w", encoding="utf-8") as f:
+            json.dump({
+                "mode": HASHING_MODE,
+                "n_features": self.n_features,
+                "lowercase": self.lowercase,
+                "norm": "l2",
+                "sublinear_tf": False,
+                "ngram_range": [1, 1],
+            }, f)
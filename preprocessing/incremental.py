@@ -0,0 +1,147 @@
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Optional
+from scraping.scraper import ScrapedServiceData
+from scraping.records import read_records, write_records
+from .hashing import HASHING_MODE
+from config import (
+    SCRAPED_SERVICES_FILE, ENRICHED_SERVICES_FILE, VECTORIZER_FILE, SERVICES_MATRIX_FILE,
+    SERVICE_HASHES_FILE, INCREMENTAL_DRIFT_THRESHOLD, VECTORIZER_MODE,
+)
+
+
+def service_key(service: ScrapedServiceData) -> str:
+    """
+    Identifies a service across scrapes. The URL alone is not unique: a few services
+    are listed under more than one category.
+    """
+    return f"{service.get('category', '')} | {service.get('service_url', '')}"
+
+def service_hash(service: ScrapedServiceData) -> str:
+    """
+    Content hash of a scraped record (key order independent).
+    """
+    payload = json.dumps(service, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def compute_service_hashes(services_data: Iterable[ScrapedServiceData]) -> Dict[str, str]:
+    return {service_key(service): service_hash(service) for service in services_data}
+
+def save_preprocess_state(service_hashes: Dict[str, str], vectorizer_mode: str, n_features: int):
+    """
+    Records what the last preprocess built from: the content hash of every service,
+    and the vectorizer mode and number of features of the pickled matrix.
+    """
+    state = {"vectorizer_mode": vectorizer_mode, "n_features": n_features, "services": service_hashes}
+    with open(SERVICE_HASHES_FILE, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+
+def load_preprocess_state() -> Optional[Dict[str, Any]]:
+    """
+    The state saved by `save_preprocess_state`, or None without one (files written before
+    the mode was recorded hold the hashes only, and count as none).
+    """
+    if not SERVICE_HASHES_FILE.exists():
+        return None
+    with open(SERVICE_HASHES_FILE, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    return state if "services" in state else None
+
+def vocabulary_drift(vectorizer, services) -> float:
+    """
+    Share of terms in the given (enriched) services that the fitted vocabulary does not
+    know, relative to the vocabulary size. Those terms would be silently dropped until
+    the vectorizer is refitted.
+    """
+    analyze = vectorizer.build_analyzer()
+    new_terms = set()
+    for service in services:
+        new_terms.update(term for term in analyze(service["full_text"]) if term not in vectorizer.vocabulary_)
+    return len(new_terms) / max(len(vectorizer.vocabulary_), 1)
+
+def preprocess_incremental(drift_threshold: float = INCREMENTAL_DRIFT_THRESHOLD) -> bool:
+    """
+    Re-vectorizes only the services whose scraped content changed since the last run,
+    keeping the fitted vectorizer (vocabulary and IDF) and the matrix rows of unchanged services.
+
+    Returns False, without writing anything, when a full `preprocess()` is needed:
+    no previous state, a previous run in another mode (whose matrix does not match
+    the pickled vectorizer), the changed services bring in more new terms than
+    `drift_threshold` (as a share of the vocabulary), or `VECTORIZER_MODE` is "hashing".
+    """
+    import pickle
+    from scipy import sparse
+    from .preprocess import enrich_services_with_texts, top_keywords, save_artifacts
+
+    if VECTORIZER_MODE == HASHING_MODE:
+        # Category feature sets can be joined, not reduced, so a changed service needs a rebuild
+        print("Incremental runs use the vocabulary mode, running a full preprocess...")
+        return False
+
+    state = load_preprocess_state()
+    if state is None or not all(path.exists() for path in (ENRICHED_SERVICES_FILE, VECTORIZER_FILE, SERVICES_MATRIX_FILE)):
+        print("No previous preprocessing state found, running a full preprocess...")
+        return False
+    if state["vectorizer_mode"] != VECTORIZER_MODE:
+        # The matrix is that of the other mode, the vectorizer an older one
+        print(f"The last preprocess ran in {state['vectorizer_mode']} mode, running a full preprocess...")
+        return False
+    previous_hashes = state["services"]
+
+    print("Loading services data...")
+    services_data = read_records(SCRAPED_SERVICES_FILE)
+    service_hashes = compute_service_hashes(services_data)
+
+    previous_services = read_records(ENRICHED_SERVICES_FILE)
+    previous_rows = {service_key(service): row for row, service in enumerate(previous_services)}
+
+    keys = [service_key(service) for service in services_data]
+    changed = [
+        i for i, key in enumerate(keys)
+        if previous_hashes.get(key) != service_hashes[key] or key not in previous_rows
+    ]
+    removed = set(previous_hashes) - set(keys)
+    print(f"{len(changed)} new or changed, {len(removed)} removed, {len(keys) - len(changed)} unchanged services.")
+    if not changed and not removed and list(previous_hashes) == keys:
+        print("Nothing to do, artifacts are up to date.")
+        return True
+
+    with open(VECTORIZER_FILE, "rb") as f:
+        vectorizer = pickle.load(f)
+    with open(SERVICES_MATRIX_FILE, "rb") as f:
+        previous_matrix = sparse.csr_matrix(pickle.load(f))
+    if not previous_matrix.shape[1] == state["n_features"] == len(vectorizer.vocabulary_):
+        print("The saved matrix does not match the saved vectorizer, running a full preprocess...")
+        return False
+
+    changed_services = enrich_services_with_texts([services_data[i] for i in changed])
+    drift = vocabulary_drift(vectorizer, changed_services)
+    if drift > drift_threshold:
+        print(f"Vocabulary drift {drift:.1%} is above {drift_threshold:.1%}, refitting on the whole corpus...")
+        return False
+    print(f"Vocabulary drift {drift:.1%}, keeping the fitted vectorizer.")
+
+    # Only the changed services go through the vectorizer
+    changed_matrix = vectorizer.transform([service["short_text"] for service in changed_services])
+    feature_names = vectorizer.get_feature_names_out()
+    for service, keywords in zip(changed_services, top_keywords(changed_matrix, feature_names, top_n=4)):
+        service["keywords"] = keywords
+
+    # Stack old and new rows once, then pick every service's row in the current scrape order
+    changed_rows = {i: len(previous_services) + n for n, i in enumerate(changed)}
+    enriched_services = []
+    row_order = []
+    for i, key in enumerate(keys):
+        if i in changed_rows:
+            enriched_services.append(services_data[i])
+            row_order.append(changed_rows[i])
+        else:
+            enriched_services.append(previous_services[previous_rows[key]])
+            row_order.append(previous_rows[key])
+    services_matrix = sparse.vstack([previous_matrix, changed_matrix], format="csr")[row_order]
+
+    write_records(ENRICHED_SERVICES_FILE, enriched_services)
+    save_artifacts(vectorizer, services_matrix, save_vectorizer=False)
+    save_preprocess_state(service_hashes, VECTORIZER_MODE, services_matrix.shape[1])
+    print("Incremental preprocessing completed.")
+    return True
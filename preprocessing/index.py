@@ -0,0 +1,248 @@
+import json
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+# Postings read per group of queries scored together (see `RetrievalIndex.query_groups`)
+BATCH_POSTINGS = 1 << 16
+# Largest dense (queries x services) array `RetrievalIndex.score_batch` accumulates scores in
+BATCH_SCRATCH = 1 << 20
+
+
+class RetrievalIndex:
+    """
+    Row-normalized TF-IDF index over the services, built once by `preprocess()`.
+
+    Keeps the service vectors twice:
+    - `matrix`: L2-normalized CSR rows (service -> terms), used for batch scoring.
+    - postings: the same weights grouped by term (term -> service rows and weights),
+      so a query only touches the services that share at least one of its terms.
+
+    Because the rows are already normalized, the cosine similarity of a normalized
+    query is a plain dot product.
+
+    All state is plain NumPy arrays, saved as `.npy` files so they can be memory-mapped.
+    scipy is only imported by the build/matrix helpers, so searching a loaded index
+    needs nothing but NumPy.
+    """
+
+    ARRAYS = ("indptr", "indices", "data", "postings_indptr", "postings_rows", "postings_weights")
+
+    def __init__(self, indptr, indices, data, postings_indptr, postings_rows, postings_weights, shape):
+        # Plain views of the memory maps (np.memmap slicing is slower), sliced for every query
+        self.indptr = np.asarray(indptr)
+        self.indices = np.asarray(indices)
+        self.data = np.asarray(data)
+        self.postings_indptr = np.asarray(postings_indptr)
+        self.postings_rows = np.asarray(postings_rows)
+        self.postings_weights = np.asarray(postings_weights)
+        self.n_services, self.n_features = shape
+
+    @classmethod
+    def from_matrix(cls, matrix) -> "RetrievalIndex":
+        matrix = normalize_rows(matrix)
+        # CSC layout of the same matrix is exactly the inverted index:
+        # column t holds the rows (services) containing term t and their weights.
+        postings = matrix.tocsc()
+        postings.sort_indices()
+        return cls(
+            matrix.indptr, matrix.indices, matrix.data,
+            postings.indptr, postings.indices, postings.data,
+            matrix.shape,
+        )
+
+    @classmethod
+    def from_csr(cls, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, shape) -> "RetrievalIndex":
+        """
+        Same as `from_matrix` for the arrays of a CSR matrix whose rows are already
+        L2-normalized, with NumPy only.
+        """
+        rows = np.repeat(np.arange(shape[0]), np.diff(indptr))
+        # Group the entries by term, rows ascending inside each term (what CSC gives)
+        order = np.lexsort((rows, indices))
+        postings_indptr = np.concatenate(([0], np.cumsum(np.bincount(indices, minlength=shape[1]))))
+        return cls(indptr, indices, data, postings_indptr, rows[order], data[order], shape)
+
+    @property
+    def matrix(self):
+        from scipy import sparse
+        return sparse.csr_matrix((self.data, self.indices, self.indptr), shape=(self.n_services, self.n_features), copy=False)
+
+    def save(self, directory: Path):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        with open(directory / "index_meta.json", "w", encoding="utf-8") as f:
+            json.dump({"shape": [self.n_services, self.n_features]}, f)
+
+    @classmethod
+    def load(cls, directory: Path, mmap_mode: str = "r") -> "RetrievalIndex":
+        """
+        Loads a saved index. With the default `mmap_mode="r"` nothing is read up front:
+        the arrays are mapped and pages are shared between processes (e.g. forked workers).
+        """
+        directory = Path(directory)
+        with open(directory / "index_meta.json", "r", encoding="utf-8") as f:
+            shape = tuple(json.load(f)["shape"])
+        arrays = [np.load(directory / f"{name}.npy", mmap_mode=mmap_mode) for name in cls.ARRAYS]
+        return cls(*arrays, shape)
+
+    def search(self, query_indices: np.ndarray, query_weights: np.ndarray, top_k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores one query given as its non-zero term ids and weights.
+
+        Returns:
+            (rows, scores) of the best `top_k` services, highest score first.
+            Empty arrays if the query shares no term with any service.
+        """
+        rows, scores, _ = self.score(query_indices, query_weights)
+        if len(rows) == 0:
+            return rows, scores
+        return top_k_scores(rows, scores, top_k)
+
+    def score(self, query_indices: np.ndarray, query_weights: np.ndarray,
+              posting_values: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        Scores every service sharing at least one term with the query.
+
+        `posting_values` holds one value per posting (aligned with `postings_rows`); the
+        values of the postings read are summed per service as well.
+
+        Returns:
+            (rows, scores, value_sums): the candidate rows in ascending order, their scores
+            and the summed posting values (None without `posting_values`).
+        """
+        _, rows, scores, value_sums = self.score_batch([(query_indices, query_weights)], posting_values=posting_values)
+        return rows, scores, value_sums
+
+    def score_batch(self, queries: Sequence[Tuple[np.ndarray, np.ndarray]], posting_values: Optional[np.ndarray] = None
+                    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        `score` for many queries, given as (term ids, weights) pairs: the product of
+        their sparse query matrix with the index, read from the postings lists of their
+        terms. Every query gets the same scores, to the last bit, as when scored alone.
+        Large batches are best split with `query_groups` first.
+
+        Returns:
+            (query_ids, rows, scores, value_sums): one entry per (query, candidate) pair,
+            ordered by query, then by row.
+        """
+        terms_per_query = np.array([len(indices) for indices, _ in queries], dtype=np.int64)
+        query_indices = np.concatenate([indices for indices, _ in queries] + [np.empty(0, dtype=np.int64)])
+        query_weights = np.concatenate([weights for _, weights in queries] + [np.empty(0, dtype=np.float64)])
+        term_queries = np.repeat(np.arange(len(queries), dtype=np.int64), terms_per_query)
+
+        # Gather the postings lists of the query terms only
+        starts = self.postings_indptr[query_indices]
+        lengths = self.postings_indptr[query_indices + 1] - starts
+        positions = segment_positions(starts, lengths)
+        rows = self.postings_rows[positions]
+        contributions = self.postings_weights[positions] * np.repeat(query_weights, lengths)
+
+        # Accumulate per (query, service) pair; pairs come out sorted by query, then row.
+        # A dense (queries x services) array when it is small enough, else a sort of the pairs.
+        keys = np.repeat(term_queries, lengths) * self.n_services + rows
+        size = len(queries) * self.n_services
+        if size <= BATCH_SCRATCH:
+            pairs = np.flatnonzero(np.bincount(keys, minlength=size))
+            scores = np.bincount(keys, weights=contributions, minlength=size)[pairs]
+            value_sums = None if posting_values is None else np.bincount(keys, weights=posting_values[positions], minlength=size)[pairs]
+        else:
+            pairs, inverse = np.unique(keys, return_inverse=True)
+            scores = np.bincount(inverse, weights=contributions, minlength=len(pairs))
+            value_sums = None if posting_values is None else np.bincount(inverse, weights=posting_values[positions], minlength=len(pairs))
+        return pairs // self.n_services, pairs % self.n_services, scores, value_sums
+
+    def query_groups(self, queries: Sequence[Tuple[np.ndarray, np.ndarray]]) -> List[List[int]]:
+        """
+        Splits a batch of queries into runs of consecutive queries to pass to `score_batch`
+        together: at most BATCH_POSTINGS postings to read and BATCH_SCRATCH (query,
+        service) pairs per run, so the temporary arrays stay small. A query that exceeds
+        them alone is a run of its own.
+        """
+        groups, group, group_postings = [], [], 0
+        for query_id, (indices, _) in enumerate(queries):
+            n_postings = int((self.postings_indptr[indices + 1] - self.postings_indptr[indices]).sum())
+            if group and (group_postings + n_postings > BATCH_POSTINGS or (len(group) + 1) * self.n_services > BATCH_SCRATCH):
+                groups.append(group)
+                group, group_postings = [], 0
+            group.append(query_id)
+            group_postings += n_postings
+        if group:
+            groups.append(group)
+        return groups
+
+
+def segment_positions(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Positions of every element of the segments [start, start + length), concatenated,
+    without a Python loop.
+    """
+    offsets = starts - (np.cumsum(lengths) - lengths)
+    return np.repeat(offsets, lengths) + np.arange(lengths.sum())
+
+
+def normalize_rows(matrix):
+    """
+    Returns a CSR copy of the matrix with every non-empty row scaled to unit L2 norm.
+    """
+    from scipy import sparse
+    matrix = sparse.csr_matrix(matrix, dtype=np.float64, copy=True)
+    row_norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    row_norms[row_norms == 0] = 1.0
+    matrix.data /= np.repeat(row_norms, np.diff(matrix.indptr))
+    return matrix
+
+
+def top_k_scores(rows: np.ndarray, scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Picks the `top_k` highest scores with `argpartition` (no full sort of all candidates)
+    and orders them by descending score, then by row. No candidates give empty arrays.
+    """
+    best = top_k_positions(rows, scores, top_k)
+    return rows[best], scores[best]
+
+
+def top_k_positions(rows: np.ndarray, scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    The positions `top_k_scores` picks.
+    """
+    if len(scores) == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k == 1:
+        # Same tie-breaking as np.argmax: the lowest row wins
+        best = np.array([np.argmax(scores)])
+    elif top_k < len(scores):
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        best = np.arange(len(scores))
+    return best[np.lexsort((rows[best], -scores[best]))]
+
+
+def top_k_per_query(query_ids: np.ndarray, rows: np.ndarray, scores: np.ndarray, n_queries: int,
+                    top_k: int) -> List[np.ndarray]:
+    """
+    For (query, row) pairs ordered by query (see `RetrievalIndex.score_batch`), the
+    positions `top_k_positions` picks among the pairs of every query.
+    """
+    bounds = np.searchsorted(query_ids, np.arange(n_queries + 1))
+    return [start + top_k_positions(rows[start:end], scores[start:end], top_k)
+            for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+
+
+def pair_values(query_ids: np.ndarray, rows: np.ndarray, other_ids: np.ndarray, other_rows: np.ndarray,
+                other_values: np.ndarray, n_services: int) -> np.ndarray:
+    """
+    The values of the (query, row) pairs of another scoring (both ordered by query,
+    then by row) for each given pair, 0 for the pairs it does not have.
+    """
+    keys = query_ids * n_services + rows
+    other_keys = other_ids * n_services + other_rows
+    # Look the other pairs up among the given ones (the other scoring is the sparse one, with fewer pairs)
+    positions = np.searchsorted(keys, other_keys)
+    found = positions < len(keys)
+    found[found] = keys[positions[found]] == other_keys[found]
+    values = np.zeros(len(keys))
+    values[positions[found]] = other_values[found]
+    return values
@@ -0,0 +1,146 @@
+"""
+Lemmatization without a morphological analyzer at serving time.
+
+`preprocess()` runs the camel-tools analyzer once per distinct word of the corpus and
+saves the lemmas as a lookup table with the model, so the inflected and cliticized
+forms of a word (رخصة, الرخص, برخصته) count as one term. Serving never imports
+camel-tools. A query word is looked up in the table. A word the corpus does not have
+is looked up again without its leading clitics (و, ف, ب, ك, ل, ال), which covers
+most query forms, and is used as it is when that fails too. The vectorizer uses the
+same table as its tokenizer, so the matrix and the queries agree.
+
+Written to the `lemmas/` directory of an artifacts version, as arrays that can be memory-mapped:
+- `forms.npy`: the sorted words (normalized like all tokens, see `norm`).
+- `form_lemmas.npy`: the position in `lemmas.npy` of the lemma of every form.
+- `lemmas.npy`: the distinct lemmas, normalized the same way.
+
+Stop words are not analyzed. The vectorizer removes them after lemmatization, so
+lemmas that are stop words are removed too.
+"""
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+import numpy as np
+from .text import norm, preprocess_text
+
+LEMMAS_DIR = "lemmas"
+# Leading clitics stripped from unknown words, longest first (ل + ال is written لل)
+CLITIC_PREFIXES = ("وبال", "وال", "فال", "بال", "كال", "ولل", "فلل", "لل", "ال", "و", "ف", "ب", "ك", "ل")
+# Letters that have to remain after stripping a clitic
+MIN_STEM_LENGTH = 3
+# Sense number of camel-tools lemmas (رخصة_1)
+LEX_SUFFIX_RE = re.compile(r"_\d+$")
+# Lemmas of query words kept per table
+LEMMA_CACHE_SIZE = 100_000
+
+
+def camel_lemmatizer() -> Optional[Callable[[str], Optional[str]]]:
+    """
+    A function giving the most likely lemma of a word according to camel-tools (its
+    built-in morphology database), or None if the word has no analysis. None when
+    camel-tools is not installed or its database cannot be loaded.
+    """
+    try:
+        from camel_tools.morphology.analyzer import Analyzer
+        from camel_tools.morphology.database import MorphologyDB
+    except ImportError:
+        return None
+    try:
+        analyzer = Analyzer(MorphologyDB.builtin_db())
+    except Exception as e:
+        # camel-tools installs without its data, which `camel_data -i light` downloads
+        print(f"camel-tools morphology database not available ({e!r})")
+        return None
+
+    def lemmatize(word: str) -> Optional[str]:
+        analyses = analyzer.analyze(word)
+        if not analyses:
+            return None
+        analysis = max(analyses, key=lambda analysis: float(analysis.get("pos_lex_logprob", -99.0)))
+        lemma = norm(LEX_SUFFIX_RE.sub("", analysis["lex"]))
+        return lemma if len(lemma) > 1 and lemma.isalnum() else None
+    return lemmatize
+
+
+class LemmaTable:
+    ARRAYS = ("forms", "form_lemmas", "lemmas")
+
+    def __init__(self, forms: np.ndarray, form_lemmas: np.ndarray, lemmas: np.ndarray):
+        # Plain views of the memory maps, indexed for every query word
+        self.forms = np.asarray(forms)
+        self.form_lemmas = np.asarray(form_lemmas)
+        self.lemmas = np.asarray(lemmas)
+        self.lemma = lru_cache(maxsize=LEMMA_CACHE_SIZE)(self._lemma)
+
+    def __getstate__(self):
+        # Pickled as the tokenizer of the vectorizer: the arrays, without the cache
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self.forms)
+
+    def __call__(self, text: str) -> List[str]:
+        """
+        `preprocess_text` followed by `lemmatize`: the tokenizer of a vectorizer using the table.
+        """
+        return self.lemmatize(preprocess_text(text))
+
+    @classmethod
+    def build(cls, words: Iterable[str], lemmatize: Callable[[str], Optional[str]], stop_words: Iterable[str] = ()) -> "LemmaTable":
+        """
+        Analyzes every distinct word once. Words without an analysis, and stop words, are their own lemma.
+        """
+        stop_words = set(stop_words)
+        forms = sorted(set(words) - stop_words)
+        form_lemmas = [lemmatize(form) or form for form in forms]
+        lemmas = sorted(set(form_lemmas))
+        lemma_ids = {lemma: i for i, lemma in enumerate(lemmas)}
+        form_lemmas = np.array([lemma_ids[lemma] for lemma in form_lemmas], dtype=np.int32)
+        return cls(np.array(forms, dtype=str), form_lemmas, np.array(lemmas, dtype=str))
+
+    def save(self, directory: Path):
+        directory = Path(directory) / LEMMAS_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: Path, mmap_mode: str = "r") -> Optional["LemmaTable"]:
+        """
+        Loads the lemma table of a version directory, or returns None for versions
+        without one (no lemmatization).
+        """
+        directory = Path(directory) / LEMMAS_DIR
+        if not directory.exists():
+            return None
+        return cls(*[np.load(directory / f"{name}.npy", mmap_mode=mmap_mode) for name in cls.ARRAYS])
+
+    def _find(self, word: str) -> Optional[int]:
+        position = int(np.searchsorted(self.forms, word))
+        if position < len(self.forms) and self.forms[position] == word:
+            return position
+        return None
+
+    def _lemma(self, word: str) -> str:
+        position = self._find(word)
+        if position is not None:
+            return str(self.lemmas[self.form_lemmas[position]])
+        for prefix in CLITIC_PREFIXES:
+            if word.startswith(prefix) and len(word) - len(prefix) >= MIN_STEM_LENGTH:
+                position = self._find(word[len(prefix):])
+                if position is not None:
+                    return str(self.lemmas[self.form_lemmas[position]])
+        return word
+
+    def lemmatize(self, tokens: List[str]) -> List[str]:
+        """
+        The lemma of every token: its table entry, else that of the token without its
+        leading clitics, else the token itself (cached per word).
+        """
+        if not len(self.forms):
+            return tokens
+        return [self.lemma(token) for token in tokens]
@@ -0,0 +1,153 @@
+"""
+Dense LSA index over the services, the alternative to scoring the TF-IDF postings
+(`RETRIEVAL_BACKEND = "lsa"`).
+
+`preprocess()` fits a truncated SVD of the normalized TF-IDF matrix. Every service
+row becomes a vector of `LSA_COMPONENTS` values (its projection on the top singular
+vectors). Terms that occur in the same services get close directions, so a query can
+match a service through related terms it does not share with it. The vectors are
+L2-normalized and stored as int8 with one float scale per row: 1 byte per component
+instead of 4, on disk and in memory (the codes stay memory-mapped, so the processes
+serving the same version share them).
+
+A query's TF-IDF vector is projected the same way (a weighted sum of the term
+vectors of its terms) and normalized. Its cosine scores are the products of the
+codes with it, times the row scales. NumPy has no fast int8 matrix product, so the
+codes are converted to float32 `SCORE_BLOCK_ROWS` rows at a time, a block small
+enough to stay in the CPU cache. The cost grows with the number of services,
+whatever the query terms, unlike the postings lists.
+
+Written to the `lsa/` directory of each artifacts version, as plain NumPy arrays that
+can be memory-mapped:
+- `term_vectors.npy`: the (n_features, n_components) projection, as float16 (its rounding
+  is no larger than that of the int8 codes, for half the size).
+- `codes.npy`: the (n_services, n_components) int8 service vectors.
+- `scales.npy`: the float32 scale of every row (its largest value / 127).
+
+Hashing-mode artifacts have no LSA index: the projection would need a row per hash bucket.
+"""
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+import numpy as np
+from .index import RetrievalIndex, top_k_scores
+
+LSA_DIR = "lsa"
+# Rows of int8 codes converted to float32 and scored at a time (512 KB at 128 components)
+SCORE_BLOCK_ROWS = 1024
+
+
+def quantize_rows(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    L2-normalizes every row and stores it as int8 codes and one scale, so that
+    `codes * scale` is the normalized row to within half a scale step.
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+    scales = np.abs(vectors).max(axis=1) / 127 if vectors.shape[1] else np.zeros(len(vectors))
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class LsaIndex:
+    ARRAYS = ("term_vectors", "codes", "scales")
+
+    def __init__(self, term_vectors: np.ndarray, codes: np.ndarray, scales: np.ndarray):
+        # Plain views of the memory maps, sliced for every query
+        self.term_vectors = np.asarray(term_vectors)
+        self.codes = np.asarray(codes)
+        self.scales = np.asarray(scales)
+        self.n_features, self.n_components = self.term_vectors.shape
+        self.n_services = len(self.codes)
+
+    @classmethod
+    def build(cls, index: RetrievalIndex, n_components: int, random_state: int = 0) -> "LsaIndex":
+        """
+        Fits the truncated SVD of a (normalized) retrieval index; at most as many
+        components as the matrix has rows or columns.
+        """
+        from sklearn.utils.extmath import randomized_svd
+
+        matrix = index.matrix
+        n_components = max(min(n_components, *matrix.shape), 1)
+        _, _, components = randomized_svd(matrix, n_components, n_iter=7, random_state=random_state)
+        term_vectors = np.ascontiguousarray(components.T, dtype=np.float16)
+        codes, scales = quantize_rows(matrix @ term_vectors.astype(np.float32))
+        return cls(term_vectors, codes, scales)
+
+    def save(self, directory: Path):
+        directory = Path(directory) / LSA_DIR
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: Path, mmap_mode: str = "r") -> Optional["LsaIndex"]:
+        """
+        Loads the LSA index of a version directory, or returns None for versions
+        without one (sparse scoring only).
+        """
+        directory = Path(directory) / LSA_DIR
+        if not directory.exists():
+            return None
+        return cls(*[np.load(directory / f"{name}.npy", mmap_mode=mmap_mode) for name in cls.ARRAYS])
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used when serving: the arrays as stored (memory-mapped), without the scoring scratch."""
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+
+    def project(self, query_indices: np.ndarray, query_weights: np.ndarray) -> Optional[np.ndarray]:
+        """
+        The normalized LSA vector of a query given as its non-zero term ids and
+        weights, or None when it has no terms.
+        """
+        if len(query_indices) == 0:
+            return None
+        vector = np.asarray(query_weights, dtype=np.float32) @ self.term_vectors[query_indices].astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def score(self, query_indices: np.ndarray, query_weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores every service against the query.
+
+        Returns:
+            (rows, scores): the services with a positive cosine score in LSA space, in
+            ascending row order, like the candidates of `RetrievalIndex.score`.
+        """
+        _, rows, scores = self.score_batch([(query_indices, query_weights)])
+        return rows, scores
+
+    def score_batch(self, queries: Sequence[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        `score` for many queries at once: every block of codes is converted once and
+        multiplied with all the query vectors.
+
+        Returns:
+            (query_ids, rows, scores): one entry per (query, service) pair with a positive
+            score, ordered by query, then by row, like `RetrievalIndex.score_batch`.
+        """
+        vectors = [self.project(indices, weights) for indices, weights in queries]
+        query_ids = np.array([i for i, vector in enumerate(vectors) if vector is not None], dtype=np.int64)
+        if len(query_ids) == 0:
+            return query_ids, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        stack = np.stack([vectors[i] for i in query_ids], axis=1)
+        scores = np.empty((self.n_services, len(query_ids)), dtype=np.float32)
+        for start in range(0, self.n_services, SCORE_BLOCK_ROWS):
+            stop = start + SCORE_BLOCK_ROWS
+            np.matmul(self.codes[start:stop].astype(np.float32), stack, out=scores[start:stop])
+        scores *= self.scales[:, None]
+        # (query, service) pairs, query-major
+        columns, rows = np.nonzero(scores.T > 0)
+        return query_ids[columns], rows.astype(np.int64), scores[rows, columns].astype(np.float64)
+
+    def search(self, query_indices: np.ndarray, query_weights: np.ndarray, top_k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (rows, scores) of the best `top_k` services, highest score first, like `RetrievalIndex.search`.
+        """
+        rows, scores = self.score(query_indices, query_weights)
+        if len(rows) == 0:
+            return rows, scores
+        return top_k_scores(rows, scores, top_k)
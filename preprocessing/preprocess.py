@@ -1,183 +1,424 @@
-from collections import defaultdict
-import re
-from typing import List
+import os
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
 import numpy as np
+from scipy import sparse
 from .stopwordsallforms import STOPWORDS
+from .index import RetrievalIndex
+from .categories import CategoryIndex, vocabulary_feature_ids
+from .fuzzy import FuzzyIndex
+from .lemmas import LemmaTable, camel_lemmatizer
+from .lsa import LsaIndex
+from .hashing import HASHING_MODE, HashingTfidf, feature_ids
+from .artifacts import save_vocabulary, save_services, new_version, publish_version
+from .text import norm, preprocess_text
 from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
 from scraping.scraper import ScrapedServiceData
+from scraping.records import RecordWriter, iter_records, write_records
+from config import PREPROCESS_CHUNK_SIZE, PREPROCESS_WORKERS, HASHING_N_FEATURES, FUZZY_MAX_DISTANCE, LEMMATIZE, LSA_COMPONENTS
 
 class EnrichedServiceData(ScrapedServiceData, total=False):
     full_text: str
     short_text: str
 
 
-# ============================= removing camel-tool from production code for it's big dependancy =======================
+def enrich_service(service: ScrapedServiceData) -> EnrichedServiceData:
+    """
+    Adds normalized 'full_text' and 'short_text' fields to a service (in place) and returns it.
+    """
+    # Get each relevant field, defaulting to empty string if missing
+    category = service.get("category", "")
+    name = service.get("service_name", "")
+    desc = service.get("description", "")
+    # Join terms list into a single string
+    terms = " ".join(service.get("terms", []))
+    documents = " ".join(service.get("terms", []))
+    # Concatenate all fields for full_text
+    full_text = f"{category} {name} {desc} {terms} {documents}"
+    service["full_text"] = norm(full_text)
+    # Concatenate description, name, and category for short_text
+    service["short_text"] = norm(f"{category} {name} {desc}")
+    return service
 
-import re
+def iter_enriched_services(services_data: Iterable[ScrapedServiceData]) -> Iterator[EnrichedServiceData]:
+    """
+    Enriches the services one at a time, as they are read.
+    """
+    for service in services_data:
+        yield enrich_service(service)
 
-def dediac_ar(text: str) -> str:
+def enrich_services_with_texts(services_data: List[ScrapedServiceData]) -> List[EnrichedServiceData]:
     """
-    Removes Arabic diacritics from the text.
+    For each service, add normalized 'full_text' and 'short_text' fields.
     """
-    arabic_diacritics = re.compile(r'[\u0610-\u061A\u064B-\u065F\u06D6-\u06DC\u06DF-\u06E8\u06EA-\u06ED]')
-    return re.sub(arabic_diacritics, '', text)
+    for service in services_data:
+        enrich_service(service)
+    return services_data
 
-def normalize_unicode(text: str) -> str:
+def make_vectorizer(lemmas: Optional[LemmaTable] = None) -> TfidfVectorizer:
+    normalized_stopwords = [norm(word) for word in STOPWORDS.keys()]
+    # With a lemma table, the tokens are lemmatized before the stop words are removed
+    tokenizer = lemmas if lemmas is not None else preprocess_text
+    return TfidfVectorizer(stop_words=normalized_stopwords, tokenizer=tokenizer, token_pattern=None)
+
+def _fit_category_terms(category_terms: Dict[str, Set[str]], category_sizes: Counter,
+                        lemmas: Optional[LemmaTable] = None) -> TfidfVectorizer:
     """
-    Normalizes common Unicode variations (basic NFC normalization).
+    Fits the TF-IDF vectorizer on the category-level texts: every service counts as one
+    document made of the full_texts of all the services of its category.
+
+    Fitting only needs the vocabulary and, for each term, the number of documents that
+    contain it. A category's document contains exactly the terms of its services'
+    full_texts, so it is enough to keep the term set and service count of every
+    category: a term's document frequency is the number of services in the categories
+    that use it. The vocabulary and IDF weights are the same as `vectorizer.fit` on
+    the concatenated texts, without building them (or tokenizing every category text
+    once per service).
     """
-    import unicodedata
-    return unicodedata.normalize('NFC', text)
+    vectorizer = make_vectorizer(lemmas)
+    terms = sorted(set().union(*category_terms.values()))
+    if not terms:
+        raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+    vocabulary = {term: i for i, term in enumerate(terms)}
+    document_frequency = np.zeros(len(terms))
+    for category, category_vocabulary in category_terms.items():
+        document_frequency[[vocabulary[term] for term in category_vocabulary]] += category_sizes[category]
 
-def normalize_alef_ar(text: str) -> str:
+    # Same smoothed IDF as TfidfTransformer.fit: ln((1 + n) / (1 + df)) + 1
+    n_documents = sum(category_sizes.values())
+    vectorizer.vocabulary_ = vocabulary
+    vectorizer.idf_ = np.log((n_documents + 1) / (document_frequency + 1)) + 1.0
+    return vectorizer
+
+def top_keywords(services_matrix, feature_names: np.ndarray, top_n: int = 4, chunk_size: int = 10_000) -> List[List[str]]:
     """
-    Converts أ, إ, and آ to ا.
+    For each row of the TF-IDF matrix, returns the top N terms with a non-zero score,
+    highest score first; equal scores are ordered by descending feature index, i.e. the
+    same result as `np.argsort(row, kind="stable")[-top_n:][::-1]` on each dense row.
+
+    Works directly on the CSR `data`/`indices`/`indptr` arrays (no dense rows), one
+    chunk of `chunk_size` rows at a time to bound the temporary memory on large corpora.
     """
-    return re.sub(r'[إأآ]', 'ا', text)
+    services_matrix = services_matrix.tocsr()
+    keywords = []
+    for start in range(0, services_matrix.shape[0], chunk_size):
+        keywords.extend(_top_keywords_chunk(services_matrix[start:start + chunk_size], feature_names, top_n))
+    return keywords
+
+def _top_keywords_chunk(matrix, feature_names: np.ndarray, top_n: int) -> List[List[str]]:
+    n_rows = matrix.shape[0]
+    row_ids = np.repeat(np.arange(n_rows), np.diff(matrix.indptr))
+    # One sort for the whole chunk: by row, then score descending, then feature index descending
+    order = np.lexsort((-matrix.indices, -matrix.data, row_ids))
+    sorted_rows = row_ids[order]
+    # Rank of every entry inside its row; keep the first top_n positive ones
+    rank = np.arange(len(order)) - matrix.indptr[sorted_rows]
+    keep = (rank < top_n) & (matrix.data[order] > 0)
+    selected = matrix.indices[order[keep]]
+    counts = np.bincount(sorted_rows[keep], minlength=n_rows)
+    terms = feature_names[selected].tolist()
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    return [terms[bounds[i]:bounds[i + 1]] for i in range(n_rows)]
 
-def normalize_alef_maksura_ar(text: str) -> str:
+def make_hashing_vectorizer(n_features: int = HASHING_N_FEATURES) -> HashingTfidf:
+    return HashingTfidf(n_features, stop_words=[norm(word) for word in STOPWORDS.keys()])
+
+class VocabularyShard(NamedTuple):
     """
-    Converts ى to ي.
+    What a worker returns for a chunk of services in the vocabulary mode: the tokens of
+    the full_texts of each category and the number of services of each category (all
+    the fit needs, see `_fit_category_terms`), and the raw term counts of the
+    short_texts over the chunk's own vocabulary (`terms`, column i counts terms[i]).
+    Stop words are still in: they are removed after lemmatization.
     """
-    return text.replace('ى', 'ي')
+    category_terms: Dict[str, Set[str]]
+    category_sizes: Counter
+    terms: List[str]
+    counts: sparse.csr_matrix
+
+@lru_cache(maxsize=1)
+def _analyzer() -> Callable[[str], List[str]]:
+    # Built once per worker process instead of pickling the vectorizer with every chunk.
+    # No stop words: `build_vocabulary_matrix` removes them once the tokens are lemmatized.
+    return make_vectorizer().set_params(stop_words=None).build_analyzer()
 
-def normalize_teh_marbuta_ar(text: str) -> str:
+def build_vocabulary_shard(services_data: List[ScrapedServiceData]) -> VocabularyShard:
     """
-    Converts ة to ه.
+    Enriches a chunk of scraped services (in place) and tokenizes their texts once.
+    Runs in a worker process.
+
+    The short_text is the start of the full_text (`enrich_service` normalizes the
+    fields the same way, and they are separated by spaces), so the full_text terms are
+    the short_text terms plus those of the rest of the full_text.
     """
-    return text.replace('ة', 'ه')
+    analyze = _analyzer()
+    category_terms = defaultdict(set)
+    category_sizes = Counter()
+    local_ids: Dict[str, int] = {}
+    indptr, indices, data = [0], [], []
+    for service in services_data:
+        enrich_service(service)
+        full_text, short_text = service["full_text"], service["short_text"]
+        short_terms = analyze(short_text)
+        category = service.get("category", "")
+        if full_text.startswith(short_text):
+            category_terms[category].update(short_terms, analyze(full_text[len(short_text):]))
+        else:
+            category_terms[category].update(analyze(full_text))
+        category_sizes[category] += 1
+        row = Counter(local_ids.setdefault(term, len(local_ids)) for term in short_terms)
+        indices.extend(row.keys())
+        data.extend(row.values())
+        indptr.append(len(indices))
+    counts = sparse.csr_matrix(
+        (np.array(data, dtype=np.int64), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+        shape=(len(services_data), len(local_ids)),
+    )
+    return VocabularyShard(dict(category_terms), category_sizes, list(local_ids), counts)
 
-def simple_word_tokenize(text):
-    return re.findall(r'\b\w+\b', text)
+def build_vocabulary_matrix(services_data: Iterable[ScrapedServiceData], workers: Optional[int] = PREPROCESS_WORKERS,
+                            chunk_size: int = PREPROCESS_CHUNK_SIZE,
+                            lemmatizer: Optional[Callable[[str], Optional[str]]] = None) -> Tuple[TfidfVectorizer, sparse.csr_matrix]:
+    """
+    Vocabulary mode in parallel: `workers` processes enrich and tokenize chunks of
+    `chunk_size` scraped services (`build_vocabulary_shard`). The category token sets
+    of the shards are merged to fit the vectorizer, then the shards' partial counts are
+    moved to the fitted vocabulary and weighed, in order. Returns the fitted vectorizer
+    and the TF-IDF matrix of the short_texts, the same as fitting the vectorizer on the
+    category-level texts followed by `vectorizer.transform` (bit for bit), with every text tokenized once.
 
-def norm(text: str) -> str:
+    With a `lemmatizer` (see `lemmas.camel_lemmatizer`), it is run once on every
+    distinct token, and the terms are the lemmas: the vectorizer tokenizes with the
+    resulting `LemmaTable`, and the counts of the forms of a lemma are added up.
     """
-    Normalizes Arabic text by:
-    1. Converting أ/إ/آ to ا [[3]]
-    2. Normalizing ي to ى where appropriate [[3]]
-    3. Handling common Unicode character variations [[9]]
-    4. Removing diacritics (optional, requires separate function)
+    category_terms = defaultdict(set)
+    category_sizes = Counter()
+    partial_counts = []
+    for shard in map_chunks(build_vocabulary_shard, services_data, workers, chunk_size):
+        for category, terms in shard.category_terms.items():
+            category_terms[category] |= terms
+        category_sizes.update(shard.category_sizes)
+        partial_counts.append((shard.terms, shard.counts))
+    if not partial_counts:
+        raise ValueError("no services to vectorize")
+
+    # Every token -> its term (its lemma), or None for the stop words the vectorizer would remove
+    stop_words = make_vectorizer().get_stop_words()
+    tokens = sorted(set().union(*category_terms.values()))
+    lemmas = None
+    if lemmatizer is not None:
+        lemmas = LemmaTable.build(tokens, lemmatizer, stop_words)
+        print(f"Lemmatized {len(lemmas):,} words into {len(lemmas.lemmas):,} lemmas")
+    token_terms = dict(zip(tokens, lemmas.lemmatize(tokens) if lemmas is not None else tokens))
+    token_terms = {token: (term if term not in stop_words else None) for token, term in token_terms.items()}
+    category_terms = {category: {token_terms[token] for token in terms} - {None} for category, terms in category_terms.items()}
+    vectorizer = _fit_category_terms(category_terms, category_sizes, lemmas)
+
+    # The short_text terms are a subset of the full_text terms, so all are in the vocabulary
+    vocabulary = vectorizer.vocabulary_
+    rows = []
+    for terms, counts in partial_counts:
+        columns = np.array([vocabulary.get(token_terms[term], -1) for term in terms], dtype=np.int64)
+        counts = counts.tocoo()
+        kept = columns[counts.col] >= 0
+        # Duplicate columns (forms of the same lemma) are summed; same column order as `CountVectorizer.transform`
+        counts = sparse.csr_matrix((counts.data[kept], (counts.row[kept], columns[counts.col[kept]])),
+                                   shape=(counts.shape[0], len(vocabulary)))
+        counts.sum_duplicates()
+        rows.append(counts)
+    # Same weighing as `TfidfTransformer.transform` (no sublinear tf, L2 norm)
+    matrix = sparse.vstack(rows, format="csr").astype(np.float64)
+    matrix.data *= vectorizer.idf_[matrix.indices]
+    return vectorizer, normalize(matrix, norm="l2", copy=False)
+
+def iter_matrix_keyword_chunks(
+    services_data: Iterable[EnrichedServiceData], feature_names: np.ndarray, services_matrix, top_n: int = 4,
+    chunk_size: int = PREPROCESS_CHUNK_SIZE,
+) -> Iterator[List[EnrichedServiceData]]:
+    """
+    Sets the 'keywords' of the services (in matrix row order) from their rows of an
+    already built TF-IDF matrix, `chunk_size` services at a time.
     """
-    # Step 1: Basic Unicode normalization
-    
-    normalized_text = normalize_unicode(text)
-    normalized_text = dediac_ar(normalized_text)
-    
-    # Step 2: Apply specific character normalizations
-    normalized_text = normalize_alef_ar(normalized_text)    # Convert إأآ to ا
-    normalized_text = normalize_alef_maksura_ar(normalized_text)  # Normalize ي/ى
-    normalized_text = normalize_teh_marbuta_ar(normalized_text)   # Normalize ة to ه
-    
-    return normalized_text
+    services = iter(services_data)
+    start = 0
+    for chunk in iter(lambda: list(islice(services, chunk_size)), []):
+        rows = services_matrix[start:start + len(chunk)]
+        start += len(chunk)
+        for service, keywords in zip(chunk, top_keywords(rows, feature_names, top_n)):
+            service["keywords"] = keywords
+        yield chunk
 
-def preprocess_text(text: str) -> List[str]:
+def build_hashed_matrix(services_data: Iterable[EnrichedServiceData], vectorizer: HashingTfidf,
+                        workers: Optional[int] = PREPROCESS_WORKERS, chunk_size: int = PREPROCESS_CHUNK_SIZE):
     """
-    - Remove punctuation
-    - Tokenize (CamelTools)
-    - Remove stopwords
-    - Normalize each token
+    Hashing mode: builds one `HashedShard` per chunk of `chunk_size` services in
+    `workers` processes (see `map_chunks`), merges them in order and returns the
+    TF-IDF matrix; the vectorizer gets its IDF weights.
     """
-    text = re.sub(r'[^\w\s]', '', text)
-    tokens = simple_word_tokenize(text)
-    return [norm(token) for token in tokens if len(token) > 1]
+    return vectorizer.fit_shards(map_chunks(vectorizer.build_shard, services_data, workers, chunk_size))
 
-def category_level_full_texts(services_data: List[EnrichedServiceData]) -> List[str]:
+def map_chunks(function: Callable[[list], object], items: Iterable, workers: Optional[int] = PREPROCESS_WORKERS,
+               chunk_size: int = PREPROCESS_CHUNK_SIZE) -> Iterator:
     """
-    Groups services by category and returns, for each service, the concatenated full_texts of its category.
+    Yields `function` of every chunk of `chunk_size` items, in order, computed by
+    `workers` processes (None: one per CPU; 0 or 1: in this process). At most two
+    chunks per worker are in flight, so the items are still streamed.
     """
-    # Group full_texts by category
-    category_to_texts = defaultdict(list)
-    for service in services_data:
-        category = service.get("category", "")
-        category_to_texts[category].append(service["full_text"])
-    # Create a mapping: category -> concatenated full_text
-    category_to_bigtext = {cat: " ".join(texts) for cat, texts in category_to_texts.items()}
-    # For each service, assign the bigtext of its category
-    category_full_texts = [category_to_bigtext[service.get("category", "")] for service in services_data]
-    return category_full_texts
+    items = iter(items)
+    chunks = iter(lambda: list(islice(items, chunk_size)), [])
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        yield from map(function, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from _ordered_map(pool, function, chunks, window=2 * workers)
 
-def enrich_services_with_texts(services_data: List[ScrapedServiceData]) -> List[EnrichedServiceData]:
+def _ordered_map(pool: ProcessPoolExecutor, function, items: Iterable, window: int) -> Iterator:
+    # Like pool.map, but submits the items lazily, at most `window` ahead of the results
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def iter_hashed_keyword_chunks(
+    services_data: Iterable[EnrichedServiceData], vectorizer: HashingTfidf, services_matrix, top_n: int = 4,
+    chunk_size: int = PREPROCESS_CHUNK_SIZE,
+) -> Iterator[List[EnrichedServiceData]]:
     """
-    For each service, add normalized 'full_text' and 'short_text' fields.
+    Hashing mode: sets the 'keywords' of the services (in matrix row order) from their
+    rows of the hashed TF-IDF matrix, `chunk_size` services at a time. There are no
+    feature names, so every top feature is mapped back to the short_text token it came from.
     """
-    for service in services_data:
-        # Get each relevant field, defaulting to empty string if missing
-        category = service.get("category", "")
-        name = service.get("service_name", "")
-        desc = service.get("description", "")
-        # Join terms list into a single string
-        terms = " ".join(service.get("terms", []))
-        documents = " ".join(service.get("terms", []))
-        # Concatenate all fields for full_text
-        full_text = f"{category} {name} {desc} {terms} {documents}"
-        service["full_text"] = norm(full_text)
-        # Concatenate description, name, and category for short_text
-        service["short_text"] = norm(f"{category} {name} {desc}")
-    return services_data
+    ids = np.arange(vectorizer.n_features)
+    services = iter(services_data)
+    start = 0
+    while True:
+        chunk = list(islice(services, chunk_size))
+        if not chunk:
+            return
+        rows = services_matrix[start:start + len(chunk)]
+        start += len(chunk)
+        for service, keyword_ids in zip(chunk, top_keywords(rows, ids, top_n)):
+            tokens = vectorizer.analyze(service["short_text"])
+            token_of = {}
+            for token, feature in zip(tokens, feature_ids(tokens, vectorizer.n_features).tolist()):
+                token_of.setdefault(feature, token)
+            service["keywords"] = [token_of[feature] for feature in keyword_ids]
+        yield chunk
 
-def extract_keywords(
-    services_data: List[EnrichedServiceData], top_n: int = 4
-) -> tuple[list[EnrichedServiceData], TfidfVectorizer, np.ndarray]:
+def save_artifacts(vectorizer, services_matrix, save_vectorizer: bool = True):
     """
-    - Train TF-IDF on all full_texts (preprocessed).
-    - For each service, extract top N keywords from its short_text.
-    - Save keywords in service['keywords'].
+    Writes every preprocessing output from the enriched services file (already written,
+    one row of `services_matrix` per record): the deployment file, the pickled vectorizer
+    and matrix, and a new version of the compact serving artifacts in MODEL_DIR.
+    Records are streamed from the file, never all loaded.
+
+    `vectorizer` is the fitted `TfidfVectorizer`, or the `HashingTfidf` in hashing mode
+    (not pickled: the model directory holds all of its state).
     """
-    normalized_stopwords = [norm(word) for word in STOPWORDS.keys()]
+    import pickle
+    from config import ENRICHED_SERVICES_FILE, VECTORIZER_FILE, SERVICES_MATRIX_FILE, DEPLOYMENT_SERVICES_FILE, MODEL_DIR, MODEL_KEEP_VERSIONS
 
-    # Fit vectorizer on all full_texts (list of strings)
-    category_full_texts = category_level_full_texts(services_data)
-    vectorizer = TfidfVectorizer(stop_words=normalized_stopwords, tokenizer=preprocess_text, token_pattern=None)
-    vectorizer.fit(category_full_texts)
-    feature_names = vectorizer.get_feature_names_out()
+    hashing = isinstance(vectorizer, HashingTfidf)
+    # Save vectorizer and matrix
+    if save_vectorizer and not hashing:
+        with open(VECTORIZER_FILE, "wb") as f:
+            pickle.dump(vectorizer, f)
+    with open(SERVICES_MATRIX_FILE, "wb") as f:
+        pickle.dump(services_matrix, f)
 
-    # Transform all short_texts (list of strings)
-    short_texts = [service["short_text"] for service in services_data]
-    services_matrix = vectorizer.transform(short_texts)  # shape: (n_services, n_features)
+    print("Saving deployment service data and compact serving artifacts...")
+    # Pickle-free copies of the above that the chatbot memory-maps at serving time,
+    # written as a new version and published once complete (running servers pick it up)
+    version_dir = new_version(MODEL_DIR)
+    retrieval_index = RetrievalIndex.from_matrix(services_matrix)
+    retrieval_index.save(version_dir)
+    if hashing:
+        vectorizer.save(version_dir)
+        keyword_feature_ids = lambda keywords: np.unique(feature_ids(keywords, vectorizer.n_features))
+    else:
+        save_vocabulary(version_dir, vectorizer)
+        terms = vectorizer.get_feature_names_out().astype(str)
+        keyword_feature_ids = lambda keywords: vocabulary_feature_ids(terms, keywords)
+        if isinstance(vectorizer.tokenizer, LemmaTable):
+            # The query encoder lemmatizes with the same table
+            vectorizer.tokenizer.save(version_dir)
+        if FUZZY_MAX_DISTANCE > 0:
+            # Spelling correction of the query words the vocabulary does not know
+            FuzzyIndex.build(terms, vectorizer.idf_, vectorizer.get_stop_words() or (), FUZZY_MAX_DISTANCE).save(version_dir)
+        if LSA_COMPONENTS > 0:
+            # Dense int8 service vectors for the "lsa" retrieval backend
+            LsaIndex.build(retrieval_index, LSA_COMPONENTS).save(version_dir)
 
-    for idx, service in enumerate(services_data):
-        scores = services_matrix[idx].toarray().flatten()
-        top_indices = np.argsort(scores)[-top_n:][::-1]
-        keywords = [feature_names[i] for i in top_indices if scores[i] > 0]
-        service["keywords"] = keywords
+    categories, keyword_ids = [], []
+    with RecordWriter(DEPLOYMENT_SERVICES_FILE) as deployment:
+        def deployment_records():
+            # full_text/short_text are only needed for fitting, not for answering
+            for service in iter_records(ENRICHED_SERVICES_FILE):
+                record = {key: value for key, value in service.items() if key not in ("full_text", "short_text")}
+                deployment.write(record)
+                categories.append(record.get("category", ""))
+                keyword_ids.append(keyword_feature_ids(record.get("keywords", [])))
+                yield record
+        save_services(version_dir, deployment_records())
+    if len(categories) != retrieval_index.n_services:
+        raise ValueError(f"{ENRICHED_SERVICES_FILE.name} has {len(categories)} services, the matrix {retrieval_index.n_services} rows")
 
-    return services_data, vectorizer, services_matrix
+    # Category centroids and keyword ids for re-ranking
+    CategoryIndex.build(retrieval_index, categories, keyword_ids).save(version_dir)
+    publish_version(version_dir, keep=MODEL_KEEP_VERSIONS)
+    print(f"Published serving artifacts version {version_dir.name}")
 
-def preprocess():
-    import json
-    import pickle
-    from config import SCRAPED_SERVICES_FILE, ENRICHED_SERVICES_FILE, VECTORIZER_FILE, SERVICES_MATRIX_FILE, DEPLOYMENT_SERVICES_FILE
+def preprocess(incremental: bool = False):
+    """
+    Streams the scraped services from disk three times (hashing; tokenizing, fitting and
+    vectorizing in `PREPROCESS_WORKERS` processes; keywords) instead of loading them, so
+    only the TF-IDF matrix and a few small per-service values (hash, category, keywords)
+    grow with the corpus.
+    """
+    from config import SCRAPED_SERVICES_FILE, ENRICHED_SERVICES_FILE, VECTORIZER_MODE
+    from .incremental import compute_service_hashes, save_preprocess_state, preprocess_incremental
 
-    print("Loading services data...")
-    # Load services data
-    with open(SCRAPED_SERVICES_FILE, "r", encoding="utf-8") as f:
-        services_data = json.load(f)
+    # Incremental mode only re-vectorizes changed services; it falls back to the
+    # full run below when there is no previous state or the vocabulary drifted too much.
+    if incremental and preprocess_incremental():
+        return
 
-    # Enrich and extract keywords
-    print("Enriching services with normalized full_text and short_text fields...")
-    enriched_services = enrich_services_with_texts(services_data)
-    
-    print("Extracting keywords using TF-IDF...")
-    enriched_services, vectorizer, services_matrix = extract_keywords(enriched_services, top_n=4)
+    print("Hashing services data...")
+    # Hash the scraped records as they are on disk, before enrichment
+    service_hashes = compute_service_hashes(iter_records(SCRAPED_SERVICES_FILE))
 
-    print("Saving enriched services data...")
-    # Save enriched services data
-    with open(ENRICHED_SERVICES_FILE, "w", encoding="utf-8") as f:
-        json.dump(enriched_services, f, ensure_ascii=False, indent=2)
+    # Enrichment is cheap and deterministic, so each pass enriches the records again as it reads them
+    if VECTORIZER_MODE == HASHING_MODE:
+        print("Building the hashed TF-IDF index from shards of services...")
+        vectorizer = make_hashing_vectorizer()
+        services_matrix = build_hashed_matrix(iter_enriched_services(iter_records(SCRAPED_SERVICES_FILE)), vectorizer)
 
-    print("Saving deployment service data (original scraped data + keywords)...")
-    # add the extracted keywords from the enriched data to the original data.
-    for orig, enriched in zip(services_data, enriched_services):
-        orig["keywords"] = enriched.get("keywords", [])
+        print("Extracting keywords and saving enriched services data...")
+        chunks = iter_hashed_keyword_chunks(iter_enriched_services(iter_records(SCRAPED_SERVICES_FILE)), vectorizer, services_matrix, top_n=4)
+        write_records(ENRICHED_SERVICES_FILE, chain.from_iterable(chunks))
+    else:
+        lemmatizer = camel_lemmatizer() if LEMMATIZE else None
+        if LEMMATIZE and lemmatizer is None:
+            print("camel-tools or its morphology data is not installed, words are not lemmatized")
+        print("Tokenizing services and fitting TF-IDF on the category-level full_text...")
+        vectorizer, services_matrix = build_vocabulary_matrix(iter_records(SCRAPED_SERVICES_FILE), lemmatizer=lemmatizer)
 
-    with open(DEPLOYMENT_SERVICES_FILE, "w", encoding="utf-8") as f:
-        json.dump(services_data, f, ensure_ascii=False, indent=2)
+        print("Extracting keywords and saving enriched services data...")
+        chunks = iter_matrix_keyword_chunks(iter_enriched_services(iter_records(SCRAPED_SERVICES_FILE)),
+                                            vectorizer.get_feature_names_out(), services_matrix, top_n=4)
+        write_records(ENRICHED_SERVICES_FILE, chain.from_iterable(chunks))
 
-    # Save vectorizer and matrix
-    with open(VECTORIZER_FILE, "wb") as f:
-        pickle.dump(vectorizer, f)
-    with open(SERVICES_MATRIX_FILE, "wb") as f:
-        pickle.dump(services_matrix, f)
+    save_artifacts(vectorizer, services_matrix)
+    save_preprocess_state(service_hashes, VECTORIZER_MODE, services_matrix.shape[1])
 
     print("Preprocessing and saving completed.")
 
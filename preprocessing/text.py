@@ -0,0 +1,98 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List
+
+# ============================= removing camel-tool from production code for it's big dependancy =======================
+
+# Code point ranges of the Arabic diacritics removed by `dediac_ar`
+ARABIC_DIACRITIC_RANGES = ((0x0610, 0x061A), (0x064B, 0x065F), (0x06D6, 0x06DC), (0x06DF, 0x06E8), (0x06EA, 0x06ED))
+
+ARABIC_DIACRITICS_RE = re.compile(
+    "[" + "".join(f"{chr(start)}-{chr(end)}" for start, end in ARABIC_DIACRITIC_RANGES) + "]"
+)
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+WORD_RE = re.compile(r'\b\w+\b')
+
+def dediac_ar(text: str) -> str:
+    """
+    Removes Arabic diacritics from the text.
+    """
+    return ARABIC_DIACRITICS_RE.sub('', text)
+
+def normalize_unicode(text: str) -> str:
+    """
+    Normalizes common Unicode variations (basic NFC normalization).
+    """
+    return unicodedata.normalize('NFC', text)
+
+def normalize_alef_ar(text: str) -> str:
+    """
+    Converts أ, إ, and آ to ا.
+    """
+    return re.sub(r'[إأآ]', 'ا', text)
+
+def normalize_alef_maksura_ar(text: str) -> str:
+    """
+    Converts ى to ي.
+    """
+    return text.replace('ى', 'ي')
+
+def normalize_teh_marbuta_ar(text: str) -> str:
+    """
+    Converts ة to ه.
+    """
+    return text.replace('ة', 'ه')
+
+def simple_word_tokenize(text):
+    return WORD_RE.findall(text)
+
+def _build_norm_table() -> dict:
+    """
+    One `str.translate` table doing what `dediac_ar`, `normalize_alef_ar`,
+    `normalize_alef_maksura_ar` and `normalize_teh_marbuta_ar` do one after another.
+    They all map single characters and none of them produces a character another
+    one changes, so applying them in one pass gives the same result.
+    """
+    table = {}
+    for start, end in ARABIC_DIACRITIC_RANGES:
+        for code_point in range(start, end + 1):
+            table[code_point] = None
+    table.update({ord('إ'): 'ا', ord('أ'): 'ا', ord('آ'): 'ا', ord('ى'): 'ي', ord('ة'): 'ه'})
+    return table
+
+NORM_TABLE = _build_norm_table()
+
+# Strings up to this length (i.e. tokens, short queries) are memoized
+NORM_CACHE_MAX_LEN = 32
+
+def _norm(text: str) -> str:
+    # NFC has to run first: it can compose a letter and a mark into a new letter (e.g. و + ٔ -> ؤ)
+    return unicodedata.normalize('NFC', text).translate(NORM_TABLE)
+
+_norm_cached = lru_cache(maxsize=100_000)(_norm)
+
+def norm(text: str) -> str:
+    """
+    Normalizes Arabic text by:
+    1. Basic Unicode (NFC) normalization
+    2. Removing diacritics
+    3. Converting أ/إ/آ to ا
+    4. Converting ى to ي
+    5. Converting ة to ه
+    Steps 2-5 are a single `str.translate` pass; results for short strings are cached.
+    """
+    if len(text) <= NORM_CACHE_MAX_LEN:
+        return _norm_cached(text)
+    return _norm(text)
+
+def preprocess_text(text: str) -> List[str]:
+    """
+    - Remove punctuation
+    - Tokenize (CamelTools)
+    - Remove stopwords
+    - Normalize each token
+    """
+    text = PUNCTUATION_RE.sub('', text)
+    tokens = simple_word_tokenize(text)
+    return [norm(token) for token in tokens if len(token) > 1]
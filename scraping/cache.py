@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from config import SCRAPE_CACHE_FILE
+
+
+class ScrapeCache:
+    """
+    On-disk cache of scraped service pages, keyed by URL.
+
+    For every page it keeps the HTTP validators (ETag / Last-Modified), a hash of the
+    body and the parsed ScrapedServiceData. A re-scrape sends conditional requests and
+    reuses the parsed data when the server answers 304 Not Modified, or when it sends
+    the page again but the body is byte-for-byte the same.
+
+    Safe to share between scraping threads, and `save()` can be called while they run.
+    """
+
+    def __init__(self, path: Path = SCRAPE_CACHE_FILE):
+        self.path = Path(path)
+        self.entries: Dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        self._lock = threading.Lock()
+        self.fetched = 0
+        self.not_modified = 0
+        self.unchanged = 0
+
+    @staticmethod
+    def body_hash(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        entry = self.entries.get(url)
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def reuse(self, url: str, category: str, body_hash: Optional[str] = None) -> Optional[dict]:
+        """
+        Returns the cached parsed data for `url` (re-labelled with `category`, since the
+        same page can be listed in several categories). With `body_hash`, only if the
+        cached page had exactly that body. Returns None on a miss.
+        """
+        entry = self.entries.get(url)
+        if not entry or (body_hash is not None and entry.get("body_hash") != body_hash):
+            return None
+        with self._lock:
+            if body_hash is None:
+                self.not_modified += 1
+            else:
+                self.unchanged += 1
+        return {**entry["data"], "category": category}
+
+    def store(self, url: str, validators: dict, data: dict):
+        with self._lock:
+            self.fetched += 1
+            self.entries[url] = {**validators, "data": data}
+
+    def report(self) -> str:
+        reused = self.not_modified + self.unchanged
+        return (f"{self.fetched} pages fetched and parsed, {reused} reused from cache "
+                f"({self.not_modified} not modified, {self.unchanged} with an unchanged body)")
+
+    def save(self):
+        # Write to a temporary file first so an interrupted save never corrupts the cache
+        tmp_path = self.path.with_suffix(".tmp")
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
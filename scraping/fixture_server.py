@@ -0,0 +1,180 @@
+"""
+Local stand-in for the Digital Egypt portal, for exercising the scrapers offline.
+
+Service pages are saved HTML files in a fixtures directory (`save_fixtures` renders
+them from scraped records using the portal's markup), served by a threaded local HTTP
+server that can add latency and fail a share of requests to exercise retries.
+`save_category_fixtures` adds the category listing the URL discovery clicks through.
+
+    with FixtureServer(fixtures_dir, latency=0.05) as server:
+        url = server.url("services/0.html")
+"""
+import html
+import json
+import random
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+from scraping.scraper import ScrapedServiceData
+
+
+def render_service_page(service: ScrapedServiceData) -> str:
+    """
+    Renders a scraped record back into the page structure `parse_service_page` reads.
+    """
+    def paragraphs(items: List[str]) -> str:
+        return "".join(f"<p>- {html.escape(item)}</p>" for item in items) or "<p>لا يوجد</p>"
+
+    def accordion(heading: str, body: str) -> str:
+        return (
+            '<div class="MuiPaper-root MuiAccordion-root">'
+            f'<div class="MuiAccordionSummary-root"><div class="MuiAccordionSummary-content"><h2>{html.escape(heading)}</h2></div></div>'
+            f'<div class="MuiCollapse-root"><div class="MuiAccordionDetails-root">{body}</div></div>'
+            '</div>'
+        )
+
+    description = "".join(f"<p>{html.escape(line)}</p>" for line in service.get("description", "").split("\n"))
+    related = "".join(
+        f'<a href="{html.escape(item["link"])}">{html.escape(item["text"])}</a>'
+        for item in service.get("related_servises", [])
+    )
+    return (
+        '<!DOCTYPE html><html lang="ar" dir="rtl"><head><meta charset="utf-8"></head><body>'
+        f'<div class="MuiContainer-root MuiContainer-maxWidthLg css-1qsxih2"><h1>{html.escape(service.get("service_name", ""))}</h1></div>'
+        + accordion("وصف الخدمة", description)
+        + accordion("شروط و أحكام الخدمة", paragraphs(service.get("terms", [])))
+        + accordion("المستندات المطلوبة", paragraphs(service.get("Documents", [])))
+        + accordion("خدمات مشابهة", related)
+        + "</body></html>"
+    )
+
+def save_fixtures(services_data: List[ScrapedServiceData], directory: Path) -> Dict[str, List[dict]]:
+    """
+    Writes one HTML page per service under `directory/services/` and returns the
+    matching services-by-category mapping, with paths relative to the server root.
+    """
+    directory = Path(directory)
+    (directory / "services").mkdir(parents=True, exist_ok=True)
+    services_by_category: Dict[str, List[dict]] = {}
+    for i, service in enumerate(services_data):
+        path = f"services/{i}.html"
+        (directory / path).write_text(render_service_page(service), encoding="utf-8")
+        services_by_category.setdefault(service["category"], []).append({"title": service["service_name"], "url": path})
+    with open(directory / "services_by_category.json", "w", encoding="utf-8") as f:
+        json.dump(services_by_category, f, ensure_ascii=False)
+    return services_by_category
+
+def save_category_fixtures(services_by_category: Dict[str, List[dict]], directory: Path, delay_ms: int = 300):
+    """
+    Writes the category listing in two flavours:
+
+    - `categories/index.html`: like the portal, buttons and links are rendered by
+      JavaScript; a click shows the category's links after `delay_ms`.
+    - `categories/static/index.html` + `categories/static/<id>.html`: the same listing
+      as plain HTML, one page per category, for the browserless path.
+    """
+    directory = Path(directory)
+    (directory / "categories" / "static").mkdir(parents=True, exist_ok=True)
+    categories = list(services_by_category.items())
+
+    def button(i: int, name: str) -> str:
+        return f'<button id="mainCategoryBtn-{i}">{html.escape(name)}</button>'
+
+    def link(j: int, service: dict) -> str:
+        return f'<a id="categoryLink-{j}" href="{html.escape(service["url"])}"><h2>{html.escape(service["title"])}</h2></a>'
+
+    script = """
+const categories = %s;
+const delay = %d;
+const buttons = document.getElementById("buttons");
+const links = document.getElementById("links");
+setTimeout(() => categories.forEach(([name, services], i) => {
+    const btn = document.createElement("button");
+    btn.id = "mainCategoryBtn-" + i;
+    btn.textContent = name;
+    btn.onclick = () => {
+        links.innerHTML = "";
+        setTimeout(() => services.forEach((service, j) => {
+            const a = document.createElement("a");
+            a.id = "categoryLink-" + j;
+            a.href = service.url;
+            const h2 = document.createElement("h2");
+            h2.textContent = service.title;
+            a.appendChild(h2);
+            links.appendChild(a);
+        }), delay);
+    };
+    buttons.appendChild(btn);
+}), delay);
+""" % (json.dumps(categories, ensure_ascii=False).replace("</", "<\\/"), delay_ms)
+    page = '<!DOCTYPE html><html lang="ar" dir="rtl"><head><meta charset="utf-8"></head><body>{}</body></html>'
+    (directory / "categories" / "index.html").write_text(
+        page.format(f'<div id="buttons"></div><div id="links"></div><script>{script}</script>'), encoding="utf-8")
+
+    (directory / "categories" / "static" / "index.html").write_text(
+        page.format("".join(button(i, name) for i, (name, _) in enumerate(categories))), encoding="utf-8")
+    for i, (_, services) in enumerate(categories):
+        (directory / "categories" / "static" / f"{i}.html").write_text(
+            page.format("".join(link(j, service) for j, service in enumerate(services))), encoding="utf-8")
+
+
+class _FixtureHandler(SimpleHTTPRequestHandler):
+    latency = 0.0
+    failure_rate = 0.0
+    # Like the portal, declare the charset (requests assumes ISO-8859-1 otherwise)
+    extensions_map = {**SimpleHTTPRequestHandler.extensions_map, ".html": "text/html; charset=utf-8"}
+
+    def do_GET(self):
+        with self.server.count_lock:
+            self.server.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            self.send_error(503, "Injected failure")
+            return
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """
+    Serves a fixtures directory on a free local port in a background thread.
+
+    Args:
+        directory: Root directory to serve.
+        latency: Seconds added to every response (simulates the network round trip).
+        failure_rate: Share of requests answered with a 503 (exercises retries).
+    """
+
+    def __init__(self, directory: Path, latency: float = 0.0, failure_rate: float = 0.0):
+        handler = type("Handler", (_FixtureHandler,), {"latency": latency, "failure_rate": failure_rate})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(directory)))
+        self.httpd.request_count = 0
+        self.httpd.count_lock = threading.Lock()
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def request_count(self) -> int:
+        return self.httpd.request_count
+
+    def url(self, path: str) -> str:
+        return self.base_url + path.lstrip("/")
+
+    def __enter__(self) -> "FixtureServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -1,59 +1,158 @@
+import asyncio
 import json
-from playwright.sync_api import sync_playwright
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from urllib.parse import urljoin
-from collections import defaultdict
-from config import SCRAPED_URLS_FILE
-
-def scrape_all_categories():
-    base_url = "https://digital.gov.eg/categories/"
-    grouped_data = defaultdict(list)
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.goto(base_url)
-
-        # Wait for all category buttons
-        page.wait_for_selector('button[id^="mainCategoryBtn-22"]')
-        category_buttons = page.query_selector_all('button[id^="mainCategoryBtn-"]')
-
-        for i, btn in enumerate(category_buttons):
-            category_name = btn.inner_text()
-
-            # Click the category button
-            btn.click()
-            page.wait_for_timeout(1000)
-
-            links = page.query_selector_all('a[id^="categoryLink-"]')
-            if not links:
-                print(f"No active services in category: {i}")
-                continue
-            print(f"category {i} num links: {len(links)}")
-
-
-
-            for link in links:
-                href = link.get_attribute("href")
-                full_url = urljoin(base_url, href)
-
-                h2 = link.query_selector("h2")
-                title = h2.inner_text() if h2 else ""
-
-                grouped_data[category_name].append({
-                    "title": title,
-                    "url": full_url
-                })
-            
-            print(f"==== category {i} done ====")
-
-
-        browser.close()
+import requests
+from bs4 import BeautifulSoup
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from config import SCRAPED_URLS_FILE, CATEGORY_PAGES, CATEGORY_LINKS_TIMEOUT_MS, CATEGORY_LISTING_URL
+from scraping.scraper import make_session
+
+BASE_URL = "https://digital.gov.eg/categories/"
+CATEGORY_BUTTONS = 'button[id^="mainCategoryBtn-"]'
+CATEGORY_LINKS = 'a[id^="categoryLink-"]'
+
+# hrefs of the category links currently shown
+LINK_HREFS_JS = "() => Array.from(document.querySelectorAll('a[id^=\"categoryLink-\"]'), a => a.getAttribute('href'))"
+# True once the shown links are not the ones that were there before the click
+LINKS_CHANGED_JS = """(before) => {
+    const hrefs = Array.from(document.querySelectorAll('a[id^="categoryLink-"]'), a => a.getAttribute('href'));
+    return hrefs.length > 0 && JSON.stringify(hrefs) !== JSON.stringify(before);
+}"""
+# title/href of every category link in one round trip
+READ_LINKS_JS = """links => links.map(a => {
+    const h2 = a.querySelector('h2');
+    return {href: a.getAttribute('href'), title: h2 ? h2.innerText : ''};
+})"""
+
+async def _open_listing(context, base_url: str):
+    page = await context.new_page()
+    await page.goto(base_url)
+    # Wait for all category buttons
+    await page.wait_for_selector(CATEGORY_BUTTONS)
+    await page.wait_for_load_state("networkidle")
+    return page
+
+async def _scrape_categories_on_page(page, base_url: str, indices: List[int], timeout_ms: int) -> Dict[int, Tuple[str, List[dict]]]:
+    """
+    Clicks the given category buttons one after another on one page and reads the
+    links each one shows. Instead of sleeping a fixed time after a click, waits until
+    the links on the page are replaced by the new category's links.
+    """
+    results = {}
+    category_buttons = await page.query_selector_all(CATEGORY_BUTTONS)
+    for i in indices:
+        btn = category_buttons[i]
+        category_name = await btn.inner_text()
+
+        before = await page.evaluate(LINK_HREFS_JS)
+        # Click the category button
+        await btn.click()
+        try:
+            await page.wait_for_function(LINKS_CHANGED_JS, arg=before, timeout=timeout_ms)
+        except PlaywrightTimeoutError:
+            # Nothing new showed up: an empty category, or the same links as the previous one
+            pass
+
+        links = await page.eval_on_selector_all(CATEGORY_LINKS, READ_LINKS_JS)
+        results[i] = (category_name, [{"title": link["title"], "url": urljoin(base_url, link["href"])} for link in links if link["href"]])
+    return results
+
+async def discover_categories(base_url: str = BASE_URL, pages: int = CATEGORY_PAGES,
+                              timeout_ms: int = CATEGORY_LINKS_TIMEOUT_MS) -> Dict[str, List[dict]]:
+    """
+    Collects the service links of every category with a headless browser. The
+    categories are spread over `pages` tabs of one browser context that work in parallel.
+    """
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context()
+
+        first_page = await _open_listing(context, base_url)
+        n_categories = len(await first_page.query_selector_all(CATEGORY_BUTTONS))
+        pages = max(1, min(pages, n_categories))
+        other_pages = await asyncio.gather(*(_open_listing(context, base_url) for _ in range(pages - 1)))
+
+        # Page k handles categories k, k + pages, k + 2 * pages, ...
+        per_page = await asyncio.gather(*(
+            _scrape_categories_on_page(page, base_url, list(range(k, n_categories, pages)), timeout_ms)
+            for k, page in enumerate([first_page, *other_pages])
+        ))
+        await browser.close()
+
+    results = {}
+    for page_results in per_page:
+        results.update(page_results)
+    return _group_by_category(results[i] for i in range(n_categories))
+
+def discover_categories_http(base_url: str = BASE_URL, listing_url: Optional[str] = CATEGORY_LISTING_URL,
+                             max_workers: int = 8) -> Optional[Dict[str, List[dict]]]:
+    """
+    Fast path without a browser, for when the category listing is served as plain HTML:
+    reads the category buttons from `base_url`, then downloads every category's listing
+    page (`listing_url` formatted with the button id suffix) in parallel.
+
+    Returns None if the pages need JavaScript (no buttons or no links in the HTML).
+    """
+    session = make_session(pool_size=max_workers)
+    try:
+        response = session.get(base_url, timeout=30)
+        response.raise_for_status()
+        soup = BeautifulSoup(response.text, "html.parser")
+        buttons = [(btn["id"].split("mainCategoryBtn-", 1)[1], btn.get_text(strip=True)) for btn in soup.select(CATEGORY_BUTTONS)]
+        if not buttons:
+            return None
+
+        def fetch_links(category_id: str) -> List[dict]:
+            url = urljoin(base_url, listing_url.format(id=category_id))
+            page = session.get(url, timeout=30)
+            page.raise_for_status()
+            links = BeautifulSoup(page.text, "html.parser").select(CATEGORY_LINKS)
+            return [
+                {"title": link.h2.get_text() if link.h2 else "", "url": urljoin(base_url, link["href"])}
+                for link in links if link.get("href")
+            ]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            all_links = list(pool.map(fetch_links, [category_id for category_id, _ in buttons]))
+    except requests.exceptions.RequestException as e:
+        print(f"Plain HTTP category listing not available ({e})", file=sys.stderr)
+        return None
+    finally:
+        session.close()
+
+    if not any(all_links):
+        return None
+    return _group_by_category((name, links) for (_, name), links in zip(buttons, all_links))
+
+def _group_by_category(categories) -> Dict[str, List[dict]]:
+    grouped_data: Dict[str, List[dict]] = {}
+    for i, (category_name, links) in enumerate(categories):
+        if not links:
+            print(f"No active services in category: {i}")
+            continue
+        print(f"category {i} num links: {len(links)}")
+        grouped_data.setdefault(category_name, []).extend(links)
+    return grouped_data
+
+def scrape_all_categories(base_url: str = BASE_URL, pages: int = CATEGORY_PAGES, listing_url: Optional[str] = CATEGORY_LISTING_URL,
+                          output_file=SCRAPED_URLS_FILE) -> Dict[str, List[dict]]:
+    grouped_data = None
+    if listing_url:
+        grouped_data = discover_categories_http(base_url, listing_url)
+        if grouped_data is None:
+            print("Falling back to the browser for category discovery.")
+    if grouped_data is None:
+        grouped_data = asyncio.run(discover_categories(base_url, pages=pages))
 
     # Save to JSON file
-    with open(SCRAPED_URLS_FILE, "w", encoding="utf-8") as f:
+    with open(output_file, "w", encoding="utf-8") as f:
         json.dump(grouped_data, f, ensure_ascii=False, indent=4)
 
     print("✅ Data saved to services_by_category.json")
+    return grouped_data
 
 # Run it
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+"""
+NDJSON record files: one compact JSON object per line.
+
+Used for the scraped, enriched and deployment service data, so they can be written
+one record at a time as they are produced and read back one record at a time,
+without ever holding the whole corpus in memory.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, List
+
+
+def iter_records(path: Path) -> Iterator[dict]:
+    """
+    Yields the records of an NDJSON file one at a time. A torn last line (the writer
+    crashed half-way through it) is skipped.
+
+    Files in the former format, a single JSON array, are still read (all at once).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == "[":
+            yield from json.load(f)
+            return
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith("\n"):
+                    raise
+                return
+            yield record
+
+
+def read_records(path: Path) -> List[dict]:
+    return list(iter_records(path))
+
+
+class RecordWriter:
+    """
+    Writes records to an NDJSON file, one line each.
+
+    By default the file is written next to its final path and moved into place when
+    the writer is closed without an error, so readers never see a half-written file.
+    With `append`, records are added to the end of an existing file instead (dropping
+    a torn last line first) and every record is flushed as soon as it is written,
+    which is how an interrupted scrape keeps its progress and resumes.
+    """
+
+    def __init__(self, path: Path, append: bool = False):
+        self.path = Path(path)
+        self.append = append
+        self.count = 0
+        if append:
+            self._target = self.path
+            _drop_torn_line(self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+        else:
+            self._target = self.path.with_name(self.path.name + ".tmp")
+            self._file = open(self._target, "w", encoding="utf-8")
+
+    def write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        if self.append:
+            self._file.flush()
+        self.count += 1
+
+    def close(self, commit: bool = True):
+        if self._file.closed:
+            return
+        self._file.close()
+        if self.append:
+            return
+        if commit:
+            os.replace(self._target, self.path)
+        else:
+            os.remove(self._target)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+
+
+def write_records(path: Path, records: Iterable[dict]) -> int:
+    """
+    Writes the records to an NDJSON file (atomically) and returns how many were written.
+    """
+    with RecordWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.count
+
+
+def _drop_torn_line(path: Path):
+    if not path.exists():
+        return
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        # Walk back to the last newline; everything after it is an incomplete record
+        end = size
+        while end > 0:
+            step = min(4096, end)
+            f.seek(end - step)
+            block = f.read(step)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                end = end - step + newline + 1
+                break
+            end -= step
+        if end != size:
+            f.truncate(end)
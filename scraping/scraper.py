@@ -1,11 +1,22 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import json
+import threading
+import time
 from tqdm import tqdm
 import sys
-from typing import List, Dict, TypedDict, Optional
-from config import SCRAPED_URLS_FILE, SCRAPED_SERVICES_FILE
+from pathlib import Path
+from typing import List, Dict, TypedDict, Optional, NamedTuple, Iterator, Tuple
+from config import (
+    SCRAPED_URLS_FILE, SCRAPED_SERVICES_FILE, SCRAPED_SERVICES_PARTIAL_FILE, SCRAPE_MAX_WORKERS, SCRAPE_PARSE_WORKERS,
+    SCRAPE_REQUESTS_PER_SECOND, SCRAPE_TIMEOUT, SCRAPE_MAX_RETRIES, SCRAPE_BACKOFF_FACTOR, SCRAPE_CACHE_SAVE_EVERY,
+)
+from scraping.cache import ScrapeCache
+from scraping.records import RecordWriter, iter_records
 
 # Define a TypedDict to represent the structure of a related service link
 class RelatedService(TypedDict):
@@ -62,76 +73,176 @@ def extract_list_content(container: Optional[BeautifulSoup]) -> List[str]:
 
     return cleaned_items
 
-def scrape_service_bs4(service_url: str, category: str) -> Optional[ScrapedServiceData]:
+def make_session(pool_size: int = SCRAPE_MAX_WORKERS, max_retries: int = SCRAPE_MAX_RETRIES,
+                 backoff_factor: float = SCRAPE_BACKOFF_FACTOR) -> requests.Session:
+    """
+    Creates one `requests.Session` to share between all fetching threads: keep-alive
+    connections are pooled (up to `pool_size` per host) and failed requests (connection
+    errors, 429 and 5xx responses) are retried with exponential backoff.
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+class RateLimiter:
+    """
+    Spaces out requests to the same host so that at most `requests_per_second` of them
+    start per second, whatever the number of threads. 0 disables the limit.
+    """
+
+    def __init__(self, requests_per_second: float = SCRAPE_REQUESTS_PER_SECOND):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self._next_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def parse_service_page(html: str, service_url: str, category: str) -> ScrapedServiceData:
+    """
+    Extracts the service data from the HTML of a service page.
+
+    Args:
+        html: The page HTML.
+        service_url: The URL the page was fetched from.
+        category: The category the service belongs to (passed from the category scraper).
+
+    Returns:
+        A dictionary conforming to ScrapedServiceData.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Extract the main service name (the large heading)
+    service_name_tag = soup.select_one("div.MuiContainer-root.MuiContainer-maxWidthLg.css-1qsxih2 > h1")
+    service_name = service_name_tag.get_text(strip=True) if service_name_tag else ""
+
+    # Find all accordion sections and map their headings to their content details
+    accordion_sections: Dict[str, BeautifulSoup] = {}
+    for accordion in soup.select('div.MuiAccordion-root'):
+        summary = accordion.select_one('div.MuiAccordionSummary-content h2')
+        details = accordion.select_one('div.MuiAccordionDetails-root')
+        if summary and details:
+            heading_text = summary.get_text(strip=True)
+            accordion_sections[heading_text] = details
+
+    # Extract Description from the corresponding accordion section
+    description_container = accordion_sections.get("وصف الخدمة")
+    description = description_container.get_text("\n", strip=True) if description_container else ""
+
+    # Extract Terms using the helper function
+    terms_container = accordion_sections.get("شروط و أحكام الخدمة")
+    terms = extract_list_content(terms_container)
+
+    # Extract Required Documents using the helper function
+    documents_container = accordion_sections.get("المستندات المطلوبة")
+    documents = extract_list_content(documents_container)
+
+
+    # Extract Related Services from the corresponding accordion section
+    related_services: List[RelatedService] = []
+    related_services_container = accordion_sections.get("خدمات مشابهة")
+    if related_services_container:
+        related_links = related_services_container.select("a")
+        for link in related_links:
+            text = link.get_text(strip=True)
+            href = link.get("href")
+            if href:
+                # Construct the full URL for related services
+                full_link = urljoin("https://digital.gov.eg/", href)
+                related_services.append({
+                    "text": text,
+                    "link": full_link
+                })
+
+    # Return the structured scraped data
+    return ScrapedServiceData(
+        category=category,
+        service_name=service_name,
+        service_url=service_url,
+        description=description,
+        terms=terms,
+        Documents=documents,
+        related_servises=related_services
+    )
+
+class FetchedPage(NamedTuple):
+    html: Optional[str]  # None when the cached data was reused
+    validators: dict  # ETag / Last-Modified / body hash, to cache along with the parsed data
+    cached: Optional[ScrapedServiceData]
+
+def fetch_service_page(service_url: str, category: str, session: Optional[requests.Session] = None,
+                       rate_limiter: Optional[RateLimiter] = None, cache: Optional[ScrapeCache] = None,
+                       timeout: float = SCRAPE_TIMEOUT) -> FetchedPage:
+    """
+    Downloads a service page. With a cache, the request is conditional and the cached
+    parsed data is returned instead of the HTML when the page did not change
+    (HTTP 304, or the same body as last time). Raises on HTTP errors.
+    """
+    if rate_limiter:
+        rate_limiter.wait(service_url)
+    headers = cache.conditional_headers(service_url) if cache else {}
+    response = (session or requests).get(service_url, headers=headers, timeout=timeout)
+    if cache and response.status_code == 304:
+        cached = cache.reuse(service_url, category)
+        if cached is not None:
+            return FetchedPage(None, {}, cached)
+        # Nothing usable cached for a 304: ask again unconditionally
+        response = (session or requests).get(service_url, timeout=timeout)
+    response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
+
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "body_hash": ScrapeCache.body_hash(response.content),
+    }
+    if cache:
+        cached = cache.reuse(service_url, category, body_hash=validators["body_hash"])
+        if cached is not None:
+            return FetchedPage(None, validators, cached)
+    return FetchedPage(response.text, validators, None)
+
+def scrape_service_bs4(service_url: str, category: str, session: Optional[requests.Session] = None,
+                       rate_limiter: Optional[RateLimiter] = None,
+                       cache: Optional[ScrapeCache] = None) -> Optional[ScrapedServiceData]:
     """
     Scrapes a single service page using BeautifulSoup and extracts relevant data.
 
     Args:
         service_url: The URL of the service page to scrape.
         category: The category the service belongs to (passed from the category scraper).
+        session: Optional shared session (connection pooling and retries).
+        rate_limiter: Optional per-host rate limiter.
+        cache: Optional scrape cache (conditional requests, reuse of unchanged pages).
 
     Returns:
         A dictionary conforming to ScrapedServiceData containing the scraped data,
         or None if an error occurred during fetching or parsing.
     """
     try:
-        # Fetch the HTML content of the service page
-        response = requests.get(service_url)
-        response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Extract the main service name (the large heading)
-        service_name_tag = soup.select_one("div.MuiContainer-root.MuiContainer-maxWidthLg.css-1qsxih2 > h1")
-        service_name = service_name_tag.get_text(strip=True) if service_name_tag else ""
-
-        # Find all accordion sections and map their headings to their content details
-        accordion_sections: Dict[str, BeautifulSoup] = {}
-        for accordion in soup.select('div.MuiAccordion-root'):
-            summary = accordion.select_one('div.MuiAccordionSummary-content h2')
-            details = accordion.select_one('div.MuiAccordionDetails-root')
-            if summary and details:
-                heading_text = summary.get_text(strip=True)
-                accordion_sections[heading_text] = details
-
-        # Extract Description from the corresponding accordion section
-        description_container = accordion_sections.get("وصف الخدمة")
-        description = description_container.get_text("\n", strip=True) if description_container else ""
-
-        # Extract Terms using the helper function
-        terms_container = accordion_sections.get("شروط و أحكام الخدمة")
-        terms = extract_list_content(terms_container)
-
-        # Extract Required Documents using the helper function
-        documents_container = accordion_sections.get("المستندات المطلوبة")
-        documents = extract_list_content(documents_container)
-
-
-        # Extract Related Services from the corresponding accordion section
-        related_services: List[RelatedService] = []
-        related_services_container = accordion_sections.get("خدمات مشابهة")
-        if related_services_container:
-            related_links = related_services_container.select("a")
-            for link in related_links:
-                text = link.get_text(strip=True)
-                href = link.get("href")
-                if href:
-                    # Construct the full URL for related services
-                    full_link = urljoin("https://digital.gov.eg/", href)
-                    related_services.append({
-                        "text": text,
-                        "link": full_link
-                    })
-
-        # Return the structured scraped data
-        return ScrapedServiceData(
-            category=category,
-            service_name=service_name,
-            service_url=service_url,
-            description=description,
-            terms=terms,
-            Documents=documents,
-            related_servises=related_services
-        )
+        page = fetch_service_page(service_url, category, session=session, rate_limiter=rate_limiter, cache=cache)
+        if page.cached is not None:
+            return page.cached
+        data = parse_service_page(page.html, service_url, category)
+        if cache:
+            cache.store(service_url, page.validators, data)
+        return data
 
     except requests.exceptions.RequestException as e:
         # Log HTTP errors to standard error
@@ -142,34 +253,158 @@ def scrape_service_bs4(service_url: str, category: str) -> Optional[ScrapedServi
         print(f"❌ Error scraping {service_url}: {e}", file=sys.stderr)
         return None
 
-def scrape_all_services():
+def _parse_or_none(html: str, service_url: str, category: str) -> Optional[ScrapedServiceData]:
+    # Runs in the parsing worker pool
+    try:
+        return parse_service_page(html, service_url, category)
+    except Exception as e:
+        print(f"❌ Error scraping {service_url}: {e}", file=sys.stderr)
+        return None
+
+def scrape_jobs(services_by_category: Dict[str, List[dict]]) -> List[Tuple[str, str]]:
     """
-    Loads service URLs by category, scrapes each service, and saves the results to a JSON file.
+    The (service URL, category) pairs to scrape, in category order, then service order.
+    """
+    return [(service["url"], category) for category, services in services_by_category.items() for service in services]
+
+def iter_scraped_services(jobs: List[Tuple[str, str]], max_workers: int = SCRAPE_MAX_WORKERS,
+                          parse_workers: Optional[int] = SCRAPE_PARSE_WORKERS,
+                          requests_per_second: float = SCRAPE_REQUESTS_PER_SECOND,
+                          max_retries: int = SCRAPE_MAX_RETRIES,
+                          backoff_factor: float = SCRAPE_BACKOFF_FACTOR,
+                          cache: Optional[ScrapeCache] = None) -> Iterator[ScrapedServiceData]:
+    """
+    Scrapes the (service URL, category) jobs concurrently and yields the results in job
+    order, each one as soon as it and every job before it are done; failed services are
+    left out. Only the results that finished ahead of their turn are held in memory.
+
+    Pages are downloaded by `max_workers` threads sharing one pooled session and a
+    per-host rate limit, and parsed by a pool of `parse_workers` processes
+    (None: one per CPU, 0: parse in the downloading threads).
+    With a `cache`, unchanged pages are not parsed again (see `ScrapeCache`).
+    """
+    session = make_session(pool_size=max_workers, max_retries=max_retries, backoff_factor=backoff_factor)
+    rate_limiter = RateLimiter(requests_per_second)
+    parse_pool = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers != 0 else None
+    fetch_pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def fetch_and_parse(service_url: str, category: str):
+        try:
+            page = fetch_service_page(service_url, category, session=session, rate_limiter=rate_limiter, cache=cache)
+            if page.cached is not None:
+                return page.cached
+            if parse_pool is None:
+                data = _parse_or_none(page.html, service_url, category)
+            else:
+                data = parse_pool.submit(_parse_or_none, page.html, service_url, category).result()
+            if data and cache:
+                cache.store(service_url, page.validators, data)
+            return data
+        except requests.exceptions.RequestException as e:
+            print(f"❌ HTTP Error scraping {service_url}: {e}", file=sys.stderr)
+            return None
+        except Exception as e:
+            # Any other failure (e.g. a broken parsing pool) only loses this service
+            print(f"❌ Error scraping {service_url}: {e!r}", file=sys.stderr)
+            return None
+
+    try:
+        with tqdm(total=len(jobs), desc="Scraping Services") as pbar:
+            futures = [fetch_pool.submit(fetch_and_parse, url, category) for url, category in jobs]
+            for future in futures:
+                future.add_done_callback(lambda _: pbar.update(1))
+            for i in range(len(futures)):
+                data = futures[i].result()
+                futures[i] = None  # the record is handed over, don't keep it
+                if data:
+                    yield data
+    finally:
+        # Also reached when the consumer stops early: drop the jobs not started yet
+        fetch_pool.shutdown(cancel_futures=True)
+        session.close()
+        if parse_pool is not None:
+            parse_pool.shutdown()
+
+def scrape_services(services_by_category: Dict[str, List[dict]], max_workers: int = SCRAPE_MAX_WORKERS,
+                    parse_workers: Optional[int] = SCRAPE_PARSE_WORKERS,
+                    requests_per_second: float = SCRAPE_REQUESTS_PER_SECOND,
+                    max_retries: int = SCRAPE_MAX_RETRIES,
+                    backoff_factor: float = SCRAPE_BACKOFF_FACTOR,
+                    cache: Optional[ScrapeCache] = None) -> List[ScrapedServiceData]:
+    """
+    Scrapes every service of every category concurrently and returns the results in
+    the same order as the input (category order, then service order); failed services
+    are left out. See `iter_scraped_services`.
+    """
+    return list(iter_scraped_services(
+        scrape_jobs(services_by_category), max_workers=max_workers, parse_workers=parse_workers,
+        requests_per_second=requests_per_second, max_retries=max_retries,
+        backoff_factor=backoff_factor, cache=cache,
+    ))
+
+def write_in_job_order(partial_file: Path, jobs: List[Tuple[str, str]], output_file: Path) -> int:
+    """
+    Copies the records of a (possibly resumed) scrape to `output_file` in job order and
+    returns how many there are. Only the byte offset of every record is kept in memory.
+    """
+    offsets: Dict[Tuple[str, str], int] = {}
+    with open(partial_file, "rb") as f:
+        position = 0
+        for line in f:
+            record = json.loads(line)
+            offsets.setdefault((record["service_url"], record["category"]), position)
+            position += len(line)
+
+        with RecordWriter(output_file) as writer:
+            for job in dict.fromkeys(jobs):
+                if job in offsets:
+                    f.seek(offsets[job])
+                    writer.write(json.loads(f.readline()))
+    return writer.count
+
+def scrape_all_services(use_cache: bool = True, resume: bool = True):
+    """
+    Loads service URLs by category, scrapes each service, and saves the results to an NDJSON file.
+    With `use_cache`, pages that did not change since the last scrape are reused from the scrape cache,
+    which is saved every `SCRAPE_CACHE_SAVE_EVERY` records and when the scrape ends or fails.
+
+    Every record is appended to `SCRAPED_SERVICES_PARTIAL_FILE` as soon as it is scraped.
+    With `resume`, a scrape that was interrupted carries on from there: the services
+    already written are not scraped again.
     """
     try:
         # Load the service URLs grouped by category from the pre-scraped JSON
         with open(SCRAPED_URLS_FILE, "r", encoding="utf-8") as f:
             services_by_category = json.load(f)
+        jobs = scrape_jobs(services_by_category)
 
-        all_data: List[ScrapedServiceData] = []
-        # Calculate the total number of services for the progress bar
-        total_services = sum(len(services) for services in services_by_category.values())
+        done = set()
+        if SCRAPED_SERVICES_PARTIAL_FILE.exists():
+            if resume:
+                done = {(record["service_url"], record["category"]) for record in iter_records(SCRAPED_SERVICES_PARTIAL_FILE)}
+                print(f"Resuming an interrupted scrape: {len(done)} services already scraped")
+            else:
+                SCRAPED_SERVICES_PARTIAL_FILE.unlink()
 
-        # Iterate through categories and services, scraping each service page
-        with tqdm(total=total_services, desc="Scraping Services") as pbar:
-            for category, services in services_by_category.items():
-                for service in services:
-                    data = scrape_service_bs4(service["url"], category)
-                    if data:
-                        all_data.append(data)
-                    # Update the progress bar after processing each service
-                    pbar.update(1)
+        cache = ScrapeCache() if use_cache else None
+        try:
+            with RecordWriter(SCRAPED_SERVICES_PARTIAL_FILE, append=True) as writer:
+                for data in iter_scraped_services([job for job in jobs if job not in done], cache=cache):
+                    writer.write(data)
+                    if cache and writer.count % SCRAPE_CACHE_SAVE_EVERY == 0:
+                        cache.save()
+        finally:
+            # An interrupted scrape keeps the pages it fetched, like the records it wrote
+            if cache:
+                cache.save()
 
-        # Save the collected data to a JSON file
-        with open(SCRAPED_SERVICES_FILE, "w", encoding="utf-8") as f:
-            json.dump(all_data, f, ensure_ascii=False, indent=4)
+        # Every service is on disk; publish them in scrape order under the final name
+        count = write_in_job_order(SCRAPED_SERVICES_PARTIAL_FILE, jobs, SCRAPED_SERVICES_FILE)
+        SCRAPED_SERVICES_PARTIAL_FILE.unlink()
 
-        print("\n✅ Data saved to scraped_services_data.json")
+        print(f"\n✅ {count} services saved to {SCRAPED_SERVICES_FILE.name}")
+        if cache:
+            print(f"✅ {cache.report()}")
 
     except FileNotFoundError:
         # Handle the case where the input file is not found
@@ -177,7 +412,3 @@ def scrape_all_services():
     except Exception as e:
         # Handle any unexpected errors during the main process
         print(f"An error occurred during processing: {e}", file=sys.stderr)
-
-
-if __name__ == "__main__":
-    scrape_all_services()